@@ -0,0 +1,327 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import csv
+import inspect
+import json
+import platform
+import statistics
+import time
+from datetime import date, datetime
+
+from app import cache
+from app import logic
+from app.database import execute_query
+from app.seeder import run_seeder
+
+# ============================================================
+# BENCHMARK CÁC HÀM ĐỌC TRONG app.logic
+# ============================================================
+# Chạy:  python app/benchmark.py --scales 1,10 --output bench.json
+# So sánh với kết quả cũ:  --baseline bench_old.json --threshold 0.2
+# Kiểm tra các truy vấn đã viết lại so với SQL cũ:  --scales 1,50 --compare-rewrites
+# LƯU Ý: mỗi scale factor sẽ SEED LẠI CSDL đang cấu hình trong .env (xóa dữ liệu cũ),
+# dùng --no-seed để đo trên dữ liệu hiện có.
+
+# Các hàm ghi dữ liệu không được benchmark
+WRITE_PREFIXES = ("create_", "update_", "delete_", "apply_", "add_", "transfer_", "import_", "checkout")
+# Hàm hạ tầng, không phải truy vấn nghiệp vụ
+SKIP_FUNCTIONS = {"call_stored_procedure", "month_range", "week_range", "date_range", "check_payroll"}
+
+# Các biến thể cần đo thêm: tên hiển thị -> (tên hàm, kwargs)
+EXTRA_CASES = {
+    "get_products_by_category_sorted[daily_sales]": ("get_products_by_category_sorted", {"sort_by": "daily_sales"}),
+    "sample_customers[k=100]": ("sample_customers", {"k": 100}),
+}
+
+# Câu SQL trước khi viết lại, dùng để kiểm tra truy vấn mới trả về đúng cùng
+# kết quả và đo mức cải thiện: tên -> (SQL cũ, params, tên hàm mới, kwargs)
+LEGACY_QUERIES = {
+    "get_total_stock_all": ("""
+    SELECT 
+        P.ProductID,
+        P.ProductName,
+        C.CategoryName,
+        IFNULL(SUM(I.Quantity), 0) as WarehouseQty,
+        IFNULL((
+            SELECT SUM(D2.CurrentQuantity) 
+            FROM DISPLAYS D2 
+            JOIN INVENTORY I2 ON D2.InventoryID = I2.InventoryID 
+            WHERE I2.ProductID = P.ProductID
+        ), 0) as CounterQty,
+        (IFNULL(SUM(I.Quantity), 0) + IFNULL((
+            SELECT SUM(D2.CurrentQuantity) 
+            FROM DISPLAYS D2 
+            JOIN INVENTORY I2 ON D2.InventoryID = I2.InventoryID 
+            WHERE I2.ProductID = P.ProductID
+        ), 0)) as TotalStock
+    FROM PRODUCT P
+    LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
+    LEFT JOIN CATEGORY C ON P.CategoryID = C.CategoryID
+    GROUP BY P.ProductID, P.ProductName, C.CategoryName
+    ORDER BY TotalStock ASC
+    """, None, "get_total_stock_all", {}),
+    "get_products_by_category_sorted[daily_sales]": ("""
+    SELECT 
+        P.ProductID, P.ProductName, 
+        IFNULL(SUM(D.CurrentQuantity), 0) as CurrentStock,
+        IFNULL((
+            SELECT SUM(ID.Quantity) 
+            FROM INVOICE_DETAIL ID 
+            JOIN INVOICE INV ON ID.InvoiceID = INV.InvoiceID 
+            WHERE ID.ProductID = P.ProductID AND DATE(INV.CreatedAt) = CURDATE()
+        ), 0) as SoldToday
+    FROM PRODUCT P
+    LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
+    LEFT JOIN DISPLAYS D ON I.InventoryID = D.InventoryID
+    GROUP BY P.ProductID, P.ProductName
+    ORDER BY SoldToday DESC
+    """, None, "get_products_by_category_sorted", {"sort_by": "daily_sales"}),
+    "get_products_need_refill": ("""
+    SELECT 
+        P.ProductID,
+        P.ProductName, 
+        IFNULL(SUM(D.CurrentQuantity), 0) as OnCounter,
+        IFNULL(SUM(I.Quantity), 0) as InWarehouse,
+        C.CounterName
+    FROM PRODUCT P
+    LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
+    LEFT JOIN DISPLAYS D ON I.InventoryID = D.InventoryID
+    LEFT JOIN COUNTER C ON D.CounterID = C.CounterID
+    WHERE D.CurrentQuantity IS NOT NULL
+    GROUP BY P.ProductID, P.ProductName, C.CounterName
+    HAVING OnCounter < %s AND InWarehouse > 0
+    ORDER BY OnCounter ASC
+    """, (10,), "get_products_need_refill", {"threshold": 10}),
+    "get_near_expiry_products": ("""
+    SELECT 
+        P.ProductID,
+        P.ProductName, 
+        I.ImportDate, 
+        F.ExpiryDays, 
+        DATEDIFF(NOW(), I.ImportDate) as DaysSinceImport,
+        (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) as DaysRemaining
+    FROM INVENTORY I
+    JOIN PRODUCT P ON I.ProductID = P.ProductID
+    JOIN FOOD_ITEM F ON P.ProductID = F.ProductID
+    WHERE (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) BETWEEN 0 AND %s
+      AND I.Quantity > 0
+    ORDER BY DaysRemaining ASC
+    """, (7,), "get_near_expiry_products", {"days_threshold": 7}),
+    "get_expired_products": ("""
+    SELECT 
+        P.ProductID,
+        P.ProductName, 
+        I.ImportDate, 
+        F.ExpiryDays, 
+        (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) as DaysRemaining,
+        I.Quantity as WarehouseQty
+    FROM INVENTORY I
+    JOIN PRODUCT P ON I.ProductID = P.ProductID
+    JOIN FOOD_ITEM F ON P.ProductID = F.ProductID
+    WHERE (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) < 0
+      AND I.Quantity > 0
+    ORDER BY DaysRemaining ASC
+    """, None, "get_expired_products", {}),
+}
+
+def default_args(end_date):
+    """Tham số dùng khi gọi các hàm có tham số bắt buộc"""
+    m, y = end_date.month, end_date.year
+    month = logic.month_range(m, y)
+    return {
+        "search_products": ("Sữa",),
+        "get_product_by_id": (1,),
+        "search_customers": ("Nguyễn",),
+        "get_customer_by_id": (1,),
+        "search_employees": ("Văn",),
+        "get_employee_by_id": (1,),
+        "get_supplier_by_id": (1,),
+        "calculate_employee_salary": (2, m, y),
+        "calculate_payroll": (m, y),
+        "quote_basket": ([{"ProductID": pid, "Quantity": 2, "SellingPrice": 50000} for pid in range(1, 9)], "Vàng", "Tiền mặt"),
+        "get_product_rankings_by_revenue": month,
+        "get_product_rankings_by_revenue_month": (m, y),
+        "get_employee_rankings": month,
+        "get_employee_rankings_by_month": (m, y),
+    }
+
+def discover_functions(end_date, only=None):
+    """Danh sách (tên, hàm, args, kwargs) của mọi hàm đọc public trong app.logic"""
+    args_map = default_args(end_date)
+    targets = []
+    for name, func in inspect.getmembers(logic, inspect.isfunction):
+        if func.__module__ != "app.logic" or name.startswith("_") or name in SKIP_FUNCTIONS:
+            continue
+        if name.startswith(WRITE_PREFIXES):
+            continue
+        if only and name not in only:
+            continue
+        params = inspect.signature(func).parameters.values()
+        required = [p for p in params if p.default is inspect.Parameter.empty
+                    and p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+        if name in args_map:
+            targets.append((name, func, args_map[name], {}))
+        elif not required:
+            targets.append((name, func, (), {}))
+        else:
+            print(f"   Bỏ qua {name}: chưa khai báo tham số trong default_args()")
+    for label, (name, kwargs) in EXTRA_CASES.items():
+        if only and label not in only and name not in only:
+            continue
+        targets.append((label, getattr(logic, name), args_map.get(name, ()), kwargs))
+    return targets
+
+def time_function(func, args, kwargs, repeat, warmup):
+    for _ in range(warmup):
+        func(*args, **kwargs)
+    samples = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+        rows = len(result) if isinstance(result, (list, tuple)) else (1 if result is not None else 0)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "rows": rows,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(round(0.95 * len(samples))) - 1)], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+def _normalize(rows):
+    """Tập kết quả không phụ thuộc thứ tự dòng (thứ tự giữa các dòng bằng nhau không xác định)"""
+    return sorted(tuple(sorted((k, str(v)) for k, v in row.items())) for row in rows or [])
+
+def compare_rewrites(repeat=5, warmup=1, scale="current"):
+    """Chạy SQL cũ và hàm mới: kiểm tra cùng kết quả, so sánh thời gian"""
+    rewrites = []
+    for label, (sql, params, name, kwargs) in LEGACY_QUERIES.items():
+        func = getattr(logic, name)
+        same = _normalize(execute_query(sql, params, fetch=True)) == _normalize(func(**kwargs))
+        old = time_function(execute_query, (sql, params), {"fetch": True}, repeat, warmup)
+        new = time_function(func, (), kwargs, repeat, warmup)
+        speedup = old["median_ms"] / new["median_ms"] if new["median_ms"] else float("inf")
+        rewrites.append({
+            "scale": scale,
+            "function": label,
+            "identical": same,
+            "legacy_median_ms": old["median_ms"],
+            "median_ms": new["median_ms"],
+            "speedup": round(speedup, 2),
+        })
+        status = "giống nhau" if same else "KHÁC NHAU!"
+        print(f"   {label:<48} {old['median_ms']:>10.2f} -> {new['median_ms']:>10.2f} ms (x{speedup:.1f})  kết quả {status}")
+    return rewrites
+
+def run_benchmark(scales, repeat=5, warmup=1, seed=42, end_date=None, reseed=True,
+                  workers=1, only=None, rewrites=None):
+    """rewrites: list để nhận kết quả compare_rewrites() cho từng scale (None = không chạy)"""
+    end_date = end_date or date.today()
+    # Đo truy vấn thật, không đo cache
+    cache.set_enabled(False)
+    results = []
+    for sf in scales:
+        if reseed:
+            print(f"\n>>> Seed dữ liệu scale factor {sf}...")
+            run_seeder(scale=sf, seed=seed, end_date=end_date, workers=workers)
+        label = sf if reseed else "current"
+        print(f"\n>>> Benchmark scale factor {label}")
+        for name, func, args, kwargs in discover_functions(end_date, only):
+            try:
+                stats = time_function(func, args, kwargs, repeat, warmup)
+            except Exception as e:
+                print(f"   {name:<48} LỖI: {e}")
+                continue
+            stats.update({"scale": label, "function": name})
+            results.append(stats)
+            print(f"   {name:<48} median {stats['median_ms']:>10.2f} ms   p95 {stats['p95_ms']:>10.2f} ms   rows {stats['rows']}")
+        if rewrites is not None:
+            print(f"\n>>> So sánh truy vấn cũ / mới (scale factor {label})")
+            rewrites.extend(compare_rewrites(repeat, warmup, label))
+    return results
+
+def write_results(results, output, meta, rewrites=None):
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results, "rewrites": rewrites or []}, f, ensure_ascii=False, indent=2)
+    csv_path = os.path.splitext(output)[0] + ".csv"
+    fields = ["scale", "function", "runs", "rows", "min_ms", "median_ms", "mean_ms", "p95_ms", "max_ms"]
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nĐã ghi kết quả: {output}, {csv_path}")
+
+def compare_with_baseline(results, baseline_path, threshold=0.2, min_delta_ms=1.0):
+    """Các hàm chậm hơn baseline quá threshold (tỉ lệ) và quá min_delta_ms"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(str(r["scale"]), r["function"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\n>>> So sánh với baseline {baseline_path} (ngưỡng +{threshold:.0%})")
+    for r in results:
+        old = baseline.get((str(r["scale"]), r["function"]))
+        if not old:
+            continue
+        ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold and r["median_ms"] - old["median_ms"] > min_delta_ms:
+            regressions.append({**r, "baseline_median_ms": old["median_ms"], "ratio": round(ratio, 3)})
+            flag = "  <-- REGRESSION"
+        print(f"   SF {r['scale']:<6} {r['function']:<48} {old['median_ms']:>10.2f} -> {r['median_ms']:>10.2f} ms (x{ratio:.2f}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các hàm truy vấn trong app.logic")
+    parser.add_argument("--scales", default="1", help="Danh sách scale factor, VD: 1,10,100")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần đo mỗi hàm")
+    parser.add_argument("--warmup", type=int, default=1, help="Số lần chạy khởi động (không tính)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date())
+    parser.add_argument("--workers", type=int, default=1, help="Số worker khi seed dữ liệu")
+    parser.add_argument("--no-seed", action="store_true", help="Không seed lại, đo trên dữ liệu hiện có")
+    parser.add_argument("--only", help="Chỉ đo các hàm này (phân tách bằng dấu phẩy)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Ngưỡng chậm hơn baseline (0.2 = 20%%)")
+    parser.add_argument("--compare-rewrites", action="store_true",
+                        help="So sánh kết quả và thời gian các truy vấn đã viết lại với SQL cũ")
+    args = parser.parse_args()
+
+    scales = [float(s) for s in args.scales.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+    rewrites = [] if args.compare_rewrites else None
+    results = run_benchmark(scales, args.repeat, args.warmup, args.seed, args.end_date,
+                            reseed=not args.no_seed, workers=args.workers, only=only, rewrites=rewrites)
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "scales": scales if not args.no_seed else ["current"],
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "db_host": os.getenv("DB_HOST", "localhost"),
+        "db_name": os.getenv("DB_NAME", "SupermarketManagement"),
+    }
+    write_results(results, args.output, meta, rewrites)
+
+    if rewrites and not all(r["identical"] for r in rewrites):
+        print("\nTruy vấn viết lại trả về kết quả khác SQL cũ!")
+        sys.exit(1)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} hàm chậm hơn baseline!")
+            sys.exit(1)
+        print("\nKhông có regression.")
+
+if __name__ == "__main__":
+    main()
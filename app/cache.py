@@ -0,0 +1,114 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ============================================================
+# RESULT CACHE (TTL + LRU) CHO CÁC HÀM ĐỌC TRONG app.logic
+# ============================================================
+# Mỗi hàm đọc khai báo các bảng mà nó phụ thuộc; các hàm ghi khai báo
+# các bảng mà nó làm thay đổi. Mỗi bảng có 1 "phiên bản" (version): hàm ghi
+# tăng version, kết quả cache được lưu kèm version của các bảng tại thời
+# điểm đọc nên sẽ tự hết hiệu lực ngay sau khi chính ứng dụng ghi dữ liệu.
+# Ghi từ tiến trình khác chỉ được thấy sau khi hết TTL.
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+
+_lock = threading.Lock()
+_table_versions = {}
+_registry = {}
+
+def set_enabled(enabled):
+    global CACHE_ENABLED
+    CACHE_ENABLED = bool(enabled)
+
+def _versions(tables):
+    return tuple(_table_versions.get(t, 0) for t in tables)
+
+def cached(tables, ttl=60, maxsize=128):
+    """Decorator cache kết quả theo (hàm, tham số), hết hạn sau ttl giây,
+    giữ tối đa maxsize kết quả (LRU) cho mỗi hàm."""
+    tables = tuple(tables)
+
+    def decorator(func):
+        entries = OrderedDict()
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        _registry[func.__name__] = (entries, stats, ttl, maxsize, tables)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with _lock:
+                # Lấy version TRƯỚC khi đọc CSDL: nếu có ghi xen giữa thì
+                # kết quả này sẽ bị coi là cũ ở lần đọc sau
+                versions = _versions(tables)
+                entry = entries.get(key)
+                if entry is not None and entry[0] > now and entry[1] == versions:
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return entry[2]
+                stats["misses"] += 1
+
+            value = func(*args, **kwargs)
+            if value is not None:  # None = lỗi truy vấn, không cache
+                with _lock:
+                    entries[key] = (now + ttl, versions, value)
+                    entries.move_to_end(key)
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+                        stats["evictions"] += 1
+            return value
+
+        return wrapper
+    return decorator
+
+def invalidate(*tables):
+    """Làm mất hiệu lực mọi kết quả cache phụ thuộc vào các bảng này"""
+    with _lock:
+        for t in tables:
+            _table_versions[t] = _table_versions.get(t, 0) + 1
+
+def table_versions(tables):
+    """Version hiện tại của các bảng, để dữ liệu giữ trong bộ nhớ ngoài cache biết khi nào cần đọc lại"""
+    with _lock:
+        return _versions(tables)
+
+def invalidates(*tables):
+    """Decorator cho hàm ghi: sau khi chạy sẽ invalidate các bảng đã khai báo"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                invalidate(*tables)
+        return wrapper
+    return decorator
+
+def clear_cache():
+    with _lock:
+        for entries, stats, *_ in _registry.values():
+            entries.clear()
+
+def get_cache_stats():
+    """Hit/miss theo từng hàm được cache"""
+    result = []
+    with _lock:
+        for name, (entries, stats, ttl, maxsize, tables) in _registry.items():
+            total = stats["hits"] + stats["misses"]
+            result.append({
+                "Function": name,
+                "Hits": stats["hits"],
+                "Misses": stats["misses"],
+                "Hit rate": round(stats["hits"] / total, 3) if total else 0.0,
+                "Size": len(entries),
+                "Max size": maxsize,
+                "Evictions": stats["evictions"],
+                "TTL (s)": ttl,
+                "Tables": ", ".join(tables),
+            })
+    return result
@@ -1,20 +1,139 @@
 import mysql.connector
+from mysql.connector import pooling
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from app import query_stats
 
 load_dotenv()
 
-def get_connection():
-    return mysql.connector.connect(
+# ============================================================
+# CONNECTION POOL
+# ============================================================
+# Pool dùng chung cho cả tiến trình: module chỉ được import một lần nên
+# các lần rerun của Streamlit và các thread đều dùng lại cùng một pool.
+
+POOL_NAME = "supermarket_pool"
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # giây chờ khi pool cạn
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_pool_stats = {
+    "checkouts": 0,         # số lần lấy connection thành công
+    "returns": 0,           # số lần trả connection về pool (conn.close())
+    "waits": 0,             # số lần phải chờ vì pool đã cạn
+    "exhausted": 0,         # số lần chờ quá POOL_TIMEOUT
+    "health_failures": 0,   # connection hỏng phát hiện khi lấy ra
+    "wait_time_ms": 0.0,    # tổng thời gian chờ
+}
+
+def _db_config():
+    return dict(
         host=os.getenv("DB_HOST", "localhost"),
         user=os.getenv("DB_USER", "root"),
         password=os.getenv("DB_PASSWORD", ""),
-        database=os.getenv("DB_NAME", "SupermarketManagement")
+        database=os.getenv("DB_NAME", "SupermarketManagement"),
+        connection_timeout=CONNECT_TIMEOUT,
     )
 
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **_db_config()
+                )
+    return _pool
+
+def _bump(key, amount=1):
+    with _stats_lock:
+        _pool_stats[key] += amount
+
+class _PooledConnection:
+    """Bọc connection lấy từ pool để đếm lúc trả về; mọi thuộc tính khác chuyển cho connection gốc"""
+    def __init__(self, conn):
+        self._conn = conn
+        self._returned = False
+
+    def close(self):
+        try:
+            self._conn.close()
+        finally:
+            if not self._returned:
+                self._returned = True
+                _bump("returns")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def get_connection():
+    """Lấy connection từ pool (conn.close() sẽ trả connection về pool)"""
+    pool = _get_pool()
+    deadline = time.monotonic() + POOL_TIMEOUT
+    waited_since = None
+
+    while True:
+        try:
+            conn = pool.get_connection()
+        except pooling.PoolError:
+            # Pool cạn -> chờ connection được trả lại
+            now = time.monotonic()
+            if waited_since is None:
+                waited_since = now
+                _bump("waits")
+            if now >= deadline:
+                _bump("exhausted")
+                _bump("wait_time_ms", (now - waited_since) * 1000)
+                raise
+            time.sleep(0.05)
+            continue
+
+        # Health check: connection có thể đã bị server đóng (wait_timeout)
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+        except mysql.connector.Error:
+            _bump("health_failures")
+            try:
+                conn.close()
+            except mysql.connector.Error:
+                pass
+            if time.monotonic() >= deadline:
+                raise
+            # Server có thể đang ngừng: chờ một chút thay vì thử lại liên tục
+            time.sleep(0.05)
+            continue
+
+        if waited_since is not None:
+            _bump("wait_time_ms", (time.monotonic() - waited_since) * 1000)
+        _bump("checkouts")
+        return _PooledConnection(conn)
+
+def get_pool_stats():
+    """Thống kê pool: kích thước, số connection đang dùng, số lần cạn pool..."""
+    with _stats_lock:
+        stats = dict(_pool_stats)
+    stats["pool_size"] = POOL_SIZE
+    # Đếm theo số lần lấy / trả connection, không đọc hàng đợi nội bộ của mysql-connector
+    stats["in_use"] = stats["checkouts"] - stats["returns"]
+    stats["idle"] = max(POOL_SIZE - stats["in_use"], 0) if _pool is not None else 0
+    return stats
+
 def execute_query(query, params=None, fetch=False, fetch_one=False):
     conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    # buffered: đọc hết kết quả để connection trả về pool luôn sạch
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    started = time.perf_counter()
+    result = None
+    error = None
     try:
         cursor.execute(query, params)
         if fetch:
@@ -27,8 +146,34 @@ def execute_query(query, params=None, fetch=False, fetch_one=False):
             conn.commit()
             return cursor.lastrowid
     except mysql.connector.Error as err:
+        error = err
         print(f"Error: {err}")
         return None
     finally:
         cursor.close()
         conn.close()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if fetch or fetch_one:
+            rows = len(result) if fetch and result else (1 if result else 0)
+            nbytes = query_stats.estimate_bytes(result)
+        else:
+            rows, nbytes = 0, 0
+        query_stats.record(query, params, elapsed_ms, rows, nbytes, error)
+
+@contextmanager
+def transaction():
+    """Chạy nhiều câu lệnh trên cùng 1 connection trong 1 transaction.
+    Commit khi khối lệnh kết thúc, rollback nếu có exception."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        with query_stats.track("TRANSACTION"):
+            conn.start_transaction()
+            yield cursor
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,135 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from decimal import Decimal
+from app.database import execute_query, transaction
+from app.cache import invalidate
+
+# ============================================================
+# GIẢM GIÁ TỰ ĐỘNG CHO LÔ HÀNG CẬN HẠN (LOT_DISCOUNT)
+# ============================================================
+# Quy tắc EXPIRY_DISCOUNT đang hiệu lực (StartDate <= hôm nay <= EndDate) áp
+# dụng cho lô thực phẩm còn hàng có số ngày còn lại < DaysBeforeExpiry; nếu
+# FOOD_ITEM.PromotionID được gán thì sản phẩm chỉ dùng quy tắc đó. Lô khớp nhiều
+# quy tắc lấy mức giảm cao nhất. Lô đã hết hạn không được giảm giá (cần hủy).
+#
+# Toàn bộ lô được đánh giá bằng 1 câu SELECT (mỗi quy tắc 1 lần quét khoảng trên
+# idx_inventory_expiry), so với LOT_DISCOUNT hiện có và chỉ ghi phần thay đổi
+# trong 1 transaction:
+#
+#   python app/discounts.py --dry-run     # xem thay đổi, không ghi
+#   python app/discounts.py               # áp dụng
+#   python app/discounts.py --every 300   # chạy lại mỗi 5 phút
+
+DISCOUNT_COLUMNS = ("ProductID", "PromotionID", "DiscountPercent", "BasePrice", "DiscountedPrice", "ExpiryDate")
+
+EVALUATE_QUERY = """
+SELECT InventoryID, ProductID, PromotionID, DiscountPercent, BasePrice, DiscountedPrice, ExpiryDate
+FROM (
+    SELECT
+        I.InventoryID,
+        I.ProductID,
+        R.PromotionID,
+        R.DiscountPercent,
+        P.SellingPrice as BasePrice,
+        CAST(ROUND(P.SellingPrice * (1 - R.DiscountPercent / 100)) AS DECIMAL(15,2)) as DiscountedPrice,
+        I.ExpiryDate,
+        ROW_NUMBER() OVER (
+            PARTITION BY I.InventoryID ORDER BY R.DiscountPercent DESC, R.PromotionID
+        ) as RuleRank
+    FROM EXPIRY_DISCOUNT R
+    JOIN INVENTORY I
+        ON I.HasStock = 1
+       AND I.ExpiryDate >= CURDATE()
+       AND I.ExpiryDate < CURDATE() + INTERVAL R.DaysBeforeExpiry DAY
+    JOIN FOOD_ITEM F
+        ON F.ProductID = I.ProductID
+       AND (F.PromotionID IS NULL OR F.PromotionID = R.PromotionID)
+    JOIN PRODUCT P ON P.ProductID = I.ProductID
+    WHERE R.StartDate <= CURDATE() AND R.EndDate >= CURDATE()
+) Ranked
+WHERE RuleRank = 1
+"""
+
+def _key(row):
+    # So sánh theo giá trị: FLOAT / DECIMAL đọc ra có thể khác kiểu giữa 2 truy vấn
+    return tuple(float(row[c]) if isinstance(row[c], (int, float, Decimal)) else row[c] for c in DISCOUNT_COLUMNS)
+
+def _plan(cursor):
+    """So sánh kết quả đánh giá quy tắc với LOT_DISCOUNT hiện có"""
+    cursor.execute(EVALUATE_QUERY)
+    desired = {r['InventoryID']: r for r in cursor.fetchall()}
+    cursor.execute(f"SELECT InventoryID, {', '.join(DISCOUNT_COLUMNS)} FROM LOT_DISCOUNT")
+    current = {r['InventoryID']: r for r in cursor.fetchall()}
+
+    upserts = [r for iid, r in desired.items() if iid not in current or _key(current[iid]) != _key(r)]
+    deletes = sorted(current.keys() - desired.keys())
+    return {
+        "upserts": upserts,
+        "deletes": deletes,
+        "unchanged": len(desired) - len(upserts),
+        "active": len(desired),
+    }
+
+def apply_lot_discounts(dry_run=False):
+    """Tính lại giảm giá cho mọi lô cận hạn.
+    Trả về {'upserts': các dòng thêm / đổi, 'deletes': InventoryID bỏ giảm giá, 'unchanged', 'active'};
+    dry_run=True chỉ tính, không ghi."""
+    with transaction() as cursor:
+        plan = _plan(cursor)
+        if dry_run:
+            return plan
+        if plan["upserts"]:
+            updates = ", ".join(f"{c} = VALUES({c})" for c in DISCOUNT_COLUMNS)
+            cursor.executemany(
+                f"INSERT INTO LOT_DISCOUNT (InventoryID, {', '.join(DISCOUNT_COLUMNS)}) "
+                f"VALUES ({', '.join(['%s'] * (len(DISCOUNT_COLUMNS) + 1))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}",
+                [(r['InventoryID'], *(r[c] for c in DISCOUNT_COLUMNS)) for r in plan["upserts"]]
+            )
+        if plan["deletes"]:
+            placeholders = ", ".join(["%s"] * len(plan["deletes"]))
+            cursor.execute(f"DELETE FROM LOT_DISCOUNT WHERE InventoryID IN ({placeholders})", plan["deletes"])
+    if plan["upserts"] or plan["deletes"]:
+        invalidate("LOT_DISCOUNT")
+    return plan
+
+def get_active_rules():
+    """Các quy tắc EXPIRY_DISCOUNT đang hiệu lực"""
+    query = """
+    SELECT PromotionID, PromotionName, DiscountPercent, DaysBeforeExpiry, StartDate, EndDate
+    FROM EXPIRY_DISCOUNT
+    WHERE StartDate <= CURDATE() AND EndDate >= CURDATE()
+    ORDER BY DaysBeforeExpiry DESC, DiscountPercent DESC
+    """
+    return execute_query(query, fetch=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Giảm giá tự động cho lô hàng cận hạn (LOT_DISCOUNT)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in thay đổi, không ghi")
+    parser.add_argument("--every", type=int, metavar="SECONDS", help="Chạy lại sau mỗi SECONDS giây")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        plan = apply_lot_discounts(dry_run=args.dry_run)
+        for r in plan["upserts"][:50]:
+            print(f"   lô #{r['InventoryID']} (SP #{r['ProductID']}): -{r['DiscountPercent']:g}% "
+                  f"{r['BasePrice']:,.0f} -> {r['DiscountedPrice']:,.0f} (hết hạn {r['ExpiryDate']})")
+        if plan["deletes"]:
+            print(f"   bỏ giảm giá {len(plan['deletes'])} lô: {plan['deletes'][:50]}")
+        action = "Sẽ" if args.dry_run else "Đã"
+        print(f"{action} ghi {len(plan['upserts'])} lô, bỏ {len(plan['deletes'])} lô, "
+              f"{plan['unchanged']} lô không đổi ({plan['active']} lô đang giảm giá) "
+              f"trong {time.perf_counter() - started:.2f}s")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
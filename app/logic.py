@@ -1,88 +1,129 @@
-from app.database import execute_query, get_connection
+from app.database import execute_query, get_connection, transaction, POOL_SIZE
+from app import query_stats
+from app.cache import cached, invalidates
+from app import rollups
+from app import summaries
+from app import stock
+from app import search
+from app import table_stats
+from app import pricing
 import mysql.connector
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timedelta
+
+
+class InsufficientStockError(Exception):
+    """Không đủ hàng trên quầy cho một hoặc nhiều dòng trong giỏ"""
+    def __init__(self, lines):
+        self.lines = lines
+        names = ", ".join(f"#{l['ProductID']} (cần {l['Requested']}, còn {l['Available']})" for l in lines)
+        super().__init__(f"Không đủ hàng trên quầy cho sản phẩm: {names}")
 
 # --- Database Statistics ---
-def get_database_statistics():
-    """Get row count statistics for all main tables"""
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Vietnamese names mapping
-    table_names_vn = {
-        "CATEGORY": "Danh mục",
-        "PRODUCT": "Sản phẩm",
-        "SUPPLIER": "Nhà cung cấp",
-        "WAREHOUSE": "Kho hàng",
-        "COUNTER": "Quầy hàng",
-        "EMPLOYEE": "Nhân viên",
-        "CUSTOMER": "Khách hàng",
-        "POSITION": "Vị trí / Chức vụ",
-        "INVENTORY": "Lô hàng / Tồn kho",
-        "DISPLAYS": "Trưng bày",
-        "TIMEKEEPING": "Chấm công",
-        "INVOICE": "Hóa đơn",
-        "INVOICE_DETAIL": "Chi tiết hóa đơn",
-        "FOOD_ITEM": "Thực phẩm",
-        "ELECTRONIC_ITEM": "Điện tử",
-        "LOCAL_FARMER": "Nông dân địa phương",
-        "INDUSTRIAL_MANUFACTURER": "Nhà sản xuất công nghiệp"
-    }
-    
-    tables = [
-        "CATEGORY", "PRODUCT", "SUPPLIER", "WAREHOUSE", "COUNTER",
-        "EMPLOYEE", "CUSTOMER", "POSITION", "INVENTORY", "DISPLAYS",
-        "TIMEKEEPING", "INVOICE", "INVOICE_DETAIL", "FOOD_ITEM", "ELECTRONIC_ITEM",
-        "LOCAL_FARMER", "INDUSTRIAL_MANUFACTURER"
+@cached(("TABLE_STATS",), ttl=60)
+def get_database_statistics(mode="approximate"):
+    """Số bản ghi các bảng chính, kèm thời điểm cập nhật số liệu.
+    mode='approximate': ước lượng của InnoDB (1 truy vấn information_schema);
+    mode='exact': số đếm lưu trong TABLE_STATS, được đếm lại ở nền khi đã cũ (app/table_stats.py)."""
+    if mode == "exact":
+        counts = table_stats.exact_counts()
+        table_stats.refresh_if_stale(counts)
+    else:
+        counts = table_stats.approximate_counts()
+    if counts is None:
+        return None
+    return [
+        {
+            "Bảng": table,
+            "Tên bảng": name,
+            "Số bản ghi": counts[table][0],
+            "Cập nhật lúc": counts[table][1],
+        }
+        for table, name in table_stats.STATS_TABLES.items() if table in counts
     ]
-    
-    stats = []
-    for table in tables:
-        try:
-            cursor.execute(f"SELECT COUNT(*) as count FROM {table}")
-            count = cursor.fetchone()['count']
-            stats.append({
-                "Bảng": table, 
-                "Tên bảng": table_names_vn.get(table, table),
-                "Số bản ghi": count
-            })
-        except:
-            pass
-    
-    cursor.close()
-    conn.close()
-    return stats
 
 # --- Dashboard Queries ---
+# Đọc từ bảng tổng hợp theo ngày (app/rollups.py), không quét INVOICE
+@cached(("DAILY_SALES",), ttl=60)
 def get_daily_revenue_last_30_days():
     query = """
     SELECT 
-        DATE(CreatedAt) as Date, 
-        SUM(TotalAmount) as Revenue 
-    FROM INVOICE 
-    WHERE CreatedAt >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-    GROUP BY DATE(CreatedAt)
+        SaleDate as Date, 
+        Revenue 
+    FROM DAILY_SALES 
+    WHERE SaleDate >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
     ORDER BY Date;
     """
     return execute_query(query, fetch=True)
 
+@cached(("DAILY_PRODUCT_SALES", "PRODUCT"), ttl=60)
 def get_top_selling_products(limit=10):
     query = """
     SELECT 
         P.ProductName, 
-        SUM(ID.Quantity) as TotalQuantity,
-        SUM(ID.Quantity * ID.SellingPrice) as TotalRevenue
-    FROM INVOICE_DETAIL ID
-    JOIN PRODUCT P ON ID.ProductID = P.ProductID
-    JOIN INVOICE I ON ID.InvoiceID = I.InvoiceID
-    WHERE I.CreatedAt >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-    GROUP BY P.ProductID, P.ProductName
-    ORDER BY TotalQuantity DESC
+        S.TotalQuantity,
+        S.TotalRevenue
+    FROM (
+        SELECT ProductID, SUM(Quantity) as TotalQuantity, SUM(Revenue) as TotalRevenue
+        FROM DAILY_PRODUCT_SALES
+        WHERE SaleDate >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+        GROUP BY ProductID
+    ) S
+    JOIN PRODUCT P ON S.ProductID = P.ProductID
+    ORDER BY S.TotalQuantity DESC
     LIMIT %s;
     """
     return execute_query(query, (limit,), fetch=True)
 
+# --- Tải dữ liệu trang Tổng quan song song ---
+# Các truy vấn độc lập chạy đồng thời, mỗi truy vấn 1 connection từ pool;
+# chỉ dùng tối đa nửa pool để các phiên khác vẫn có connection
+DASHBOARD_WORKERS = max(1, min(6, POOL_SIZE // 2))
+DASHBOARD_TIMEOUT = 5.0  # giây, tính từ lúc bắt đầu tải
+_dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+def load_dashboard_data(timeout=DASHBOARD_TIMEOUT, timeouts=None, stats_mode="approximate"):
+    """Chạy song song các truy vấn của trang Tổng quan.
+    timeouts: {tên: giây} riêng cho từng truy vấn (mặc định timeout).
+    Trả về {tên: kết quả}; truy vấn lỗi / quá hạn có giá trị None và tên nằm trong
+    'timed_out' / 'failed'. Truy vấn quá hạn vẫn chạy tiếp ở nền và kết quả vào cache,
+    nên lần tải sau thường đã có."""
+    jobs = {
+        "revenue": (get_daily_revenue_last_30_days, ()),
+        "top_products": (get_top_selling_products, (10,)),
+        "low_stock": (get_low_stock_on_counter, (10,)),
+        "near_expiry": (get_near_expiry_products, (7,)),
+        "need_refill": (get_products_need_refill, (10,)),
+        "db_stats": (get_database_statistics, (stats_mode,)),
+    }
+    timeouts = timeouts or {}
+    started = time.monotonic()
+    futures = {name: _dashboard_executor.submit(func, *args) for name, (func, args) in jobs.items()}
+
+    data = {"timed_out": [], "failed": []}
+    for name in sorted(futures, key=lambda n: timeouts.get(n, timeout)):
+        remaining = started + timeouts.get(name, timeout) - time.monotonic()
+        try:
+            data[name] = futures[name].result(timeout=max(0, remaining))
+            if data[name] is None:  # execute_query trả None khi truy vấn lỗi
+                data["failed"].append(name)
+        except FutureTimeoutError:
+            data[name] = None
+            data["timed_out"].append(name)
+        except Exception as err:
+            print(f"Dashboard query {name} failed: {err}")
+            data[name] = None
+            data["failed"].append(name)
+    return data
+
 # --- Product & Inventory Queries ---
-def get_all_products_with_stock():
+@cached(("PRODUCT", "CATEGORY", "PRODUCT_STOCK", "DISPLAYS"), ttl=30)
+def get_all_products_with_stock(limit=100, after_id=None, category_id=None, counter_id=None):
+    """Danh sách sản phẩm theo ProductID tăng dần, phân trang theo khóa (keyset):
+    trang sau truyền after_id = ProductID của dòng cuối trang trước.
+    Lọc theo danh mục / quầy trưng bày ngay trong SQL."""
     query = """
     SELECT 
         P.ProductID, 
@@ -90,16 +131,28 @@ def get_all_products_with_stock():
         P.SellingPrice, 
         P.Unit,
         C.CategoryName,
-        IFNULL(SUM(I.Quantity), 0) as WarehouseStock
+        IFNULL(S.WarehouseQty, 0) as WarehouseStock
     FROM PRODUCT P
-    LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
+    LEFT JOIN PRODUCT_STOCK S ON P.ProductID = S.ProductID
     JOIN CATEGORY C ON P.CategoryID = C.CategoryID
-    GROUP BY P.ProductID, P.ProductName, P.SellingPrice, P.Unit, C.CategoryName
-    LIMIT 100;
+    WHERE P.ProductID > %s
+      AND (%s IS NULL OR P.CategoryID = %s)
+      AND (%s IS NULL OR EXISTS (
+            SELECT 1 FROM INVENTORY I
+            JOIN DISPLAYS D ON D.InventoryID = I.InventoryID
+            WHERE I.ProductID = P.ProductID AND D.CounterID = %s
+      ))
+    ORDER BY P.ProductID
+    LIMIT %s;
     """
-    return execute_query(query, fetch=True)
+    params = (after_id or 0, category_id, category_id, counter_id, counter_id, limit)
+    return execute_query(query, params, fetch=True)
 
-def search_products(keyword):
+def search_products(keyword, limit=20):
+    # Chỉ mục trong bộ nhớ (không dấu, xếp hạng); lúc chỉ mục chưa dựng xong thì dùng LIKE
+    results = search.search(keyword, limit)
+    if results is not None:
+        return results
     search_term = f"%{keyword}%"
     query = """
     SELECT 
@@ -111,14 +164,16 @@ def search_products(keyword):
     FROM PRODUCT P
     JOIN CATEGORY C ON P.CategoryID = C.CategoryID
     WHERE P.ProductName LIKE %s OR C.CategoryName LIKE %s
-    LIMIT 20;
+    LIMIT %s;
     """
-    return execute_query(query, (search_term, search_term), fetch=True)
+    return execute_query(query, (search_term, search_term, limit), fetch=True)
 
+@cached(("PRODUCT",), ttl=60)
 def get_product_by_id(product_id):
     query = "SELECT * FROM PRODUCT WHERE ProductID = %s"
     return execute_query(query, (product_id,), fetch_one=True)
 
+@cached(("CATEGORY",), ttl=600)
 def get_all_categories():
     query = "SELECT CategoryID, CategoryName FROM CATEGORY ORDER BY CategoryName"
     return execute_query(query, fetch=True)
@@ -128,48 +183,112 @@ def get_all_categories():
 # ============================================================
 
 # --- Product CRUD ---
+@invalidates("PRODUCT", "PRODUCT_STOCK")
 def create_product(name, import_price, selling_price, unit, category_id):
-    query = """
-    INSERT INTO PRODUCT (ProductName, ImportPrice, SellingPrice, Unit, CategoryID) 
-    VALUES (%s, %s, %s, %s, %s)
-    """
-    return execute_query(query, (name, import_price, selling_price, unit, category_id))
+    try:
+        with transaction() as cursor:
+            cursor.execute("""
+            INSERT INTO PRODUCT (ProductName, ImportPrice, SellingPrice, Unit, CategoryID) 
+            VALUES (%s, %s, %s, %s, %s)
+            """, (name, import_price, selling_price, unit, category_id))
+            product_id = cursor.lastrowid
+            # Dòng tồn kho = 0 để các báo cáo đọc từ PRODUCT_STOCK thấy sản phẩm mới
+            stock.refresh_product_stock(cursor, [product_id])
+        search.refresh_products([product_id])
+        return product_id
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return None
 
+@invalidates("PRODUCT")
 def update_product(product_id, name, import_price, selling_price, unit, category_id):
     query = """
     UPDATE PRODUCT 
     SET ProductName=%s, ImportPrice=%s, SellingPrice=%s, Unit=%s, CategoryID=%s 
     WHERE ProductID=%s
     """
-    return execute_query(query, (name, import_price, selling_price, unit, category_id, product_id))
+    result = execute_query(query, (name, import_price, selling_price, unit, category_id, product_id))
+    search.refresh_products([product_id])
+    return result
 
+@invalidates("PRODUCT", "FOOD_ITEM", "ELECTRONIC_ITEM", "PRODUCT_STOCK")
 def delete_product(product_id):
     query = "DELETE FROM PRODUCT WHERE ProductID = %s"
-    return execute_query(query, (product_id,))
+    result = execute_query(query, (product_id,))
+    search.refresh_products([product_id])
+    return result
 
 # --- Customer CRUD ---
+@invalidates("CUSTOMER")
 def create_customer(fullname, phone, tier="Thành viên"):
-    query = "INSERT INTO CUSTOMER (FullName, Phone, Tier) VALUES (%s, %s, %s)"
-    return execute_query(query, (fullname, phone, tier))
+    query = "INSERT INTO CUSTOMER (FullName, Phone, Tier, PhoneSearch, NameFolded) VALUES (%s, %s, %s, %s, %s)"
+    return execute_query(query, (fullname, phone, tier, search.normalize_phone(phone) or None, search.fold_name(fullname)))
 
+@invalidates("CUSTOMER")
 def update_customer(customer_id, fullname, phone, tier):
-    query = "UPDATE CUSTOMER SET FullName=%s, Phone=%s, Tier=%s WHERE CustomerID=%s"
-    return execute_query(query, (fullname, phone, tier, customer_id))
+    query = """
+    UPDATE CUSTOMER SET FullName=%s, Phone=%s, Tier=%s, PhoneSearch=%s, NameFolded=%s
+    WHERE CustomerID=%s
+    """
+    return execute_query(query, (fullname, phone, tier, search.normalize_phone(phone) or None,
+                                 search.fold_name(fullname), customer_id))
 
+@invalidates("CUSTOMER")
 def delete_customer(customer_id):
     query = "DELETE FROM CUSTOMER WHERE CustomerID = %s"
     return execute_query(query, (customer_id,))
 
-def search_customers(keyword):
-    search_term = f"%{keyword}%"
-    query = "SELECT * FROM CUSTOMER WHERE FullName LIKE %s OR Phone LIKE %s LIMIT 50"
-    return execute_query(query, (search_term, search_term), fetch=True)
+# Mức khớp của search_customers, theo thứ tự ưu tiên
+CUSTOMER_MATCHES = ("phone_exact", "phone_prefix", "phone_contains", "name_exact", "name_prefix", "name_contains")
 
+def search_customers(keyword, limit=50):
+    """Tìm khách hàng theo SĐT (chuẩn hóa, khớp đủ hoặc tiền tố) hoặc họ tên không dấu (khớp đủ hoặc tiền tố).
+    Mỗi nhánh là 1 lần quét khoảng trên index PhoneSearch / NameFolded; chỉ khi không có kết quả
+    mới quét toàn bảng tìm chuỗi con (VD: tên đệm "Văn").
+    Mỗi dòng có MatchQuality (xem CUSTOMER_MATCHES); kết quả sắp theo mức khớp rồi theo SĐT / tên."""
+    columns = "CustomerID, FullName, Phone, Points, Tier"
+    keyword = (keyword or "").strip()
+    if any(c.isalpha() for c in keyword):
+        column, value = "NameFolded", search.fold_name(keyword)
+        exact, prefix, contains = "name_exact", "name_prefix", "name_contains"
+    else:
+        column, value = "PhoneSearch", search.normalize_phone(keyword)
+        exact, prefix, contains = "phone_exact", "phone_prefix", "phone_contains"
+    if not value:
+        query = f"SELECT {columns}, NULL AS MatchQuality FROM CUSTOMER ORDER BY CustomerID LIMIT %s"
+        return execute_query(query, (limit,), fetch=True)
+
+    # value chỉ gồm [0-9a-z ] nên không cần escape % / _ trong LIKE
+    query = f"""
+    (SELECT {columns}, '{exact}' AS MatchQuality, 1 AS MatchRank, {column} AS MatchKey
+     FROM CUSTOMER WHERE {column} = %s
+     ORDER BY CustomerID LIMIT %s)
+    UNION ALL
+    (SELECT {columns}, '{prefix}' AS MatchQuality, 2 AS MatchRank, {column} AS MatchKey
+     FROM CUSTOMER WHERE {column} LIKE %s AND {column} <> %s
+     ORDER BY {column}, CustomerID LIMIT %s)
+    ORDER BY MatchRank, MatchKey, CustomerID
+    LIMIT %s
+    """
+    rows = execute_query(query, (value, limit, f"{value}%", value, limit, limit), fetch=True)
+    if rows == []:
+        query = f"""
+        SELECT {columns}, '{contains}' AS MatchQuality FROM CUSTOMER
+        WHERE {column} LIKE %s
+        ORDER BY {column}, CustomerID LIMIT %s
+        """
+        return execute_query(query, (f"%{value}%", limit), fetch=True)
+    for row in rows or []:
+        del row['MatchRank'], row['MatchKey']
+    return rows
+
+@cached(("CUSTOMER",), ttl=60)
 def get_customer_by_id(customer_id):
     query = "SELECT * FROM CUSTOMER WHERE CustomerID = %s"
     return execute_query(query, (customer_id,), fetch_one=True)
 
 # --- Employee CRUD ---
+@invalidates("EMPLOYEE")
 def create_employee(fullname, dob, address, phone, position_id, manager_id=None):
     query = """
     INSERT INTO EMPLOYEE (FullName, DateOfBirth, Address, Phone, PositionID, ManagerID) 
@@ -177,6 +296,7 @@ def create_employee(fullname, dob, address, phone, position_id, manager_id=None)
     """
     return execute_query(query, (fullname, dob, address, phone, position_id, manager_id))
 
+@invalidates("EMPLOYEE")
 def update_employee(employee_id, fullname, dob, address, phone, position_id, manager_id=None):
     query = """
     UPDATE EMPLOYEE 
@@ -185,6 +305,7 @@ def update_employee(employee_id, fullname, dob, address, phone, position_id, man
     """
     return execute_query(query, (fullname, dob, address, phone, position_id, manager_id, employee_id))
 
+@invalidates("EMPLOYEE")
 def delete_employee(employee_id):
     query = "DELETE FROM EMPLOYEE WHERE EmployeeID = %s"
     return execute_query(query, (employee_id,))
@@ -199,6 +320,7 @@ def search_employees(keyword):
     """
     return execute_query(query, (search_term,), fetch=True)
 
+@cached(("EMPLOYEE", "POSITION"), ttl=60)
 def get_employee_by_id(employee_id):
     query = """
     SELECT E.*, P.PositionName 
@@ -208,27 +330,33 @@ def get_employee_by_id(employee_id):
     """
     return execute_query(query, (employee_id,), fetch_one=True)
 
+@cached(("POSITION",), ttl=600)
 def get_all_positions():
     query = "SELECT PositionID, PositionName, BaseSalary, HourlyRate FROM POSITION"
     return execute_query(query, fetch=True)
 
 # --- Supplier CRUD ---
+@invalidates("SUPPLIER")
 def create_supplier(name, address):
     query = "INSERT INTO SUPPLIER (SupplierName, Address) VALUES (%s, %s)"
     return execute_query(query, (name, address))
 
+@invalidates("SUPPLIER")
 def update_supplier(supplier_id, name, address):
     query = "UPDATE SUPPLIER SET SupplierName=%s, Address=%s WHERE SupplierID=%s"
     return execute_query(query, (name, address, supplier_id))
 
+@invalidates("SUPPLIER")
 def delete_supplier(supplier_id):
     query = "DELETE FROM SUPPLIER WHERE SupplierID = %s"
     return execute_query(query, (supplier_id,))
 
+@cached(("SUPPLIER",), ttl=300)
 def get_all_suppliers():
     query = "SELECT * FROM SUPPLIER LIMIT 50"
     return execute_query(query, fetch=True)
 
+@cached(("SUPPLIER",), ttl=60)
 def get_supplier_by_id(supplier_id):
     query = "SELECT * FROM SUPPLIER WHERE SupplierID = %s"
     return execute_query(query, (supplier_id,), fetch_one=True)
@@ -237,19 +365,32 @@ def get_supplier_by_id(supplier_id):
 # INVENTORY & COUNTER OPERATIONS
 # ============================================================
 
-def get_products_in_warehouse(product_id=None):
+@cached(("INVENTORY", "PRODUCT", "PRODUCT_STOCK"), ttl=30)
+def get_products_in_warehouse(product_id=None, limit=None, after=None, category_id=None):
+    """product_id: tổng tồn kho của sản phẩm.
+    Không có product_id: các lô còn hàng theo (ImportDate, InventoryID) tăng dần;
+    phân trang theo khóa: after = (ImportDate, InventoryID) của dòng cuối trang trước."""
     if product_id:
-        query = "SELECT SUM(Quantity) as qty FROM INVENTORY WHERE ProductID = %s"
+        query = "SELECT WarehouseQty as qty FROM PRODUCT_STOCK WHERE ProductID = %s"
         res = execute_query(query, (product_id,), fetch_one=True)
         return res['qty'] if res and res['qty'] else 0
     else:
+        after_date, after_id = after or (None, None)
         query = """
         SELECT I.InventoryID, P.ProductID, P.ProductName, I.Quantity, I.ImportDate 
         FROM INVENTORY I JOIN PRODUCT P ON I.ProductID = P.ProductID 
-        WHERE I.Quantity > 0 ORDER BY I.ImportDate ASC
+        WHERE I.Quantity > 0
+          AND (%s IS NULL OR I.ImportDate > %s OR (I.ImportDate = %s AND I.InventoryID > %s))
+          AND (%s IS NULL OR P.CategoryID = %s)
+        ORDER BY I.ImportDate ASC, I.InventoryID ASC
         """
-        return execute_query(query, fetch=True)
+        params = [after_date, after_date, after_date, after_id, category_id, category_id]
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return execute_query(query, params, fetch=True)
 
+@cached(("COUNTER", "CATEGORY"), ttl=600)
 def get_all_counters():
     query = """
     SELECT C.CounterID, C.CounterName, CAT.CategoryName 
@@ -261,6 +402,8 @@ def get_all_counters():
 def call_stored_procedure(proc_name, args):
     conn = get_connection()
     cursor = conn.cursor()
+    started = time.perf_counter()
+    error = None
     try:
         result_args = cursor.callproc(proc_name, args)
         
@@ -272,13 +415,16 @@ def call_stored_procedure(proc_name, args):
         conn.commit()
         return result_args
     except mysql.connector.Error as err:
+        error = err
         print(f"Error calling {proc_name}: {err}")
         raise err # Re-raise to handle in UI
     finally:
         cursor.close()
         conn.close()
+        query_stats.record(f"CALL {proc_name}", args, (time.perf_counter() - started) * 1000, error=error)
 
 # --- Transfer Inventory ---
+@invalidates("INVENTORY", "DISPLAYS", "PRODUCT_STOCK")
 def transfer_inventory(inventory_id, counter_id, quantity, position):
     """
     Calls Stored Procedure sp_transfer_to_counter
@@ -287,11 +433,188 @@ def transfer_inventory(inventory_id, counter_id, quantity, position):
         # Note: sp_transfer_to_counter(inv_id, counter_id, qty, pos)
         # Báo cáo SP signature: (p_inventory_id, p_counter_id, p_product_id?? No, checked SQL)
         # My generated SQL: sp_transfer_to_counter(inventory_id, counter_id, quantity, position)
-        call_stored_procedure('sp_transfer_to_counter', [inventory_id, counter_id, quantity, position])
+        # SP không tự commit nên chạy chung transaction với việc cập nhật PRODUCT_STOCK
+        with transaction() as cursor:
+            cursor.callproc('sp_transfer_to_counter', [inventory_id, counter_id, quantity, position])
+            stock.refresh_for_inventory(cursor, [inventory_id])
         return True, "Chuyển hàng thành công!"
     except Exception as e:
         return False, f"Lỗi: {e}"
 
+TRANSFER_COLUMNS = ('InventoryID', 'CounterID', 'Quantity', 'Position')
+TRANSFER_RETRIES = 3
+
+def _to_int(value):
+    """Số nguyên từ ô CSV / form (chấp nhận 3, "3", 3.0); không hợp lệ thì None"""
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+def _normalize_moves(moves):
+    """(inventory_id, counter_id, qty, position) hoặc dict theo TRANSFER_COLUMNS -> danh sách dict.
+    Dòng thiếu / sai kiểu giữ nguyên giá trị và có 'Error' (báo lỗi riêng dòng đó khi lập kế hoạch)."""
+    normalized = []
+    for m in moves:
+        if not isinstance(m, dict):
+            m = dict(zip(TRANSFER_COLUMNS, m))
+        move = {c: m.get(c) for c in TRANSFER_COLUMNS}
+        bad = []
+        for c in ('InventoryID', 'CounterID', 'Quantity'):
+            value = _to_int(move[c])
+            if value is None:
+                bad.append(c)
+            else:
+                move[c] = value
+        position = move['Position']
+        move['Position'] = str(position) if position is not None else None
+        if bad:
+            move['Error'] = f"Thiếu hoặc sai giá trị: {', '.join(bad)}"
+        normalized.append(move)
+    return normalized
+
+def _plan_transfers(cursor, moves):
+    """Khóa các lô / vị trí trưng bày liên quan, kiểm tra lần lượt từng lệnh chuyển theo
+    đúng quy tắc của sp_transfer_to_counter (lệnh trước được tính vào lệnh sau).
+    Trả về (kết quả từng lệnh, Quantity mới của lô, DISPLAYS mới)."""
+    valid = [m for m in moves if not m.get('Error')]
+    if not valid:
+        return [{'Move': i, **{c: m[c] for c in TRANSFER_COLUMNS}, 'Success': False, 'Message': m['Error']}
+                for i, m in enumerate(moves, 1)], {}, []
+    inv_ids = sorted({m['InventoryID'] for m in valid})
+    counter_ids = sorted({m['CounterID'] for m in valid})
+    inv_ph = ", ".join(["%s"] * len(inv_ids))
+    cursor.execute(f"SELECT InventoryID, Quantity FROM INVENTORY WHERE InventoryID IN ({inv_ph}) ORDER BY InventoryID FOR UPDATE", inv_ids)
+    available = {r['InventoryID']: r['Quantity'] for r in cursor.fetchall()}
+    cursor.execute(f"""
+    SELECT InventoryID, CounterID, Position, MaxQuantity, CurrentQuantity
+    FROM DISPLAYS WHERE InventoryID IN ({inv_ph}) ORDER BY InventoryID, CounterID FOR UPDATE
+    """, inv_ids)
+    displays = {(r['InventoryID'], r['CounterID']): dict(r) for r in cursor.fetchall()}
+    cursor.execute(f"SELECT CounterID FROM COUNTER WHERE CounterID IN ({', '.join(['%s'] * len(counter_ids))})", counter_ids)
+    counters = {r['CounterID'] for r in cursor.fetchall()}
+
+    results = []
+    inventory = {}
+    changed = {}
+    for i, m in enumerate(moves, 1):
+        inv, counter, qty = m['InventoryID'], m['CounterID'], m['Quantity']
+        key = (inv, counter)
+        slot = displays.get(key)
+        if m.get('Error'):
+            message = m['Error']
+        elif qty <= 0:
+            message = "Số lượng phải lớn hơn 0"
+        elif inv not in available:
+            message = "Không tồn tại lô hàng"
+        elif counter not in counters:
+            message = "Không tồn tại quầy"
+        elif available[inv] < qty:
+            message = f"Không đủ hàng trong kho để chuyển (còn {available[inv]})"
+        elif slot is not None and slot['CurrentQuantity'] + qty > slot['MaxQuantity']:
+            message = f"Vượt quá sức chứa tối đa của quầy (còn trống {slot['MaxQuantity'] - slot['CurrentQuantity']})"
+        else:
+            message = None
+        if message is None:
+            available[inv] -= qty
+            inventory[inv] = available[inv]
+            if slot is None:
+                # Vị trí mới: MaxQuantity = 2 lần số lượng chuyển, như sp_transfer_to_counter
+                slot = displays[key] = {'InventoryID': inv, 'CounterID': counter, 'Position': m['Position'],
+                                        'MaxQuantity': qty * 2, 'CurrentQuantity': 0}
+            slot['CurrentQuantity'] += qty
+            changed[key] = slot
+        results.append({'Move': i, **{c: m[c] for c in TRANSFER_COLUMNS}, 'Success': message is None, 'Message': message or "OK"})
+    return results, inventory, list(changed.values())
+
+@invalidates("INVENTORY", "DISPLAYS", "PRODUCT_STOCK")
+def transfer_inventory_batch(moves, atomic=False):
+    """Chuyển nhiều lô hàng từ kho lên quầy trong 1 transaction.
+    moves: danh sách (inventory_id, counter_id, qty, position) hoặc dict theo TRANSFER_COLUMNS.
+    Mọi lệnh được kiểm tra (tồn kho, MaxQuantity) trong 1 lượt rồi ghi bằng vài câu lệnh gộp;
+    lệnh không hợp lệ (kể cả dòng thiếu / sai giá trị) bị bỏ qua và báo lỗi,
+    atomic=True thì chỉ ghi khi mọi lệnh hợp lệ."""
+    started = time.perf_counter()
+    result = {
+        'success': False,
+        'applied': 0,
+        'failed': 0,
+        'results': [],
+        'message': '',
+        'elapsed_ms': 0.0,
+    }
+    moves = _normalize_moves(moves)
+    if not moves:
+        result['message'] = "Không có lệnh chuyển nào"
+        return result
+
+    for attempt in range(TRANSFER_RETRIES):
+        try:
+            with transaction() as cursor:
+                results, inventory, displays = _plan_transfers(cursor, moves)
+                failed = sum(not r['Success'] for r in results)
+                if atomic and failed:
+                    for r in results:
+                        if r['Success']:
+                            r['Success'], r['Message'] = False, "Không thực hiện (có lệnh khác lỗi)"
+                    inventory, displays = {}, []
+                if displays:
+                    # Các dòng đã bị khóa ở trên nên ghi thẳng giá trị mới
+                    cursor.executemany("""
+                    INSERT INTO DISPLAYS (InventoryID, CounterID, Position, MaxQuantity, CurrentQuantity)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE CurrentQuantity = VALUES(CurrentQuantity)
+                    """, [(d['InventoryID'], d['CounterID'], d['Position'], d['MaxQuantity'], d['CurrentQuantity'])
+                          for d in displays])
+                if inventory:
+                    cases = " ".join(["WHEN %s THEN %s"] * len(inventory))
+                    params = [v for item in inventory.items() for v in item] + list(inventory)
+                    cursor.execute(f"""
+                    UPDATE INVENTORY SET Quantity = CASE InventoryID {cases} END
+                    WHERE InventoryID IN ({', '.join(['%s'] * len(inventory))})
+                    """, params)
+                    stock.refresh_for_inventory(cursor, inventory.keys())
+            result['results'] = results
+            result['applied'] = len(results) - failed if not (atomic and failed) else 0
+            result['failed'] = failed
+            result['success'] = failed == 0
+            result['message'] = (f"Đã chuyển {result['applied']}/{len(results)} lệnh"
+                                 + (f", {failed} lệnh lỗi" if failed else ""))
+            break
+        except mysql.connector.Error as err:
+            # Deadlock / lock wait timeout với quầy thanh toán -> thử lại
+            if err.errno in (1205, 1213) and attempt + 1 < TRANSFER_RETRIES:
+                continue
+            print(f"Transfer error: {err}")
+            result['message'] = f"Lỗi: {err}"
+            break
+
+    result['elapsed_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+# --- Import Inventory ---
+@invalidates("INVENTORY", "PRODUCT_STOCK")
+def import_inventory(product_id, quantity, warehouse_id=None, import_date=None):
+    """Nhập 1 lô hàng mới vào kho. Trả về InventoryID (None nếu lỗi)."""
+    try:
+        with transaction() as cursor:
+            if warehouse_id is None:
+                cursor.execute("SELECT MIN(WarehouseID) AS WarehouseID FROM WAREHOUSE")
+                warehouse_id = cursor.fetchone()['WarehouseID']
+            cursor.execute("""
+            INSERT INTO INVENTORY (ImportDate, Quantity, WarehouseID, ProductID)
+            VALUES (IFNULL(%s, CURDATE()), %s, %s, %s)
+            """, (import_date, quantity, warehouse_id, product_id))
+            inventory_id = cursor.lastrowid
+            stock.refresh_product_stock(cursor, [product_id])
+        return inventory_id
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return None
+
 # --- Salary Calculation ---
 def calculate_employee_salary(employee_id, month, year):
     """
@@ -308,37 +631,145 @@ def calculate_employee_salary(employee_id, month, year):
         print(f"Salary calc error: {e}")
         return None
 
+def calculate_payroll(month, year, employee_ids=None):
+    """Bảng lương tháng của mọi nhân viên (hoặc các nhân viên trong employee_ids) trong 1 truy vấn:
+    TotalSalary = BaseSalary + HourlyRate * tổng WorkHours, cùng công thức với sp_calculate_employee_salary.
+    Chấm công được gom 1 lần theo khoảng ngày của tháng (index idx_timekeeping_date)."""
+    start, end = month_range(month, year)
+    params = [start, end]
+    where = ""
+    if employee_ids is not None:
+        employee_ids = list(employee_ids)
+        if not employee_ids:
+            return []
+        where = f"WHERE E.EmployeeID IN ({', '.join(['%s'] * len(employee_ids))})"
+        params += employee_ids
+    query = f"""
+    SELECT 
+        E.EmployeeID, 
+        E.FullName, 
+        P.PositionName,
+        P.BaseSalary,
+        P.HourlyRate,
+        IFNULL(T.WorkDays, 0) as WorkDays,
+        IFNULL(T.WorkHours, 0) as WorkHours,
+        CAST(P.BaseSalary + P.HourlyRate * IFNULL(T.WorkHours, 0) AS DECIMAL(15,2)) as TotalSalary
+    FROM EMPLOYEE E
+    JOIN POSITION P ON E.PositionID = P.PositionID
+    LEFT JOIN (
+        SELECT EmployeeID, COUNT(*) as WorkDays, SUM(WorkHours) as WorkHours
+        FROM TIMEKEEPING
+        WHERE Date >= %s AND Date < %s
+        GROUP BY EmployeeID
+    ) T ON T.EmployeeID = E.EmployeeID
+    {where}
+    ORDER BY E.EmployeeID
+    """
+    return execute_query(query, params, fetch=True)
+
+def check_payroll(month, year, employee_ids=None, tolerance=1):
+    """Đối chiếu calculate_payroll với sp_calculate_employee_salary (gọi procedure cho từng nhân viên).
+    Trả về các dòng lệch quá tolerance VND: EmployeeID, Batch, Procedure.
+    (Procedure cộng giờ làm vào biến FLOAT nên có thể lệch vài phần trăm đồng.)"""
+    payroll = calculate_payroll(month, year, employee_ids)
+    if payroll is None:
+        return None
+    mismatches = []
+    for row in payroll:
+        expected = calculate_employee_salary(row['EmployeeID'], month, year)
+        batch = row['TotalSalary']
+        if expected is None and batch is None:
+            continue
+        if expected is None or batch is None or abs(float(expected) - float(batch)) > tolerance:
+            mismatches.append({"EmployeeID": row['EmployeeID'], "Batch": batch, "Procedure": expected})
+    return mismatches
+
+# Các ô DISPLAYS còn hàng của các sản phẩm, theo thứ tự khóa chính
+COUNTER_SLOTS_QUERY = """
+SELECT D.InventoryID, D.CounterID, D.CurrentQuantity, I.ProductID, I.ImportDate
+FROM DISPLAYS D
+JOIN INVENTORY I ON D.InventoryID = I.InventoryID
+WHERE I.ProductID IN ({placeholders}) AND D.CurrentQuantity > 0
+ORDER BY D.InventoryID, D.CounterID
+"""
+
+def _allocate_counter_stock(slot_rows, lines):
+    """Phân bổ số lượng bán theo lô cũ nhất trước (FIFO), rồi quầy nhiều hàng nhất.
+    Trả về (kết quả từng dòng, [(InventoryID, CounterID, số lượng)], {ProductID: {InventoryID: số lượng}})"""
+    slots = {}
+    for row in slot_rows:
+        slots.setdefault(row['ProductID'], []).append(row)
+
+    results = []
+    allocation = []
+    lots = {}
+    for l in lines:
+        rows = sorted(slots.get(l['ProductID'], []),
+                      key=lambda r: (r['ImportDate'], -r['CurrentQuantity'], r['InventoryID'], r['CounterID']))
+        available = sum(r['CurrentQuantity'] for r in rows)
+        status = 'ok' if available >= l['Quantity'] else 'insufficient'
+        results.append({
+            'ProductID': l['ProductID'],
+            'Requested': l['Quantity'],
+            'Available': available,
+            'Status': status,
+        })
+        if status != 'ok':
+            continue
+        remaining = l['Quantity']
+        sold = lots.setdefault(l['ProductID'], {})
+        for r in rows:
+            if remaining <= 0:
+                break
+            deduct = min(r['CurrentQuantity'], remaining)
+            allocation.append((r['InventoryID'], r['CounterID'], deduct))
+            sold[r['InventoryID']] = sold.get(r['InventoryID'], 0) + deduct
+            remaining -= deduct
+    return results, allocation, lots
+
+def _deduct_counter_stock(cursor, lines):
+    """Trừ hàng trên quầy cho cả giỏ hàng (dùng trong transaction của caller).
+    - Khóa 1 lần tất cả dòng DISPLAYS liên quan (SELECT ... FOR UPDATE)
+    - Phân bổ số lượng theo lô cũ nhất trước (FIFO), rồi quầy nhiều hàng nhất
+    - Áp dụng bằng 1 câu UPDATE duy nhất cho cả giỏ
+    Trả về (kết quả từng dòng: Requested, Available, Status ('ok' / 'insufficient'),
+    {ProductID: {InventoryID: số lượng bán từ lô}}).
+    Nếu có dòng thiếu hàng thì không trừ gì cả."""
+    product_ids = [l['ProductID'] for l in lines]
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    # Khóa theo thứ tự khóa chính để các quầy thu ngân chạy song song không bị deadlock
+    cursor.execute(COUNTER_SLOTS_QUERY.format(placeholders=placeholders) + "FOR UPDATE", product_ids)
+    results, allocation, lots = _allocate_counter_stock(cursor.fetchall(), lines)
+
+    if allocation and all(r['Status'] == 'ok' for r in results):
+        derived = " UNION ALL ".join(
+            ["SELECT %s AS InventoryID, %s AS CounterID, %s AS Qty"] * len(allocation)
+        )
+        params = [v for a in allocation for v in a]
+        cursor.execute(f"""
+        UPDATE DISPLAYS D
+        JOIN ({derived}) X ON D.InventoryID = X.InventoryID AND D.CounterID = X.CounterID
+        SET D.CurrentQuantity = D.CurrentQuantity - X.Qty
+        """, params)
+        stock.refresh_product_stock(cursor, product_ids)
+    return results, lots
+
+@invalidates("DISPLAYS", "PRODUCT_STOCK")
 def update_stock_after_sale(product_id, quantity_sold):
     """Trừ hàng trên quầy sau khi bán"""
-    query_find = """
-    SELECT D.CounterID, D.InventoryID, D.CurrentQuantity 
-    FROM DISPLAYS D
-    JOIN INVENTORY I ON D.InventoryID = I.InventoryID
-    WHERE I.ProductID = %s AND D.CurrentQuantity > 0
-    ORDER BY D.CurrentQuantity DESC
-    """
-    counters = execute_query(query_find, (product_id,), fetch=True)
-    
-    remaining_to_deduct = quantity_sold
-    
-    if not counters:
+    try:
+        with transaction() as cursor:
+            results, _ = _deduct_counter_stock(cursor, [{'ProductID': product_id, 'Quantity': quantity_sold}])
+        return results[0]['Status'] == 'ok'
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
         return False
-        
-    for c in counters:
-        if remaining_to_deduct <= 0:
-            break
-        
-        deduct = min(c['CurrentQuantity'], remaining_to_deduct)
-        execute_query("UPDATE DISPLAYS SET CurrentQuantity = CurrentQuantity - %s WHERE CounterID = %s AND InventoryID = %s",
-                      (deduct, c['CounterID'], c['InventoryID']))
-        remaining_to_deduct -= deduct
-        
-    return True
 
 # ============================================================
 # INVENTORY REPORTS
 # ============================================================
 
+@cached(("DISPLAYS", "INVENTORY", "PRODUCT", "COUNTER"), ttl=30)
 def get_low_stock_on_counter(threshold=5):
     """Hàng sắp hết trên quầy"""
     query = """
@@ -351,90 +782,83 @@ def get_low_stock_on_counter(threshold=5):
     """
     return execute_query(query, (threshold,), fetch=True)
 
+@cached(("DISPLAYS", "INVENTORY", "PRODUCT", "COUNTER"), ttl=30)
 def get_products_need_refill(threshold=10):
-    """Hàng sắp hết trên quầy NHƯNG vẫn còn trong kho (cần bổ sung)"""
+    """Hàng sắp hết trên quầy NHƯNG vẫn còn trong kho (cần bổ sung), mỗi dòng 1 (sản phẩm, quầy).
+    InWarehouse: tồn kho của các lô đang trưng bày trên quầy đó."""
+    # Không lọc trước bằng PRODUCT_STOCK: tổng theo sản phẩm có thể đủ
+    # trong khi 1 quầy riêng lẻ vẫn dưới ngưỡng
     query = """
     SELECT 
         P.ProductID,
         P.ProductName, 
-        IFNULL(SUM(D.CurrentQuantity), 0) as OnCounter,
-        IFNULL(SUM(I.Quantity), 0) as InWarehouse,
+        SUM(D.CurrentQuantity) as OnCounter,
+        SUM(I.Quantity) as InWarehouse,
         C.CounterName
-    FROM PRODUCT P
-    LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
-    LEFT JOIN DISPLAYS D ON I.InventoryID = D.InventoryID
-    LEFT JOIN COUNTER C ON D.CounterID = C.CounterID
-    WHERE D.CurrentQuantity IS NOT NULL
+    FROM DISPLAYS D
+    JOIN INVENTORY I ON D.InventoryID = I.InventoryID
+    JOIN PRODUCT P ON I.ProductID = P.ProductID
+    JOIN COUNTER C ON D.CounterID = C.CounterID
     GROUP BY P.ProductID, P.ProductName, C.CounterName
     HAVING OnCounter < %s AND InWarehouse > 0
     ORDER BY OnCounter ASC
     """
     return execute_query(query, (threshold,), fetch=True)
 
+@cached(("PRODUCT_STOCK", "PRODUCT"), ttl=30)
 def get_out_of_stock_warehouse_but_avail_counter():
     """Hết trong kho nhưng còn trên quầy"""
     query = """
-    SELECT DISTINCT P.ProductID, P.ProductName, SUM(D.CurrentQuantity) as OnCounter
-    FROM DISPLAYS D
-    JOIN INVENTORY I_disp ON D.InventoryID = I_disp.InventoryID
-    JOIN PRODUCT P ON I_disp.ProductID = P.ProductID
-    WHERE D.CurrentQuantity > 0 
-    AND NOT EXISTS (
-        SELECT 1 FROM INVENTORY I_wh 
-        WHERE I_wh.ProductID = P.ProductID AND I_wh.Quantity > 0
-    )
-    GROUP BY P.ProductID, P.ProductName
+    SELECT P.ProductID, P.ProductName, S.CounterQty as OnCounter
+    FROM PRODUCT_STOCK S
+    JOIN PRODUCT P ON S.ProductID = P.ProductID
+    WHERE S.WarehouseQty = 0 AND S.CounterQty > 0
     """
     return execute_query(query, fetch=True)
 
+@cached(("PRODUCT_STOCK", "PRODUCT", "CATEGORY"), ttl=30)
 def get_total_stock_all():
     """Tổng tồn kho (Quầy + Kho), sắp xếp tăng dần"""
+    # Đọc theo index TotalStock của PRODUCT_STOCK, không gom INVENTORY/DISPLAYS
     query = """
     SELECT 
         P.ProductID,
         P.ProductName,
         C.CategoryName,
-        IFNULL(SUM(I.Quantity), 0) as WarehouseQty,
-        IFNULL((
-            SELECT SUM(D2.CurrentQuantity) 
-            FROM DISPLAYS D2 
-            JOIN INVENTORY I2 ON D2.InventoryID = I2.InventoryID 
-            WHERE I2.ProductID = P.ProductID
-        ), 0) as CounterQty,
-        (IFNULL(SUM(I.Quantity), 0) + IFNULL((
-            SELECT SUM(D2.CurrentQuantity) 
-            FROM DISPLAYS D2 
-            JOIN INVENTORY I2 ON D2.InventoryID = I2.InventoryID 
-            WHERE I2.ProductID = P.ProductID
-        ), 0)) as TotalStock
-    FROM PRODUCT P
-    LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
+        S.WarehouseQty,
+        S.CounterQty,
+        S.TotalStock
+    FROM PRODUCT_STOCK S
+    JOIN PRODUCT P ON S.ProductID = P.ProductID
     LEFT JOIN CATEGORY C ON P.CategoryID = C.CategoryID
-    GROUP BY P.ProductID, P.ProductName, C.CategoryName
-    ORDER BY TotalStock ASC
+    ORDER BY S.TotalStock ASC
     """
     return execute_query(query, fetch=True)
 
+@cached(("DISPLAYS", "INVENTORY", "PRODUCT", "INVOICE", "INVOICE_DETAIL"), ttl=30)
 def get_products_by_category_sorted(category_id=None, counter_id=None, sort_by='stock'):
     """Liệt kê hàng theo chủng loại/quầy, sắp xếp theo tồn kho hoặc lượng bán trong ngày"""
     
     if sort_by == 'daily_sales':
+        # Lượng bán trong ngày gom 1 lần theo sản phẩm (chỉ quét hóa đơn hôm nay)
         query = """
         SELECT 
             P.ProductID, P.ProductName, 
             IFNULL(SUM(D.CurrentQuantity), 0) as CurrentStock,
-            IFNULL((
-                SELECT SUM(ID.Quantity) 
-                FROM INVOICE_DETAIL ID 
-                JOIN INVOICE INV ON ID.InvoiceID = INV.InvoiceID 
-                WHERE ID.ProductID = P.ProductID AND DATE(INV.CreatedAt) = CURDATE()
-            ), 0) as SoldToday
+            IFNULL(S.Sold, 0) as SoldToday
         FROM PRODUCT P
         LEFT JOIN INVENTORY I ON P.ProductID = I.ProductID
         LEFT JOIN DISPLAYS D ON I.InventoryID = D.InventoryID
+        LEFT JOIN (
+            SELECT ID.ProductID, SUM(ID.Quantity) as Sold
+            FROM INVOICE INV
+            JOIN INVOICE_DETAIL ID ON ID.InvoiceID = INV.InvoiceID
+            WHERE INV.CreatedAt >= CURDATE() AND INV.CreatedAt < CURDATE() + INTERVAL 1 DAY
+            GROUP BY ID.ProductID
+        ) S ON S.ProductID = P.ProductID
         WHERE (%s IS NULL OR P.CategoryID = %s)
           AND (%s IS NULL OR D.CounterID = %s)
-        GROUP BY P.ProductID, P.ProductName
+        GROUP BY P.ProductID, P.ProductName, S.Sold
         ORDER BY SoldToday DESC
         """
     else:
@@ -457,6 +881,10 @@ def get_products_by_category_sorted(category_id=None, counter_id=None, sort_by='
 # EXPIRY & DISCOUNT
 # ============================================================
 
+# Hạn sử dụng lưu sẵn ở INVENTORY.ExpiryDate (migration 009), DaysRemaining = ExpiryDate - hôm nay.
+# Điều kiện HasStock = 1 AND ExpiryDate <khoảng> là 1 lần quét khoảng trên idx_inventory_expiry.
+
+@cached(("INVENTORY", "PRODUCT", "FOOD_ITEM"), ttl=60)
 def get_near_expiry_products(days_threshold=10):
     """Hàng sắp hết hạn (thực phẩm)"""
     query = """
@@ -465,17 +893,19 @@ def get_near_expiry_products(days_threshold=10):
         P.ProductName, 
         I.ImportDate, 
         F.ExpiryDays, 
-        DATEDIFF(NOW(), I.ImportDate) as DaysSinceImport,
-        (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) as DaysRemaining
+        DATEDIFF(CURDATE(), I.ImportDate) as DaysSinceImport,
+        DATEDIFF(I.ExpiryDate, CURDATE()) as DaysRemaining
     FROM INVENTORY I
     JOIN PRODUCT P ON I.ProductID = P.ProductID
     JOIN FOOD_ITEM F ON P.ProductID = F.ProductID
-    WHERE (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) BETWEEN 0 AND %s
-      AND I.Quantity > 0
-    ORDER BY DaysRemaining ASC
+    WHERE I.HasStock = 1
+      AND I.ExpiryDate >= CURDATE()
+      AND I.ExpiryDate <= CURDATE() + INTERVAL %s DAY
+    ORDER BY I.ExpiryDate ASC
     """
     return execute_query(query, (days_threshold,), fetch=True)
 
+@cached(("INVENTORY", "PRODUCT", "FOOD_ITEM"), ttl=60)
 def get_expired_products():
     """Hàng đã quá hạn bán (DaysRemaining < 0)"""
     query = """
@@ -484,98 +914,176 @@ def get_expired_products():
         P.ProductName, 
         I.ImportDate, 
         F.ExpiryDays, 
-        (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) as DaysRemaining,
+        DATEDIFF(I.ExpiryDate, CURDATE()) as DaysRemaining,
         I.Quantity as WarehouseQty
     FROM INVENTORY I
     JOIN PRODUCT P ON I.ProductID = P.ProductID
     JOIN FOOD_ITEM F ON P.ProductID = F.ProductID
-    WHERE (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) < 0
-      AND I.Quantity > 0
-    ORDER BY DaysRemaining ASC
+    WHERE I.HasStock = 1
+      AND I.ExpiryDate < CURDATE()
+    ORDER BY I.ExpiryDate ASC
     """
     return execute_query(query, fetch=True)
 
-def get_products_for_auto_discount():
-    """Lấy danh sách hàng cần giảm giá tự động theo quy tắc:
-    - Đồ khô (SafetyThreshold cao, VD: 180 ngày): còn dưới 5 ngày -> giảm 50%
-    - Rau quả (SafetyThreshold thấp, VD: 7 ngày): còn dưới 1 ngày -> giảm 50%
-    """
+@cached(("LOT_DISCOUNT", "INVENTORY", "PRODUCT", "EXPIRY_DISCOUNT"), ttl=30)
+def get_lot_discounts():
+    """Các lô đang được giảm giá tự động (LOT_DISCOUNT, tính bởi app/discounts.py)"""
     query = """
     SELECT 
+        LD.InventoryID,
         P.ProductID,
         P.ProductName,
-        P.SellingPrice,
-        F.ExpiryDays,
-        F.SafetyThreshold,
-        I.ImportDate,
-        (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) as DaysRemaining,
-        CASE 
-            WHEN F.SafetyThreshold IS NULL OR F.SafetyThreshold >= 30 THEN 
-                CASE WHEN (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) < 5 THEN 50 ELSE 0 END
-            ELSE 
-                CASE WHEN (F.ExpiryDays - DATEDIFF(NOW(), I.ImportDate)) < 1 THEN 50 ELSE 0 END
-        END as SuggestedDiscount
-    FROM INVENTORY I
-    JOIN PRODUCT P ON I.ProductID = P.ProductID
-    JOIN FOOD_ITEM F ON P.ProductID = F.ProductID
-    WHERE I.Quantity > 0
-    HAVING SuggestedDiscount > 0
-    ORDER BY DaysRemaining ASC
+        R.PromotionName,
+        LD.DiscountPercent,
+        LD.BasePrice,
+        LD.DiscountedPrice,
+        LD.ExpiryDate,
+        DATEDIFF(LD.ExpiryDate, CURDATE()) as DaysRemaining,
+        I.Quantity as WarehouseQty
+    FROM LOT_DISCOUNT LD
+    JOIN INVENTORY I ON LD.InventoryID = I.InventoryID
+    JOIN PRODUCT P ON LD.ProductID = P.ProductID
+    JOIN EXPIRY_DISCOUNT R ON LD.PromotionID = R.PromotionID
+    ORDER BY LD.ExpiryDate ASC, LD.InventoryID ASC
     """
     return execute_query(query, fetch=True)
 
-def apply_discount_near_expiry(product_id, discount_percent):
-    """Áp dụng giảm giá cho sản phẩm"""
-    query = "UPDATE PRODUCT SET SellingPrice = SellingPrice * (1 - %s/100) WHERE ProductID = %s"
-    return execute_query(query, (discount_percent, product_id))
-
 # ============================================================
 # REVENUE REPORTS
 # ============================================================
 
-def get_product_rankings_by_revenue_month(month, year):
-    """Xếp hạng sản phẩm theo doanh thu trong tháng"""
+# Các báo cáo theo thời gian nhận khoảng nửa mở [start, end) để điều kiện
+# CreatedAt >= start AND CreatedAt < end dùng được index trên INVOICE.CreatedAt
+
+def month_range(month, year):
+    """Khoảng [ngày 1 của tháng, ngày 1 của tháng sau)"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def week_range(day):
+    """Khoảng [thứ Hai, thứ Hai tuần sau) của tuần chứa ngày day"""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=7)
+
+def date_range(start, end):
+    """Khoảng từ ngày start đến hết ngày end (cả 2 ngày đều tính)"""
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+    return start, end + timedelta(days=1)
+
+@cached(("INVOICE", "INVOICE_DETAIL", "PRODUCT", *summaries.SUMMARY_TABLES), ttl=300)
+def get_product_rankings_by_revenue(start, end):
+    """Xếp hạng sản phẩm theo doanh thu trong khoảng [start, end).
+    Khoảng đúng 1 tháng đọc từ bảng tổng hợp MONTHLY_PRODUCT_SALES."""
+    month = summaries.single_month(start, end)
+    if month:
+        # Bảng tổng hợp + các hóa đơn chưa được cộng vào (đọc trực tiếp)
+        query = f"""
+        SELECT P.ProductID, P.ProductName, SUM(S.Revenue) as Revenue
+        FROM (
+            SELECT ProductID, Revenue
+            FROM MONTHLY_PRODUCT_SALES
+            WHERE Year = %s AND Month = %s
+            UNION ALL
+            SELECT ID.ProductID, ID.Quantity * ID.SellingPrice
+            FROM INVOICE I
+            JOIN INVOICE_DETAIL ID ON ID.InvoiceID = I.InvoiceID
+            WHERE {summaries.unsettled("I.InvoiceID")}
+            AND I.CreatedAt >= %s AND I.CreatedAt < %s
+        ) S
+        JOIN PRODUCT P ON S.ProductID = P.ProductID
+        GROUP BY P.ProductID, P.ProductName
+        ORDER BY Revenue DESC
+        """
+        return execute_query(query, (*month, start, end), fetch=True)
+
     query = """
     SELECT P.ProductID, P.ProductName, SUM(ID.Quantity * ID.SellingPrice) as Revenue
     FROM INVOICE_DETAIL ID
     JOIN INVOICE I ON ID.InvoiceID = I.InvoiceID
     JOIN PRODUCT P ON ID.ProductID = P.ProductID
-    WHERE MONTH(I.CreatedAt) = %s AND YEAR(I.CreatedAt) = %s
+    WHERE I.CreatedAt >= %s AND I.CreatedAt < %s
     GROUP BY P.ProductID, P.ProductName
     ORDER BY Revenue DESC
     """
-    return execute_query(query, (month, year), fetch=True)
+    return execute_query(query, (start, end), fetch=True)
+
+def get_product_rankings_by_revenue_month(month, year):
+    """Xếp hạng sản phẩm theo doanh thu trong tháng"""
+    return get_product_rankings_by_revenue(*month_range(month, year))
 
 # ============================================================
 # RANKINGS
 # ============================================================
 
+@cached(("CUSTOMER", "INVOICE", *summaries.SUMMARY_TABLES), ttl=300)
 def get_customer_rankings():
-    """Xếp hạng khách hàng theo tổng chi tiêu"""
-    query = """
-    SELECT C.CustomerID, C.FullName, C.Tier, C.Points, SUM(I.TotalAmount) as TotalSpent
-    FROM CUSTOMER C
-    JOIN INVOICE I ON C.CustomerID = I.CustomerID
-    GROUP BY C.CustomerID, C.FullName, C.Tier, C.Points
-    ORDER BY TotalSpent DESC
-    LIMIT 20
+    """Xếp hạng khách hàng theo tổng chi tiêu (MONTHLY_CUSTOMER_SALES + hóa đơn chưa cộng vào)"""
+    query = f"""
+    SELECT C.CustomerID, C.FullName, C.Tier, C.Points, S.TotalSpent
+    FROM (
+        SELECT CustomerID, SUM(TotalSpent) as TotalSpent
+        FROM (
+            SELECT CustomerID, TotalSpent FROM MONTHLY_CUSTOMER_SALES
+            UNION ALL
+            SELECT CustomerID, TotalAmount FROM INVOICE
+            WHERE {summaries.unsettled()} AND CreatedAt IS NOT NULL AND CustomerID IS NOT NULL
+        ) T
+        GROUP BY CustomerID
+        ORDER BY TotalSpent DESC
+        LIMIT 20
+    ) S
+    JOIN CUSTOMER C ON C.CustomerID = S.CustomerID
+    ORDER BY S.TotalSpent DESC
     """
     return execute_query(query, fetch=True)
 
-def get_employee_rankings_by_month(month, year):
-    """Xếp hạng nhân viên bán hàng theo doanh số trong tháng"""
+@cached(("EMPLOYEE", "POSITION", "INVOICE", *summaries.SUMMARY_TABLES), ttl=300)
+def get_employee_rankings(start, end):
+    """Xếp hạng nhân viên bán hàng theo doanh số trong khoảng [start, end).
+    Khoảng đúng 1 tháng đọc từ bảng tổng hợp MONTHLY_EMPLOYEE_SALES."""
+    month = summaries.single_month(start, end)
+    if month:
+        query = f"""
+        SELECT E.EmployeeID, E.FullName, P.PositionName, SUM(S.TotalSales) as TotalSales
+        FROM (
+            SELECT EmployeeID, TotalSales
+            FROM MONTHLY_EMPLOYEE_SALES
+            WHERE Year = %s AND Month = %s
+            UNION ALL
+            SELECT EmployeeID, TotalAmount
+            FROM INVOICE
+            WHERE {summaries.unsettled()}
+            AND CreatedAt >= %s AND CreatedAt < %s
+        ) S
+        JOIN EMPLOYEE E ON S.EmployeeID = E.EmployeeID
+        JOIN POSITION P ON E.PositionID = P.PositionID
+        WHERE P.PositionName IN ('Nhân viên bán hàng', 'Thu ngân')
+        GROUP BY E.EmployeeID, E.FullName, P.PositionName
+        ORDER BY TotalSales DESC
+        """
+        return execute_query(query, (*month, start, end), fetch=True)
+
     query = """
     SELECT E.EmployeeID, E.FullName, P.PositionName, SUM(I.TotalAmount) as TotalSales
     FROM EMPLOYEE E
     JOIN POSITION P ON E.PositionID = P.PositionID
     JOIN INVOICE I ON E.EmployeeID = I.EmployeeID
-    WHERE MONTH(I.CreatedAt) = %s AND YEAR(I.CreatedAt) = %s
+    WHERE I.CreatedAt >= %s AND I.CreatedAt < %s
     AND P.PositionName IN ('Nhân viên bán hàng', 'Thu ngân')
     GROUP BY E.EmployeeID, E.FullName, P.PositionName
     ORDER BY TotalSales DESC
     """
-    return execute_query(query, (month, year), fetch=True)
+    return execute_query(query, (start, end), fetch=True)
 
+def get_employee_rankings_by_month(month, year):
+    """Xếp hạng nhân viên bán hàng theo doanh số trong tháng"""
+    return get_employee_rankings(*month_range(month, year))
+
+@cached(("SUPPLIER", "ELECTRONIC_ITEM", "PRODUCT", "INVENTORY"), ttl=300)
 def get_supplier_rankings():
     """Xếp hạng NCC theo giá trị hàng đang có (qua ELECTRONIC_ITEM)"""
     query = """
@@ -590,15 +1098,22 @@ def get_supplier_rankings():
     """
     return execute_query(query, fetch=True)
 
+@cached(("SUPPLIER", "ELECTRONIC_ITEM", "INVOICE", "INVOICE_DETAIL", *summaries.SUMMARY_TABLES), ttl=300)
 def get_supplier_rankings_by_sales():
-    """Xếp hạng NCC theo doanh thu hàng bán được (qua INVOICE_DETAIL)"""
-    query = """
+    """Xếp hạng NCC theo doanh thu hàng bán được (MONTHLY_SUPPLIER_SALES + hóa đơn chưa cộng vào)"""
+    query = f"""
     SELECT S.SupplierID, S.SupplierName, 
-           SUM(ID.Quantity * ID.SellingPrice) as TotalSalesRevenue
-    FROM SUPPLIER S
-    JOIN ELECTRONIC_ITEM EI ON S.SupplierID = EI.SupplierID
-    JOIN PRODUCT P ON EI.ProductID = P.ProductID
-    JOIN INVOICE_DETAIL ID ON P.ProductID = ID.ProductID
+           SUM(M.Revenue) as TotalSalesRevenue
+    FROM (
+        SELECT SupplierID, Revenue FROM MONTHLY_SUPPLIER_SALES
+        UNION ALL
+        SELECT EI.SupplierID, ID.Quantity * ID.SellingPrice
+        FROM INVOICE I
+        JOIN INVOICE_DETAIL ID ON ID.InvoiceID = I.InvoiceID
+        JOIN ELECTRONIC_ITEM EI ON EI.ProductID = ID.ProductID
+        WHERE {summaries.unsettled("I.InvoiceID")} AND I.CreatedAt IS NOT NULL
+    ) M
+    JOIN SUPPLIER S ON M.SupplierID = S.SupplierID
     GROUP BY S.SupplierID, S.SupplierName
     ORDER BY TotalSalesRevenue DESC
     """
@@ -608,32 +1123,267 @@ def get_supplier_rankings_by_sales():
 # POS (Point of Sale)
 # ============================================================
 
+@invalidates("INVOICE", "CUSTOMER", *rollups.ROLLUP_TABLES)
 def create_invoice(customer_id, employee_id, payment_method, total_amount):
-    query = """
-    INSERT INTO INVOICE (CustomerID, EmployeeID, PaymentMethod, TotalAmount, CreatedAt)
-    VALUES (%s, %s, %s, %s, NOW())
-    """
-    return execute_query(query, (customer_id, employee_id, payment_method, total_amount))
+    try:
+        with transaction() as cursor:
+            cursor.execute("""
+            INSERT INTO INVOICE (CustomerID, EmployeeID, PaymentMethod, TotalAmount, CreatedAt)
+            VALUES (%s, %s, %s, %s, NOW())
+            """, (customer_id, employee_id, payment_method, total_amount))
+            invoice_id = cursor.lastrowid
+            rollups.add_invoice(cursor, invoice_id)
+        return invoice_id
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return None
 
+@invalidates("INVOICE_DETAIL", "INVOICE", "CUSTOMER", "SUPPLIER", *rollups.ROLLUP_TABLES, *summaries.SUMMARY_TABLES)
 def add_invoice_detail(invoice_id, product_id, quantity, selling_price):
-    query = """
-    INSERT INTO INVOICE_DETAIL (InvoiceID, ProductID, Quantity, SellingPrice)
-    VALUES (%s, %s, %s, %s)
-    """
-    return execute_query(query, (invoice_id, product_id, quantity, selling_price))
+    try:
+        with transaction() as cursor:
+            # Khóa mốc bảng tổng hợp trước khóa INVOICE (cùng thứ tự với refresh_summaries)
+            watermark = summaries.lock_watermark(cursor)
+            cursor.execute("SELECT TotalAmount FROM INVOICE WHERE InvoiceID = %s FOR UPDATE", (invoice_id,))
+            row = cursor.fetchone()
+            old_total = row['TotalAmount'] if row else 0
+            cursor.execute("""
+            INSERT INTO INVOICE_DETAIL (InvoiceID, ProductID, Quantity, SellingPrice)
+            VALUES (%s, %s, %s, %s)
+            """, (invoice_id, product_id, quantity, selling_price))
+            detail_id = cursor.lastrowid
+            # TotalAmount do trigger tính lại sau khi thêm dòng
+            cursor.execute("SELECT DATE(CreatedAt) AS SaleDate, TotalAmount FROM INVOICE WHERE InvoiceID = %s", (invoice_id,))
+            row = cursor.fetchone()
+            rollups.add_invoice_line(cursor, row['SaleDate'], product_id, quantity, selling_price,
+                                     row['TotalAmount'] - old_total)
+            # Hóa đơn đã nằm trong bảng tổng hợp theo tháng: cộng thẳng dòng mới
+            if invoice_id <= watermark:
+                summaries.add_late_line(cursor, invoice_id, product_id, quantity, selling_price,
+                                        row['TotalAmount'] - old_total)
+        return detail_id
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return None
+
+CHECKOUT_RETRIES = 3
+
+def _merge_basket(basket):
+    """Gộp các dòng trùng ProductID (INVOICE_DETAIL có khóa chính InvoiceID+ProductID).
+    Giữ các trường khác của dòng đầu tiên (ProductName, ...) để hiển thị."""
+    merged = {}
+    for item in basket:
+        pid = int(item['ProductID'])
+        if pid in merged:
+            merged[pid]['Quantity'] += int(item['Quantity'])
+        else:
+            merged[pid] = {
+                **item,
+                'ProductID': pid,
+                'Quantity': int(item['Quantity']),
+                'SellingPrice': float(item['SellingPrice']),
+            }
+    return list(merged.values())
+
+def _preview_counter_lots(lines):
+    """Số lượng sẽ lấy từ từng lô nếu thanh toán ngay (cùng cách phân bổ với checkout, không khóa)"""
+    product_ids = [l['ProductID'] for l in lines]
+    query = COUNTER_SLOTS_QUERY.format(placeholders=", ".join(["%s"] * len(product_ids)))
+    rows = execute_query(query, product_ids, fetch=True)
+    if rows is None:
+        return None
+    return _allocate_counter_stock(rows, lines)[2]
+
+def quote_basket(basket, customer_tier=None, payment_method=None):
+    """Giá giỏ hàng sau khuyến mãi (chưa ghi gì): {'lines', 'subtotal', 'discount', 'total'}.
+    SellingPrice trong giỏ là giá niêm yết. Giảm giá lô cận hạn tính theo các lô trên quầy
+    sẽ được bán (chỉ đọc DISPLAYS khi giỏ có sản phẩm đang giảm giá theo lô)."""
+    lines = _merge_basket(basket)
+    lots = None
+    if pricing.has_lot_discounts(l['ProductID'] for l in lines):
+        lots = _preview_counter_lots(lines)
+    return pricing.price_basket(lines, customer_tier, payment_method, lots)
+
+@invalidates("INVOICE", "INVOICE_DETAIL", "INVOICE_LINE_DISCOUNT", "DISPLAYS", "PRODUCT_STOCK", "CUSTOMER", "SUPPLIER", *rollups.ROLLUP_TABLES)
+def checkout(basket, customer_id, employee_id, payment_method, customer_tier=None, apply_promotions=True):
+    """Thanh toán cả giỏ hàng trong 1 transaction trên 1 connection:
+    tạo hóa đơn, thêm toàn bộ chi tiết (1 câu INSERT nhiều dòng) và trừ hàng trên quầy.
+    Nếu có lỗi, toàn bộ giao dịch bị rollback (không còn hóa đơn dở dang).
+    apply_promotions: tính giá theo khuyến mãi (app/pricing.py) sau khi phân bổ lô trên quầy
+    (giảm giá lô cận hạn chỉ áp cho phần lấy từ lô đó), lưu khuyến mãi từng dòng
+    vào INVOICE_LINE_DISCOUNT; customer_tier không truyền thì đọc từ CUSTOMER."""
+    started = time.perf_counter()
+    lines = _merge_basket(basket)
+    subtotal = sum(l['Quantity'] * l['SellingPrice'] for l in lines)
+    discount = 0.0
+    if apply_promotions and lines and customer_tier is None and customer_id:
+        row = execute_query("SELECT Tier FROM CUSTOMER WHERE CustomerID = %s", (customer_id,), fetch_one=True)
+        customer_tier = row['Tier'] if row else None
+    # Lấy chỉ mục khuyến mãi trước khi mở transaction: nạp lại chỉ mục cần connection khác
+    # từ pool, không được chờ connection trong lúc đang giữ khóa DISPLAYS
+    promotions = (pricing.get_index() or pricing.PromotionIndex()) if apply_promotions else None
+    result = {
+        'success': False,
+        'invoice_id': None,
+        'subtotal': subtotal,
+        'discount': discount,
+        'total': subtotal - discount,
+        'lines': lines,
+        'stock': [],
+        'message': '',
+        'elapsed_ms': 0.0,
+    }
+    if not lines:
+        result['message'] = "Giỏ hàng trống"
+        return result
+
+    for attempt in range(CHECKOUT_RETRIES):
+        try:
+            with transaction() as cursor:
+                # Khóa và trừ hàng trên quầy trước, thiếu hàng thì dừng ngay
+                stock_lines, lots = _deduct_counter_stock(cursor, lines)
+                result['stock'] = stock_lines
+                short = [r for r in stock_lines if r['Status'] != 'ok']
+                if short:
+                    raise InsufficientStockError(short)
+                if apply_promotions:
+                    priced = pricing.price_basket(lines, customer_tier, payment_method, lots, index=promotions)
+                    result.update(lines=priced['lines'], discount=priced['discount'], total=priced['total'])
+                priced_lines = result['lines']
+
+                # Khóa chia sẻ mốc bảng tổng hợp tới khi commit: refresh_summaries() không thể
+                # vượt qua InvoiceID sắp cấp (dù transaction bị chậm) như add_invoice_detail
+                summaries.lock_watermark(cursor)
+                # TotalAmount = 0 rồi để trigger cộng dồn theo từng dòng chi tiết
+                # (trigger cộng điểm khách hàng dựa trên phần chênh lệch TotalAmount)
+                cursor.execute("""
+                INSERT INTO INVOICE (CustomerID, EmployeeID, PaymentMethod, TotalAmount, CreatedAt)
+                VALUES (%s, %s, %s, 0, NOW())
+                """, (customer_id, employee_id, payment_method))
+                invoice_id = cursor.lastrowid
+
+                placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(lines))
+                params = []
+                for l in priced_lines:
+                    params.extend([invoice_id, l['ProductID'], l['Quantity'], l['SellingPrice']])
+                cursor.execute(
+                    f"INSERT INTO INVOICE_DETAIL (InvoiceID, ProductID, Quantity, SellingPrice) VALUES {placeholders}",
+                    params
+                )
+                discounted = [l for l in priced_lines if l.get('PromotionID')]
+                if discounted:
+                    cursor.executemany("""
+                    INSERT INTO INVOICE_LINE_DISCOUNT
+                        (InvoiceID, ProductID, PromotionType, PromotionID, DiscountPercent, ListPrice, DiscountAmount)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, [(invoice_id, l['ProductID'], l['PromotionType'], l['PromotionID'],
+                           l['DiscountPercent'], l['ListPrice'], l['Discount']) for l in discounted])
+                # Trường hợp CSDL chưa cài triggers.sql
+                cursor.execute(
+                    "UPDATE INVOICE SET TotalAmount = %s WHERE InvoiceID = %s",
+                    (result['total'], invoice_id)
+                )
+                # Cộng vào bảng tổng hợp theo ngày trong cùng transaction
+                rollups.add_invoice(cursor, invoice_id)
+
+            result['success'] = True
+            result['invoice_id'] = invoice_id
+            result['message'] = "Giao dịch thành công!"
+            break
+        except InsufficientStockError as e:
+            result['message'] = str(e)
+            break
+        except mysql.connector.Error as err:
+            # Deadlock / lock wait timeout giữa các quầy -> thử lại
+            if err.errno in (1205, 1213) and attempt + 1 < CHECKOUT_RETRIES:
+                continue
+            print(f"Checkout error: {err}")
+            result['message'] = f"Lỗi: {err}"
+            break
+
+    result['elapsed_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+# --- Lấy mẫu ngẫu nhiên (thay cho ORDER BY RAND() vốn sắp xếp cả bảng) ---
+
+# Số vòng thử tối đa của sample_customers (mỗi vòng 1 truy vấn theo khóa chính)
+SAMPLE_MAX_ROUNDS = 8
+
+@cached((), ttl=300)
+def _customer_count():
+    # Chỉ dùng để ước lượng mật độ ID, không cần chính xác nên không gắn với version của CUSTOMER
+    row = execute_query("SELECT COUNT(*) AS Total FROM CUSTOMER", fetch_one=True)
+    return row['Total'] if row else None
+
+def sample_customers(k=1):
+    """k khách hàng khác nhau, chọn ngẫu nhiên đều.
+    Bốc ngẫu nhiên CustomerID trong [MIN, MAX] rồi tra theo khóa chính; ID đã bị xóa
+    (khoảng trống) thì bỏ qua và bốc lại ở vòng sau."""
+    bounds = execute_query("SELECT MIN(CustomerID) AS Low, MAX(CustomerID) AS High FROM CUSTOMER", fetch_one=True)
+    if not bounds or bounds['Low'] is None:
+        return [] if bounds else None
+    low, high = bounds['Low'], bounds['High']
+    span = high - low + 1
+    density = min(1.0, (_customer_count() or span) / span)
+
+    picked = {}
+    tried = set()
+    for _ in range(SAMPLE_MAX_ROUNDS):
+        need = k - len(picked)
+        if need <= 0 or len(tried) >= span:
+            break
+        # Bốc dư theo mật độ để thường chỉ cần 1 vòng
+        n = min(span - len(tried), int(need / density * 1.2) + 2)
+        candidates = []
+        while len(candidates) < n:
+            cid = random.randint(low, high)
+            if cid not in tried:
+                tried.add(cid)
+                candidates.append(cid)
+        placeholders = ", ".join(["%s"] * len(candidates))
+        rows = execute_query(
+            f"SELECT CustomerID, FullName, Phone, Tier FROM CUSTOMER WHERE CustomerID IN ({placeholders})",
+            candidates, fetch=True
+        )
+        if rows is None:
+            return None
+        random.shuffle(rows)
+        for row in rows[:need]:
+            picked[row['CustomerID']] = row
+    return list(picked.values())
 
 def get_random_customer():
-    query = "SELECT CustomerID, FullName, Phone, Tier FROM CUSTOMER ORDER BY RAND() LIMIT 1"
-    return execute_query(query, fetch_one=True)
+    rows = sample_customers(1)
+    return rows[0] if rows else None
 
-def get_random_employee():
-    """Chỉ lấy nhân viên bán hàng/thu ngân cho POS"""
-    query = """
-    SELECT E.EmployeeID, E.FullName 
-    FROM EMPLOYEE E 
+@cached(("EMPLOYEE", "POSITION"), ttl=300)
+def _pos_employee_ids():
+    """ID nhân viên bán hàng/thu ngân (bảng nhỏ: giữ cả danh sách, làm mới khi ghi EMPLOYEE)"""
+    rows = execute_query("""
+    SELECT E.EmployeeID
+    FROM EMPLOYEE E
     JOIN POSITION P ON E.PositionID = P.PositionID
     WHERE P.PositionName IN ('Nhân viên bán hàng', 'Thu ngân')
-    ORDER BY RAND() LIMIT 1
-    """
-    return execute_query(query, fetch_one=True)
+    """, fetch=True)
+    return [row['EmployeeID'] for row in rows] if rows is not None else None
+
+def sample_employees(k=1):
+    """k nhân viên bán hàng/thu ngân khác nhau, chọn ngẫu nhiên đều"""
+    ids = _pos_employee_ids()
+    if not ids:
+        return ids
+    chosen = random.sample(ids, min(k, len(ids)))
+    placeholders = ", ".join(["%s"] * len(chosen))
+    rows = execute_query(
+        f"SELECT EmployeeID, FullName FROM EMPLOYEE WHERE EmployeeID IN ({placeholders})",
+        chosen, fetch=True
+    )
+    if rows is not None:
+        random.shuffle(rows)
+    return rows
+
+def get_random_employee():
+    """Chỉ lấy nhân viên bán hàng/thu ngân cho POS"""
+    rows = sample_employees(1)
+    return rows[0] if rows else None
 
@@ -7,12 +7,20 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from app.database import get_pool_stats
+from app import query_stats
+from app.cache import get_cache_stats, clear_cache
+from app.search import warm_up as warm_up_search_index, get_index_stats as get_search_index_stats
+from app.discounts import apply_lot_discounts, get_active_rules as get_active_expiry_rules
+from app.summaries import start_background_refresh as start_summaries_refresh
+from app.pricing import PAYMENT_METHODS, get_index_stats as get_pricing_index_stats
 from app.logic import (
     # Dashboard
     get_daily_revenue_last_30_days,
     get_top_selling_products,
     get_database_statistics,
+    load_dashboard_data,
     # Products
     get_all_products_with_stock,
     search_products,
@@ -44,7 +52,9 @@ from app.logic import (
     get_products_in_warehouse,
     get_all_counters,
     transfer_inventory,
-    update_stock_after_sale,
+    transfer_inventory_batch,
+    TRANSFER_COLUMNS,
+    import_inventory,
     # Reports
     get_low_stock_on_counter,
     get_products_need_refill,
@@ -54,36 +64,85 @@ from app.logic import (
     # Expiry
     get_near_expiry_products,
     get_expired_products,
-    get_products_for_auto_discount,
-    apply_discount_near_expiry,
+    get_lot_discounts,
     # Revenue
-    get_product_rankings_by_revenue_month,
+    get_product_rankings_by_revenue,
+    month_range,
+    week_range,
+    date_range,
     # Rankings
     get_customer_rankings,
-    get_employee_rankings_by_month,
+    get_employee_rankings,
     get_supplier_rankings,
     get_supplier_rankings_by_sales,
     # POS
-    create_invoice,
-    add_invoice_detail,
-    get_random_customer,
+    quote_basket,
+    checkout,
     get_random_customer,
     get_random_employee,
-    calculate_employee_salary
+    calculate_employee_salary,
+    calculate_payroll,
+    check_payroll
 )
 
 st.set_page_config(page_title="Hệ thống Quản lý Siêu thị", layout="wide", page_icon="🛒")
 
 st.title("🛒 Hệ thống Quản lý Siêu thị")
 
+# Dựng chỉ mục tìm kiếm sản phẩm ở thread nền (ô tìm kiếm dùng SQL cho đến khi xong)
+warm_up_search_index()
+# Cộng hóa đơn mới vào bảng tổng hợp theo tháng ở thread nền (báo cáo tự đọc phần chưa cộng)
+start_summaries_refresh()
+
+def period_picker(key):
+    """Chọn kỳ báo cáo (tháng / tuần / tùy chọn) -> (start, end, nhãn), end không tính"""
+    kind = st.radio("Kỳ báo cáo", ["Tháng", "Tuần", "Tùy chọn"], horizontal=True, key=f"{key}_kind")
+    today = date.today()
+    if kind == "Tháng":
+        col1, col2 = st.columns(2)
+        m = col1.number_input("Tháng", 1, 12, today.month, key=f"{key}_month")
+        y = col2.number_input("Năm", 2020, 2030, today.year, key=f"{key}_year")
+        start, end = month_range(int(m), int(y))
+        return start, end, f"tháng {m}/{y}"
+    if kind == "Tuần":
+        day = st.date_input("Tuần chứa ngày", today, key=f"{key}_week")
+        start, end = week_range(day)
+        return start, end, f"tuần {start:%d/%m} - {end - timedelta(days=1):%d/%m/%Y}"
+    picked = st.date_input("Từ ngày - đến ngày", (today.replace(day=1), today), key=f"{key}_range")
+    if len(picked) < 2:
+        picked = (picked[0], picked[0])
+    start, end = date_range(*picked)
+    return start, end, f"{picked[0]:%d/%m/%Y} - {picked[1]:%d/%m/%Y}"
+
+def keyset_pager(key, fetch, cursor_of, page_size=50):
+    """Phân trang theo khóa: fetch(after, limit) -> các dòng, cursor_of(dòng) -> khóa của dòng.
+    Giữ khóa đầu mỗi trang đã xem trong session_state[key]; trả về các dòng của trang hiện tại."""
+    stack = st.session_state.setdefault(key, [None])
+    rows = fetch(stack[-1], page_size + 1) or []
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    c1, c2, c3 = st.columns([1, 1, 6])
+    if c1.button("◀ Trước", key=f"{key}_prev", disabled=len(stack) == 1):
+        stack.pop()
+        st.rerun()
+    if c2.button("Sau ▶", key=f"{key}_next", disabled=not has_next):
+        stack.append(cursor_of(rows[-1]))
+        st.rerun()
+    c3.caption(f"Trang {len(stack)}")
+    return rows
+
 # Sidebar
-menu = st.sidebar.radio("📌 Chức năng", [
+menu_items = [
     "🏠 Tổng quan", 
     "💳 Bán hàng (POS)", 
     "📦 Kho & Quầy hàng", 
     "🗂 Quản lý Dữ liệu", 
     "📈 Báo cáo & Xếp hạng"
-])
+]
+# Trang chẩn đoán ẩn: mở bằng ?diag=1 trên URL hoặc biến môi trường SHOW_DIAGNOSTICS=1
+if st.query_params.get("diag") == "1" or os.getenv("SHOW_DIAGNOSTICS") == "1":
+    menu_items.append("🩺 Diagnostics")
+menu = st.sidebar.radio("📌 Chức năng", menu_items)
 
 # ============================================================
 # 1. DASHBOARD
@@ -91,7 +150,20 @@ menu = st.sidebar.radio("📌 Chức năng", [
 if menu == "🏠 Tổng quan":
     st.header("📊 Tổng quan Kinh doanh (30 ngày qua)")
     
-    rev_data = get_daily_revenue_last_30_days()
+    # Các truy vấn chạy song song; mục nào quá hạn thì hiển thị phần đã có
+    stats_exact = st.session_state.get("db_stats_exact", False)
+    data = load_dashboard_data(stats_mode="exact" if stats_exact else "approximate")
+    missing = set(data['timed_out']) | set(data['failed'])
+    if data['timed_out']:
+        st.warning(f"⏳ Chưa tải xong: {', '.join(data['timed_out'])}. Tải lại trang sau ít giây để xem.")
+    if data['failed']:
+        st.error(f"Lỗi khi tải: {', '.join(data['failed'])}")
+    
+    def count_metric(col, label, name):
+        rows = data[name]
+        col.metric(label, "…" if name in missing else f"{len(rows) if rows else 0}")
+    
+    rev_data = data['revenue']
     
     # Metrics Row
     col1, col2, col3, col4 = st.columns(4)
@@ -101,16 +173,15 @@ if menu == "🏠 Tổng quan":
         total_revenue = df_rev['Revenue'].sum()
         col1.metric("💰 Tổng Doanh thu", f"{total_revenue:,.0f} VND")
     else:
-        col1.metric("💰 Tổng Doanh thu", "0 VND")
+        col1.metric("💰 Tổng Doanh thu", "…" if 'revenue' in missing else "0 VND")
     
-    low_stock = get_low_stock_on_counter(threshold=10)
-    col2.metric("⚠️ Hàng sắp hết trên quầy", f"{len(low_stock) if low_stock else 0}")
+    low_stock = data['low_stock']
+    count_metric(col2, "⚠️ Hàng sắp hết trên quầy", 'low_stock')
     
-    near_expiry = get_near_expiry_products(days_threshold=7)
-    col3.metric("⏰ Hàng sắp hết hạn", f"{len(near_expiry) if near_expiry else 0}")
+    near_expiry = data['near_expiry']
+    count_metric(col3, "⏰ Hàng sắp hết hạn", 'near_expiry')
     
-    need_refill = get_products_need_refill(threshold=10)
-    col4.metric("🔄 Cần bổ sung lên quầy", f"{len(need_refill) if need_refill else 0}")
+    count_metric(col4, "🔄 Cần bổ sung lên quầy", 'need_refill')
 
     # Revenue Chart
     if rev_data:
@@ -120,7 +191,7 @@ if menu == "🏠 Tổng quan":
     
     # Top Products
     st.subheader("🏆 Top 10 Sản phẩm bán chạy")
-    top_products = get_top_selling_products(10)
+    top_products = data['top_products']
     if top_products:
         df_top = pd.DataFrame(top_products)
         fig2 = px.bar(df_top, x='ProductName', y='TotalQuantity', title="Số lượng bán", color='TotalRevenue')
@@ -134,6 +205,8 @@ if menu == "🏠 Tổng quan":
         st.subheader("⚠️ Cảnh báo Tồn kho Quầy")
         if low_stock:
             st.dataframe(pd.DataFrame(low_stock), use_container_width=True)
+        elif 'low_stock' in missing:
+            st.info("⏳ Đang tải...")
         else:
             st.success("✅ Tồn kho trên quầy ổn định.")
             
@@ -142,6 +215,8 @@ if menu == "🏠 Tổng quan":
         if near_expiry:
             df_exp = pd.DataFrame(near_expiry)
             st.dataframe(df_exp, use_container_width=True)
+        elif 'near_expiry' in missing:
+            st.info("⏳ Đang tải...")
         else:
             st.success("✅ Không có hàng sắp hết hạn (dưới 7 ngày).")
     
@@ -149,8 +224,11 @@ if menu == "🏠 Tổng quan":
     st.divider()
     st.subheader("📊 Tổng quan Dữ liệu Hệ thống")
     st.caption("Số lượng bản ghi trong các bảng quan trọng của CSDL")
+    st.toggle("Số chính xác (đếm lại định kỳ ở nền; mặc định là ước lượng của InnoDB)", key="db_stats_exact")
     
-    db_stats = get_database_statistics()
+    db_stats = data['db_stats']
+    if not db_stats and stats_exact and 'db_stats' not in missing:
+        st.info("⏳ Đang đếm số bản ghi lần đầu, tải lại trang sau ít phút.")
     if db_stats:
         df_stats = pd.DataFrame(db_stats)
         
@@ -188,9 +266,13 @@ elif menu == "💳 Bán hàng (POS)":
         col_btn1, col_btn2 = st.columns(2)
         with col_btn1:
             if st.button("Tìm kiếm", use_container_width=True):
-                res = search_customers(cust_search)
+                res = search_customers(cust_search, limit=5)
                 if res:
+                    # Kết quả đã sắp theo mức khớp: dòng đầu là lựa chọn tốt nhất
                     st.session_state['current_customer'] = res[0]
+                    ties = [r for r in res if r['MatchQuality'] == res[0]['MatchQuality']]
+                    if len(ties) > 1:
+                        st.warning(f"Nhiều khách hàng cùng khớp, đã chọn #{res[0]['CustomerID']}. Nhập đủ SĐT để chọn chính xác.")
                 else:
                     st.error("Không tìm thấy")
         with col_btn2:
@@ -239,32 +321,42 @@ elif menu == "💳 Bán hàng (POS)":
                 st.error("Không tìm thấy sản phẩm")
 
         if st.session_state['basket']:
-            df_basket = pd.DataFrame(st.session_state['basket'])
+            payment_method = st.selectbox("💳 Phương thức thanh toán", PAYMENT_METHODS, key="pos_payment")
+            customer = st.session_state['current_customer']
+            # Giá theo khuyến mãi đang hiệu lực (hạng khách hàng, phương thức thanh toán, giá trị đơn)
+            quote = quote_basket(st.session_state['basket'], customer['Tier'] if customer else None, payment_method)
+            df_basket = pd.DataFrame(quote['lines'])[
+                ['ProductID', 'ProductName', 'Quantity', 'ListPrice', 'DiscountPercent', 'SellingPrice', 'Discount', 'PromotionName']
+            ]
             st.dataframe(df_basket, use_container_width=True)
             
-            total = df_basket['SellingPrice'].sum() 
-            st.metric("💵 Tổng tiền", f"{total:,.0f} VND")
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Tạm tính", f"{quote['subtotal']:,.0f} VND")
+            c2.metric("Khuyến mãi", f"-{quote['discount']:,.0f} VND")
+            c3.metric("💵 Tổng tiền", f"{quote['total']:,.0f} VND")
             
             col_pay1, col_pay2 = st.columns(2)
             with col_pay1:
                 if st.button("✅ Thanh toán", type="primary", use_container_width=True):
-                    if st.session_state['current_customer']:
-                        inv_id = create_invoice(
-                            st.session_state['current_customer']['CustomerID'],
+                    if customer:
+                        res = checkout(
+                            st.session_state['basket'],
+                            customer['CustomerID'],
                             st.session_state['current_employee']['EmployeeID'],
-                            "Tiền mặt", total
+                            payment_method,
+                            customer_tier=customer['Tier']
                         )
                         
-                        if inv_id:
-                            for item in st.session_state['basket']:
-                                add_invoice_detail(inv_id, item['ProductID'], item['Quantity'], item['SellingPrice'])
-                                update_stock_after_sale(item['ProductID'], item['Quantity'])
-                            
-                            st.success("🎉 Giao dịch thành công! Đã cập nhật tồn kho.")
+                        if res['success']:
+                            st.success(f"🎉 Giao dịch thành công! Hóa đơn #{res['invoice_id']}: {res['total']:,.0f} VND "
+                                       f"(giảm {res['discount']:,.0f} VND, {res['elapsed_ms']:.0f} ms). Đã cập nhật tồn kho.")
                             st.session_state['basket'] = []
                             st.rerun()
                         else:
-                            st.error("Lỗi tạo hóa đơn")
+                            st.error(f"Lỗi tạo hóa đơn: {res['message']}")
+                            short = [r for r in res['stock'] if r['Status'] != 'ok']
+                            if short:
+                                st.dataframe(pd.DataFrame(short), use_container_width=True)
                     else:
                         st.error("Chưa có thông tin khách hàng")
             with col_pay2:
@@ -288,26 +380,36 @@ elif menu == "📦 Kho & Quầy hàng":
     
     with tab1:
         st.subheader("Danh sách Sản phẩm & Tồn kho")
-        products = get_all_products_with_stock()
+        
+        # Filter (lọc trong SQL)
+        categories = get_all_categories() or []
+        cat_options = {"Tất cả": None, **{c['CategoryName']: c['CategoryID'] for c in categories}}
+        counters = get_all_counters() or []
+        counter_filter = {"Tất cả": None, **{c['CounterName']: c['CounterID'] for c in counters}}
+        f1, f2 = st.columns(2)
+        cat_id = cat_options[f1.selectbox("Lọc theo Danh mục", list(cat_options))]
+        counter_id = counter_filter[f2.selectbox("Lọc theo Quầy", list(counter_filter))]
+        
+        products = keyset_pager(
+            f"stock_page_{cat_id}_{counter_id}",
+            lambda after, limit: get_all_products_with_stock(limit, after, cat_id, counter_id),
+            lambda row: row['ProductID']
+        )
         if products:
-            df = pd.DataFrame(products)
-            
-            # Filter
-            categories = get_all_categories()
-            cat_names = ["Tất cả"] + [c['CategoryName'] for c in categories] if categories else ["Tất cả"]
-            selected_cat = st.selectbox("Lọc theo Danh mục", cat_names)
-            
-            if selected_cat != "Tất cả":
-                df = df[df['CategoryName'] == selected_cat]
-            
-            st.dataframe(df, use_container_width=True)
+            st.dataframe(pd.DataFrame(products), use_container_width=True)
+        else:
+            st.info("Không có sản phẩm phù hợp.")
         
     with tab2:
         st.subheader("🔄 Bổ sung hàng hoá từ Kho lên Quầy")
         
-        wh_items = get_products_in_warehouse()
+        st.write("**Hàng sẵn có trong kho:**")
+        wh_items = keyset_pager(
+            "warehouse_page",
+            lambda after, limit: get_products_in_warehouse(limit=limit, after=after),
+            lambda row: (row['ImportDate'], row['InventoryID'])
+        )
         if wh_items:
-            st.write("**Hàng sẵn có trong kho:**")
             st.dataframe(pd.DataFrame(wh_items), use_container_width=True)
             
             counters = get_all_counters()
@@ -333,6 +435,33 @@ elif menu == "📦 Kho & Quầy hàng":
                             st.success(msg)
                         else:
                             st.error(msg)
+            
+            with st.expander("📄 Chuyển hàng theo kế hoạch (file CSV)"):
+                st.caption(f"Mỗi dòng 1 lệnh chuyển, các cột: {', '.join(TRANSFER_COLUMNS)}. "
+                           "Toàn bộ kế hoạch được kiểm tra và ghi trong 1 giao dịch.")
+                template = pd.DataFrame([[wh_items[0]['InventoryID'], 1, 10, "A1"]], columns=list(TRANSFER_COLUMNS))
+                st.download_button("⬇️ Tải file mẫu", template.to_csv(index=False).encode("utf-8"),
+                                   file_name="transfer_plan.csv", mime="text/csv")
+                plan_file = st.file_uploader("Tải lên kế hoạch chuyển hàng", type=["csv"], key="transfer_plan")
+                atomic = st.checkbox("Chỉ chuyển khi mọi lệnh đều hợp lệ", key="transfer_atomic")
+                if plan_file is not None:
+                    plan = pd.read_csv(plan_file)
+                    missing_cols = [c for c in TRANSFER_COLUMNS if c not in plan.columns]
+                    if missing_cols:
+                        st.error(f"Thiếu cột: {', '.join(missing_cols)}")
+                    else:
+                        plan = plan[list(TRANSFER_COLUMNS)]
+                        st.dataframe(plan, use_container_width=True, hide_index=True)
+                        if st.button(f"✅ Thực hiện {len(plan)} lệnh chuyển", type="primary"):
+                            # Ô trống (NaN) -> None
+                            moves = plan.astype(object).where(plan.notna(), None).to_dict("records")
+                            res = transfer_inventory_batch(moves, atomic=atomic)
+                            if res['success']:
+                                st.success(f"{res['message']} ({res['elapsed_ms']:.0f} ms)")
+                            else:
+                                st.error(f"{res['message']} ({res['elapsed_ms']:.0f} ms)")
+                            if res['results']:
+                                st.dataframe(pd.DataFrame(res['results']), use_container_width=True, hide_index=True)
         else:
             st.info("Không có hàng trong kho.")
                     
@@ -364,6 +493,20 @@ elif menu == "📦 Kho & Quầy hàng":
             st.dataframe(pd.DataFrame(urgent), use_container_width=True)
         else:
             st.success("✅ Không có sản phẩm nào hết hàng trong kho.")
+        
+        with st.form("import_form"):
+            st.write("**📥 Nhập lô hàng mới vào kho:**")
+            c1, c2, c3 = st.columns(3)
+            i_prod = c1.number_input("ID Sản phẩm (ProductID)", min_value=1, step=1, key="import_prod")
+            i_qty = c2.number_input("Số lượng", min_value=1, value=50, step=1, key="import_qty")
+            i_date = c3.date_input("Ngày nhập", date.today(), key="import_date")
+            if st.form_submit_button("📥 Nhập kho", type="primary"):
+                inv_id = import_inventory(int(i_prod), int(i_qty), import_date=i_date)
+                if inv_id:
+                    st.success(f"Đã nhập lô #{inv_id}")
+                    st.rerun()
+                else:
+                    st.error("Lỗi khi nhập kho!")
 
 # ============================================================
 # 4. MANAGEMENT
@@ -384,7 +527,11 @@ elif menu == "🗂 Quản lý Dữ liệu":
             if search:
                 data = search_products(search)
             else:
-                data = get_all_products_with_stock()
+                data = keyset_pager(
+                    "manage_product_page",
+                    lambda after, limit: get_all_products_with_stock(limit, after),
+                    lambda row: row['ProductID']
+                )
                 
             if data:
                 df = pd.DataFrame(data)
@@ -639,19 +786,17 @@ elif menu == "📈 Báo cáo & Xếp hạng":
         
     with tab2:
         st.subheader("🏅 Nhân viên có doanh số cao nhất")
-        col1, col2 = st.columns(2)
-        m = col1.number_input("Tháng", 1, 12, datetime.now().month, key="emp_month")
-        y = col2.number_input("Năm", 2020, 2030, datetime.now().year, key="emp_year")
+        start, end, period = period_picker("emp")
         
-        data = get_employee_rankings_by_month(m, y)
+        data = get_employee_rankings(start, end)
         if data:
             df = pd.DataFrame(data)
             st.dataframe(df, use_container_width=True)
             
-            fig = px.bar(df, x='FullName', y='TotalSales', title=f"Doanh số tháng {m}/{y}", color='PositionName')
+            fig = px.bar(df, x='FullName', y='TotalSales', title=f"Doanh số {period}", color='PositionName')
             st.plotly_chart(fig, use_container_width=True)
         else:
-            st.info("Không có dữ liệu tháng này.")
+            st.info("Không có dữ liệu trong kỳ này.")
             
     with tab3:
         st.subheader("🏭 Xếp hạng Nhà cung cấp")
@@ -669,20 +814,18 @@ elif menu == "📈 Báo cáo & Xếp hạng":
             st.info("Không có dữ liệu.")
             
     with tab4:
-        st.subheader("📊 Doanh thu Sản phẩm theo Tháng")
-        col1, col2 = st.columns(2)
-        m = col1.number_input("Tháng", 1, 12, datetime.now().month, key="prod_month")
-        y = col2.number_input("Năm", 2020, 2030, datetime.now().year, key="prod_year")
+        st.subheader("📊 Doanh thu Sản phẩm theo Kỳ")
+        start, end, period = period_picker("prod")
         
-        data = get_product_rankings_by_revenue_month(m, y)
+        data = get_product_rankings_by_revenue(start, end)
         if data:
             df = pd.DataFrame(data)
             st.dataframe(df, use_container_width=True)
             
-            fig = px.bar(df.head(15), x='ProductName', y='Revenue', title=f"Top 15 Sản phẩm doanh thu cao - Tháng {m}/{y}")
+            fig = px.bar(df.head(15), x='ProductName', y='Revenue', title=f"Top 15 Sản phẩm doanh thu cao - {period}")
             st.plotly_chart(fig, use_container_width=True)
         else:
-            st.info("Không có dữ liệu tháng này.")
+            st.info("Không có dữ liệu trong kỳ này.")
             
     with tab5:
         st.subheader("⏰ Hàng sắp hết hạn & Giảm giá tự động")
@@ -706,25 +849,34 @@ elif menu == "📈 Báo cáo & Xếp hạng":
                 st.success("✅ Không có sản phẩm quá hạn.")
                 
         with sub_tab3:
-            st.write("**Quy tắc giảm giá tự động:**")
-            st.info("- Đồ khô (HSD > 30 ngày): còn dưới 5 ngày → Giảm 50%\n- Rau quả (HSD < 30 ngày): còn dưới 1 ngày → Giảm 50%")
+            st.write("**Quy tắc giảm giá tự động (EXPIRY_DISCOUNT đang hiệu lực):**")
+            rules = get_active_expiry_rules()
+            if rules:
+                st.dataframe(pd.DataFrame(rules), use_container_width=True, hide_index=True)
+            else:
+                st.info("Không có quy tắc giảm giá cận hạn nào đang hiệu lực.")
             
-            auto_disc = get_products_for_auto_discount()
-            if auto_disc:
-                df = pd.DataFrame(auto_disc)
-                st.dataframe(df, use_container_width=True)
-                
-                st.write("**Áp dụng giảm giá:**")
-                prod_to_disc = st.selectbox("Chọn sản phẩm", df['ProductName'].unique())
-                disc_percent = st.slider("Phần trăm giảm (%)", 10, 70, 50)
-                
-                if st.button("✅ Áp dụng Giảm giá", type="primary"):
-                    pid = df[df['ProductName'] == prod_to_disc]['ProductID'].values[0]
-                    apply_discount_near_expiry(pid, disc_percent)
-                    st.success(f"✅ Đã giảm giá {disc_percent}% cho {prod_to_disc}")
-                    st.rerun()
+            # Xem trước (không ghi) rồi mới áp dụng; chạy lại nhiều lần không cộng dồn giảm giá
+            plan = apply_lot_discounts(dry_run=True)
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Lô sẽ thêm / đổi giảm giá", len(plan['upserts']))
+            c2.metric("Lô sẽ bỏ giảm giá", len(plan['deletes']))
+            c3.metric("Lô không đổi", plan['unchanged'])
+            if plan['upserts']:
+                with st.expander("Xem trước thay đổi"):
+                    st.dataframe(pd.DataFrame(plan['upserts']), use_container_width=True, hide_index=True)
+            if st.button("✅ Áp dụng giảm giá cho tất cả lô", type="primary",
+                         disabled=not (plan['upserts'] or plan['deletes'])):
+                result = apply_lot_discounts()
+                st.success(f"✅ Đã cập nhật {len(result['upserts'])} lô, bỏ giảm giá {len(result['deletes'])} lô.")
+                st.rerun()
+            
+            st.write("**Các lô đang được giảm giá:**")
+            lot_disc = get_lot_discounts()
+            if lot_disc:
+                st.dataframe(pd.DataFrame(lot_disc), use_container_width=True, hide_index=True)
             else:
-                st.success("✅ Không có sản phẩm cần giảm giá theo quy tắc tự động.")
+                st.success("✅ Không có lô nào đang giảm giá.")
                 
     with tab6:
         st.subheader("💰 Tính lương Nhân viên (Theo tháng)")
@@ -749,3 +901,101 @@ elif menu == "📈 Báo cáo & Xếp hạng":
                     st.error("Không thể tính lương (Có thể thiếu dữ liệu chấm công hoặc lỗi Procedure).")
             else:
                 st.error("Không tìm thấy nhân viên.")
+        
+        st.divider()
+        st.subheader("📋 Bảng lương toàn bộ nhân viên")
+        verify = st.checkbox("Đối chiếu với procedure (gọi procedure cho từng nhân viên, chậm)", key="payroll_verify")
+        if st.button("🧮 Tính bảng lương", key="payroll_all"):
+            payroll = calculate_payroll(int(s_month), int(s_year))
+            if payroll:
+                df = pd.DataFrame(payroll)
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                st.success(f"💸 Tổng quỹ lương tháng {s_month}/{s_year}: **{df['TotalSalary'].astype(float).sum():,.0f} VND** "
+                           f"({len(df)} nhân viên)")
+                st.download_button("⬇️ Tải CSV", df.to_csv(index=False).encode("utf-8-sig"),
+                                   file_name=f"bang_luong_{s_year}_{s_month:02d}.csv", mime="text/csv")
+                if verify:
+                    mismatches = check_payroll(int(s_month), int(s_year))
+                    if mismatches:
+                        st.error(f"{len(mismatches)} nhân viên lệch so với procedure:")
+                        st.dataframe(pd.DataFrame(mismatches), use_container_width=True, hide_index=True)
+                    elif mismatches is not None:
+                        st.success("✅ Khớp với sp_calculate_employee_salary.")
+            else:
+                st.info("Không có dữ liệu.")
+
+# ============================================================
+# 6. DIAGNOSTICS (ẩn)
+# ============================================================
+elif menu == "🩺 Diagnostics":
+    st.header("🩺 Diagnostics")
+    
+    st.subheader("🔌 Connection Pool")
+    pool = get_pool_stats()
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Pool size", pool['pool_size'])
+    c2.metric("Đang dùng", pool['in_use'])
+    c3.metric("Lần lấy connection", pool['checkouts'])
+    c4.metric("Phải chờ / Cạn pool", f"{pool['waits']} / {pool['exhausted']}")
+    c5.metric("Health check lỗi", pool['health_failures'])
+    
+    st.divider()
+    st.subheader("⏱️ Thời gian truy vấn theo hàm")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        threshold = st.number_input("Ngưỡng slow query (ms)", min_value=1.0, value=float(query_stats.SLOW_QUERY_MS), step=50.0)
+        query_stats.set_slow_threshold(threshold)
+    with col2:
+        explain = st.checkbox("Lấy EXPLAIN cho slow query", value=query_stats.EXPLAIN_SLOW_QUERIES)
+        query_stats.set_explain(explain)
+    with col3:
+        if st.button("🧹 Xóa thống kê"):
+            query_stats.reset_query_stats()
+            st.rerun()
+    
+    stats = query_stats.get_query_stats()
+    if stats:
+        st.dataframe(pd.DataFrame(stats), use_container_width=True, hide_index=True)
+    else:
+        st.info("Chưa có truy vấn nào được ghi nhận.")
+    
+    st.subheader("🗃️ Result cache")
+    cache_stats = get_cache_stats()
+    if cache_stats:
+        st.dataframe(pd.DataFrame(cache_stats), use_container_width=True, hide_index=True)
+    if st.button("🧹 Xóa cache"):
+        clear_cache()
+        st.rerun()
+    
+    st.subheader("🔎 Chỉ mục tìm kiếm sản phẩm")
+    idx = get_search_index_stats()
+    if idx['ready']:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Sản phẩm", f"{idx['products']:,}")
+        c2.metric("Từ khóa", f"{idx['tokens']:,}")
+        c3.metric("Tuổi chỉ mục (s)", idx['age_s'])
+    else:
+        st.info("Chỉ mục đang được dựng – tìm kiếm tạm dùng SQL.")
+    
+    st.subheader("🏷️ Chỉ mục khuyến mãi")
+    promo_idx = get_pricing_index_stats()
+    if promo_idx['ready']:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Sản phẩm có khuyến mãi", f"{promo_idx['products']:,}")
+        c2.metric("Khuyến mãi", ", ".join(f"{k}: {v}" for k, v in sorted(promo_idx['promotions'].items())) or "0")
+        c3.metric("Tuổi chỉ mục (s)", promo_idx['age_s'])
+    else:
+        st.info("Chỉ mục khuyến mãi được nạp ở lần tính giá đầu tiên.")
+    
+    st.subheader("🐢 Slow query log")
+    slow = query_stats.get_slow_queries()
+    if slow:
+        st.dataframe(pd.DataFrame([{k: v for k, v in e.items() if k != 'Explain'} for e in slow]),
+                     use_container_width=True, hide_index=True)
+        for e in slow:
+            if e['Explain']:
+                with st.expander(f"EXPLAIN – {e['Function']} ({e['ElapsedMs']} ms, {e['Time']})"):
+                    st.code(e['SQL'], language="sql")
+                    st.dataframe(pd.DataFrame(e['Explain']), use_container_width=True)
+    else:
+        st.success("✅ Không có slow query.")
@@ -0,0 +1,136 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import importlib.util
+import re
+import mysql.connector
+from app.database import get_connection
+
+# ============================================================
+# SCHEMA MIGRATIONS
+# ============================================================
+# Các thay đổi CSDL sau schema.sql nằm trong app/migrations/, đặt tên
+# NNN_ten_migration.sql hoặc NNN_ten_migration.py (có hàm upgrade(cursor)).
+# Phiên bản đã chạy được lưu trong bảng SCHEMA_MIGRATIONS nên có thể chạy
+# lại lệnh này bất cứ lúc nào trên CSDL đang có dữ liệu:
+#
+#   python app/migrate.py            # áp dụng các migration còn thiếu
+#   python app/migrate.py --status   # xem trạng thái
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+def list_migrations():
+    """[(version, name, path)] theo thứ tự version"""
+    result = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = _FILE_PATTERN.match(filename)
+        if m:
+            result.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(result)
+
+def split_sql(script):
+    """Tách file SQL thành từng câu lệnh, hỗ trợ DELIMITER (cho trigger/procedure)"""
+    statements = []
+    delimiter = ";"
+    buf = []
+    for line in script.splitlines():
+        stripped = line.strip()
+        if not buf and (not stripped or stripped.startswith("--")):
+            continue
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split()[1]
+            continue
+        if stripped.endswith(delimiter):
+            buf.append(line.rstrip()[:-len(delimiter)])
+            statement = "\n".join(buf).strip()
+            if statement:
+                statements.append(statement)
+            buf = []
+        else:
+            buf.append(line)
+    if "\n".join(buf).strip():
+        statements.append("\n".join(buf).strip())
+    return statements
+
+def _ensure_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS SCHEMA_MIGRATIONS (
+        Version INT PRIMARY KEY,
+        Name VARCHAR(150) NOT NULL,
+        AppliedAt DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def applied_versions(cursor):
+    _ensure_table(cursor)
+    cursor.execute("SELECT Version FROM SCHEMA_MIGRATIONS")
+    return {row[0] for row in cursor.fetchall()}
+
+def _run_migration(cursor, path):
+    if path.endswith(".py"):
+        spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for statement in split_sql(f.read()):
+                cursor.execute(statement)
+
+def apply_migrations(conn=None, verbose=True):
+    """Áp dụng các migration chưa chạy. Trả về danh sách version đã áp dụng."""
+    own_conn = conn is None
+    conn = conn or get_connection()
+    cursor = conn.cursor(buffered=True)
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, name, path in list_migrations():
+            if version in done:
+                continue
+            if verbose:
+                print(f"   Migration {version:03d}_{name}...")
+            _run_migration(cursor, path)
+            cursor.execute(
+                "INSERT INTO SCHEMA_MIGRATIONS (Version, Name) VALUES (%s, %s)",
+                (version, name)
+            )
+            conn.commit()
+            applied.append(version)
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print(f"Lỗi migration: {err}")
+        raise
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description="Áp dụng schema migrations cho CSDL siêu thị")
+    parser.add_argument("--status", action="store_true", help="Chỉ xem trạng thái, không áp dụng")
+    args = parser.parse_args()
+
+    if args.status:
+        conn = get_connection()
+        cursor = conn.cursor(buffered=True)
+        done = applied_versions(cursor)
+        conn.commit()
+        for version, name, _ in list_migrations():
+            mark = "x" if version in done else " "
+            print(f"[{mark}] {version:03d}_{name}")
+        cursor.close()
+        conn.close()
+        return
+
+    applied = apply_migrations()
+    print(f"Đã áp dụng {len(applied)} migration." if applied else "CSDL đã ở phiên bản mới nhất.")
+
+if __name__ == "__main__":
+    main()
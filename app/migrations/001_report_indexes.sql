@@ -0,0 +1,17 @@
+-- ============================================================
+-- 001: Index cho các báo cáo theo khoảng thời gian
+-- Các báo cáo lọc bằng khoảng nửa mở CreatedAt >= start AND CreatedAt < end
+-- nên dùng được index trên INVOICE.CreatedAt thay vì quét toàn bảng.
+-- ============================================================
+
+-- Doanh thu theo ngày / tháng, top sản phẩm, hàng bán trong ngày
+CREATE INDEX idx_invoice_createdat ON INVOICE (CreatedAt);
+
+-- Xếp hạng nhân viên theo doanh số trong khoảng thời gian
+CREATE INDEX idx_invoice_employee_createdat ON INVOICE (EmployeeID, CreatedAt);
+
+-- Tổng hợp theo sản phẩm (covering: không cần đọc dòng INVOICE_DETAIL)
+CREATE INDEX idx_invoice_detail_product ON INVOICE_DETAIL (ProductID, Quantity, SellingPrice);
+
+-- Tồn kho theo sản phẩm
+CREATE INDEX idx_inventory_product_qty ON INVENTORY (ProductID, Quantity);
@@ -0,0 +1,24 @@
+-- ============================================================
+-- 002: Bảng tổng hợp doanh số theo ngày cho trang Tổng quan
+-- Được cập nhật trong cùng transaction với checkout (app/rollups.py),
+-- dựng lại từ INVOICE/INVOICE_DETAIL bằng: python app/rollups.py
+-- ============================================================
+
+-- Doanh số theo ngày
+CREATE TABLE IF NOT EXISTS DAILY_SALES (
+    SaleDate DATE PRIMARY KEY,
+    Revenue DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    Quantity INT NOT NULL DEFAULT 0,
+    InvoiceCount INT NOT NULL DEFAULT 0
+);
+
+-- Doanh số theo (ngày, sản phẩm)
+CREATE TABLE IF NOT EXISTS DAILY_PRODUCT_SALES (
+    SaleDate DATE NOT NULL,
+    ProductID INT NOT NULL,
+    Revenue DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    Quantity INT NOT NULL DEFAULT 0,
+    InvoiceCount INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (SaleDate, ProductID),
+    INDEX idx_daily_product_sales_product (ProductID)
+);
@@ -0,0 +1,52 @@
+-- ============================================================
+-- 003: Bảng tổng hợp doanh số theo tháng cho các báo cáo xếp hạng
+-- Cập nhật tăng dần theo InvoiceID (mốc lưu trong SUMMARY_WATERMARK),
+-- dựng lại / kiểm tra bằng: python app/summaries.py --rebuild | --check
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS MONTHLY_PRODUCT_SALES (
+    Year SMALLINT NOT NULL,
+    Month TINYINT NOT NULL,
+    ProductID INT NOT NULL,
+    Revenue DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    Quantity INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Year, Month, ProductID)
+);
+
+CREATE TABLE IF NOT EXISTS MONTHLY_EMPLOYEE_SALES (
+    Year SMALLINT NOT NULL,
+    Month TINYINT NOT NULL,
+    EmployeeID INT NOT NULL,
+    TotalSales DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    InvoiceCount INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Year, Month, EmployeeID)
+);
+
+CREATE TABLE IF NOT EXISTS MONTHLY_CUSTOMER_SALES (
+    Year SMALLINT NOT NULL,
+    Month TINYINT NOT NULL,
+    CustomerID INT NOT NULL,
+    TotalSpent DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    InvoiceCount INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Year, Month, CustomerID),
+    INDEX idx_monthly_customer_sales_customer (CustomerID)
+);
+
+CREATE TABLE IF NOT EXISTS MONTHLY_SUPPLIER_SALES (
+    Year SMALLINT NOT NULL,
+    Month TINYINT NOT NULL,
+    SupplierID INT NOT NULL,
+    Revenue DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    Quantity INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Year, Month, SupplierID),
+    INDEX idx_monthly_supplier_sales_supplier (SupplierID)
+);
+
+-- InvoiceID lớn nhất đã được cộng vào các bảng tổng hợp
+CREATE TABLE IF NOT EXISTS SUMMARY_WATERMARK (
+    Name VARCHAR(50) PRIMARY KEY,
+    LastInvoiceID INT NOT NULL DEFAULT 0,
+    UpdatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO SUMMARY_WATERMARK (Name, LastInvoiceID) VALUES ('MONTHLY_SALES', 0);
@@ -0,0 +1,38 @@
+-- ============================================================
+-- 004: Ảnh chụp tồn kho theo sản phẩm (PRODUCT_STOCK)
+-- Được cập nhật cùng transaction với mọi thay đổi tồn kho (app/stock.py),
+-- kiểm tra / sửa lệch bằng: python app/stock.py --check | --repair
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS PRODUCT_STOCK (
+    ProductID INT PRIMARY KEY,
+    WarehouseQty INT NOT NULL DEFAULT 0,        -- tổng INVENTORY.Quantity
+    CounterQty INT NOT NULL DEFAULT 0,          -- tổng DISPLAYS.CurrentQuantity
+    TotalStock INT AS (WarehouseQty + CounterQty) STORED,
+    LotCount INT NOT NULL DEFAULT 0,            -- số lô còn hàng trong kho
+    DisplayCount INT NOT NULL DEFAULT 0,        -- số dòng trưng bày trên quầy
+    OldestImportDate DATE NULL,                 -- lô còn hàng cũ nhất
+    UpdatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_product_stock_warehouse (WarehouseQty, CounterQty),
+    INDEX idx_product_stock_counter (CounterQty, WarehouseQty),
+    INDEX idx_product_stock_total (TotalStock),
+    FOREIGN KEY (ProductID) REFERENCES PRODUCT(ProductID) ON DELETE CASCADE
+);
+
+-- Dữ liệu ban đầu cho CSDL đang có
+INSERT INTO PRODUCT_STOCK (ProductID, WarehouseQty, CounterQty, LotCount, DisplayCount, OldestImportDate)
+SELECT P.ProductID,
+       IFNULL(W.Qty, 0), IFNULL(D.Qty, 0), IFNULL(W.Lots, 0), IFNULL(D.Slots, 0), W.Oldest
+FROM PRODUCT P
+LEFT JOIN (
+    SELECT ProductID, SUM(Quantity) AS Qty, SUM(Quantity > 0) AS Lots,
+           MIN(CASE WHEN Quantity > 0 THEN ImportDate END) AS Oldest
+    FROM INVENTORY
+    GROUP BY ProductID
+) W ON W.ProductID = P.ProductID
+LEFT JOIN (
+    SELECT I.ProductID, SUM(D.CurrentQuantity) AS Qty, COUNT(*) AS Slots
+    FROM DISPLAYS D
+    JOIN INVENTORY I ON D.InventoryID = I.InventoryID
+    GROUP BY I.ProductID
+) D ON D.ProductID = P.ProductID;
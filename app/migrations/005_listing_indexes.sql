@@ -0,0 +1,6 @@
+-- ============================================================
+-- 005: Index cho danh sách phân trang theo khóa (keyset)
+-- Danh sách lô hàng trong kho sắp xếp và phân trang theo (ImportDate, InventoryID)
+-- ============================================================
+
+CREATE INDEX idx_inventory_importdate ON INVENTORY (ImportDate, InventoryID);
@@ -0,0 +1,35 @@
+# ============================================================
+# 006: Cột tìm kiếm khách hàng
+# PhoneSearch: SĐT bỏ khoảng trắng và đầu số +84 / 0 (tìm chính xác / theo tiền tố)
+# NameFolded: họ tên không dấu, chữ thường (tìm theo tiền tố)
+# Cả hai được ghi bởi create_customer / update_customer và seeder.
+# ============================================================
+
+from app.search import fold_name, normalize_phone
+
+BATCH_SIZE = 5000
+
+def upgrade(cursor):
+    cursor.execute("""
+    ALTER TABLE CUSTOMER
+        ADD COLUMN PhoneSearch VARCHAR(15) NULL,
+        ADD COLUMN NameFolded VARCHAR(100) NULL,
+        ADD INDEX idx_customer_phone_search (PhoneSearch),
+        ADD INDEX idx_customer_name_folded (NameFolded)
+    """)
+
+    # Điền dữ liệu cho khách hàng đang có, theo từng lô CustomerID
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT CustomerID, FullName, Phone FROM CUSTOMER WHERE CustomerID > %s ORDER BY CustomerID LIMIT %s",
+            (last_id, BATCH_SIZE)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE CUSTOMER SET PhoneSearch = %s, NameFolded = %s WHERE CustomerID = %s",
+            [(normalize_phone(phone) or None, fold_name(name), cid) for cid, name, phone in rows]
+        )
+        last_id = rows[-1][0]
@@ -0,0 +1,6 @@
+-- ============================================================
+-- 007: Index cho tính lương theo tháng (calculate_payroll)
+-- Quét khoảng Date của 1 tháng, đủ cột EmployeeID, WorkHours (không đọc bảng)
+-- ============================================================
+
+CREATE INDEX idx_timekeeping_date ON TIMEKEEPING (Date, EmployeeID, WorkHours);
@@ -0,0 +1,11 @@
+-- ============================================================
+-- 008: Số bản ghi chính xác của các bảng (TABLE_STATS)
+-- Được đếm lại định kỳ ở nền bởi app/table_stats.py, thay cho
+-- COUNT(*) trên từng bảng mỗi lần mở trang Tổng quan
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS TABLE_STATS (
+    TableName VARCHAR(64) PRIMARY KEY,
+    RowCount BIGINT NOT NULL,
+    RefreshedAt DATETIME NOT NULL
+);
@@ -0,0 +1,72 @@
+-- ============================================================
+-- 009: Hạn sử dụng lưu sẵn trên từng lô hàng (INVENTORY.ExpiryDate)
+-- ExpiryDate = ImportDate + FOOD_ITEM.ExpiryDays (NULL với hàng không phải thực phẩm),
+-- được trigger giữ đúng khi thêm / sửa lô hàng hoặc sửa ExpiryDays.
+-- Index (HasStock, ExpiryDate): "sắp hết hạn trong N ngày" / "đã hết hạn"
+-- của các lô còn hàng là 1 lần quét khoảng.
+-- ============================================================
+
+ALTER TABLE INVENTORY
+    ADD COLUMN ExpiryDate DATE NULL,
+    ADD COLUMN HasStock TINYINT(1) AS (Quantity > 0) STORED;
+
+UPDATE INVENTORY I
+JOIN FOOD_ITEM F ON F.ProductID = I.ProductID
+SET I.ExpiryDate = DATE_ADD(I.ImportDate, INTERVAL F.ExpiryDays DAY)
+WHERE F.ExpiryDays IS NOT NULL;
+
+CREATE INDEX idx_inventory_expiry ON INVENTORY (HasStock, ExpiryDate);
+
+DROP TRIGGER IF EXISTS trg_before_insert_inventory_expiry;
+DROP TRIGGER IF EXISTS trg_before_update_inventory_expiry;
+DROP TRIGGER IF EXISTS trg_after_insert_food_item_expiry;
+DROP TRIGGER IF EXISTS trg_after_update_food_item_expiry;
+
+DELIMITER //
+
+CREATE TRIGGER trg_before_insert_inventory_expiry
+BEFORE INSERT ON INVENTORY
+FOR EACH ROW
+BEGIN
+    SET NEW.ExpiryDate = (
+        SELECT DATE_ADD(NEW.ImportDate, INTERVAL ExpiryDays DAY)
+        FROM FOOD_ITEM
+        WHERE ProductID = NEW.ProductID
+    );
+END //
+
+CREATE TRIGGER trg_before_update_inventory_expiry
+BEFORE UPDATE ON INVENTORY
+FOR EACH ROW
+BEGIN
+    -- Phần lớn UPDATE chỉ đổi Quantity: không cần tra lại FOOD_ITEM
+    IF NEW.ImportDate <> OLD.ImportDate OR NEW.ProductID <> OLD.ProductID THEN
+        SET NEW.ExpiryDate = (
+            SELECT DATE_ADD(NEW.ImportDate, INTERVAL ExpiryDays DAY)
+            FROM FOOD_ITEM
+            WHERE ProductID = NEW.ProductID
+        );
+    END IF;
+END //
+
+CREATE TRIGGER trg_after_insert_food_item_expiry
+AFTER INSERT ON FOOD_ITEM
+FOR EACH ROW
+BEGIN
+    UPDATE INVENTORY
+    SET ExpiryDate = DATE_ADD(ImportDate, INTERVAL NEW.ExpiryDays DAY)
+    WHERE ProductID = NEW.ProductID;
+END //
+
+CREATE TRIGGER trg_after_update_food_item_expiry
+AFTER UPDATE ON FOOD_ITEM
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.ExpiryDays <=> OLD.ExpiryDays) THEN
+        UPDATE INVENTORY
+        SET ExpiryDate = DATE_ADD(ImportDate, INTERVAL NEW.ExpiryDays DAY)
+        WHERE ProductID = NEW.ProductID;
+    END IF;
+END //
+
+DELIMITER ;
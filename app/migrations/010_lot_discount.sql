@@ -0,0 +1,20 @@
+-- ============================================================
+-- 010: Giảm giá theo lô hàng cận hạn (LOT_DISCOUNT)
+-- Mỗi lô còn hàng đang được giảm giá có 1 dòng, do app/discounts.py tính từ
+-- các quy tắc EXPIRY_DISCOUNT (chạy lại bao nhiêu lần cũng cho cùng kết quả).
+-- PRODUCT.SellingPrice không bị sửa: giá sau giảm nằm ở DiscountedPrice.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS LOT_DISCOUNT (
+    InventoryID INT PRIMARY KEY,
+    ProductID INT NOT NULL,
+    PromotionID INT NOT NULL,                   -- quy tắc EXPIRY_DISCOUNT được áp dụng
+    DiscountPercent FLOAT NOT NULL,
+    BasePrice DECIMAL(15,2) NOT NULL,           -- PRODUCT.SellingPrice lúc tính
+    DiscountedPrice DECIMAL(15,2) NOT NULL,
+    ExpiryDate DATE NOT NULL,
+    UpdatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_lot_discount_product (ProductID, DiscountedPrice),
+    FOREIGN KEY (InventoryID) REFERENCES INVENTORY(InventoryID) ON DELETE CASCADE,
+    FOREIGN KEY (PromotionID) REFERENCES EXPIRY_DISCOUNT(PromotionID) ON DELETE CASCADE
+);
@@ -0,0 +1,19 @@
+-- ============================================================
+-- 011: Khuyến mãi đã áp dụng cho từng dòng hóa đơn (INVOICE_LINE_DISCOUNT)
+-- INVOICE_DETAIL.SellingPrice là giá sau giảm (trigger, bảng tổng hợp giữ
+-- nguyên cách tính); bảng này lưu giá niêm yết và khuyến mãi đã dùng, chỉ có
+-- dòng cho các sản phẩm được giảm giá. Do app/pricing.py tính khi thanh toán.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS INVOICE_LINE_DISCOUNT (
+    InvoiceID INT,
+    ProductID INT,
+    PromotionType VARCHAR(20) NOT NULL,         -- EVENT / MEMBERSHIP / EXPIRY
+    PromotionID INT NOT NULL,
+    DiscountPercent FLOAT NOT NULL,
+    ListPrice DECIMAL(15,2) NOT NULL,           -- giá trước giảm
+    DiscountAmount DECIMAL(15,2) NOT NULL,      -- (ListPrice - SellingPrice) * Quantity
+    PRIMARY KEY (InvoiceID, ProductID),
+    INDEX idx_line_discount_promotion (PromotionType, PromotionID),
+    FOREIGN KEY (InvoiceID, ProductID) REFERENCES INVOICE_DETAIL(InvoiceID, ProductID) ON DELETE CASCADE
+);
@@ -0,0 +1,85 @@
+# ============================================================
+# 012: Cho phép bỏ qua trigger hóa đơn khi nạp dữ liệu hàng loạt
+# Trigger chỉ chạy khi biến phiên @BULK_LOAD chưa được đặt; seeder đặt
+# @BULK_LOAD = 1, ghi INVOICE với TotalAmount cuối cùng rồi tính lại điểm /
+# hạng khách hàng và TotalRevenue nhà cung cấp 1 lần sau khi nạp (app/seeder.py).
+# Nhờ vậy các worker song song không cùng khóa các dòng CUSTOMER / SUPPLIER.
+# Chỉ tạo lại các trigger đã được cài (triggers.sql), giống nội dung trong đó.
+# ============================================================
+
+TRIGGERS = {
+    "trg_after_insert_invoice_detail": """
+CREATE TRIGGER trg_after_insert_invoice_detail
+AFTER INSERT ON INVOICE_DETAIL
+FOR EACH ROW
+BEGIN
+    IF @BULK_LOAD IS NULL THEN
+        UPDATE INVOICE
+        SET TotalAmount = (
+            SELECT IFNULL(SUM(Quantity * SellingPrice), 0)
+            FROM INVOICE_DETAIL
+            WHERE InvoiceID = NEW.InvoiceID
+        )
+        WHERE InvoiceID = NEW.InvoiceID;
+    END IF;
+END
+""",
+    "trg_after_update_invoice_total": """
+CREATE TRIGGER trg_after_update_invoice_total
+AFTER UPDATE ON INVOICE
+FOR EACH ROW
+BEGIN
+    DECLARE v_new_points INT;
+    DECLARE v_new_tier VARCHAR(20);
+
+    -- Chỉ cập nhật khi TotalAmount thay đổi và CustomerID tồn tại
+    IF @BULK_LOAD IS NULL AND NEW.TotalAmount != OLD.TotalAmount AND NEW.CustomerID IS NOT NULL THEN
+        -- Tính điểm mới
+        SELECT Points + FLOOR((NEW.TotalAmount - OLD.TotalAmount) / 10000)
+        INTO v_new_points
+        FROM CUSTOMER
+        WHERE CustomerID = NEW.CustomerID;
+
+        -- Xác định hạng mới dựa trên điểm
+        SET v_new_tier = CASE
+            WHEN v_new_points >= 1000 THEN 'Kim cương'
+            WHEN v_new_points >= 500 THEN 'Vàng'
+            WHEN v_new_points >= 100 THEN 'Bạc'
+            ELSE 'Thành viên'
+        END;
+
+        -- Cập nhật cả điểm và hạng trong 1 lần (tránh trigger lồng)
+        UPDATE CUSTOMER
+        SET Points = v_new_points,
+            Tier = v_new_tier
+        WHERE CustomerID = NEW.CustomerID;
+    END IF;
+END
+""",
+    "trg_after_insert_invoice_detail_supplier": """
+CREATE TRIGGER trg_after_insert_invoice_detail_supplier
+AFTER INSERT ON INVOICE_DETAIL
+FOR EACH ROW
+BEGIN
+    -- Cập nhật doanh thu cho TẤT CẢ nhà cung cấp của sản phẩm này
+    -- Sử dụng bảng SUPPLIES (quan hệ cung cấp chung)
+    IF @BULK_LOAD IS NULL THEN
+        UPDATE SUPPLIER S
+        JOIN SUPPLIES SP ON S.SupplierID = SP.SupplierID
+        SET S.TotalRevenue = S.TotalRevenue + (NEW.Quantity * NEW.SellingPrice)
+        WHERE SP.ProductID = NEW.ProductID;
+    END IF;
+END
+""",
+}
+
+def upgrade(cursor):
+    cursor.execute(
+        "SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()"
+    )
+    installed = {row[0] for row in cursor.fetchall()}
+    for name, body in TRIGGERS.items():
+        if name not in installed:
+            continue
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(body.strip())
@@ -0,0 +1,344 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from app.database import execute_query
+from app.cache import table_versions
+
+# ============================================================
+# TÍNH GIÁ KHUYẾN MÃI CHO GIỎ HÀNG (TRONG BỘ NHỚ)
+# ============================================================
+# Các khuyến mãi còn hiệu lực được nạp 1 lần vào chỉ mục ProductID -> khuyến mãi:
+# - EVENT:      EVENT_PROMOTION + EVENT_PROMOTION_PRODUCT (điều kiện PaymentMethod, MinOrderValue)
+# - MEMBERSHIP: MEMBERSHIP_BENEFIT + MEMBERSHIP_BENEFIT_PROMOTION_PRODUCT (điều kiện RequiredTier,
+#               hạng cao hơn cũng được hưởng; PaymentMethod)
+# - EXPIRY:     giá giảm từng lô trong LOT_DISCOUNT (app/discounts.py), chỉ lô còn hàng
+#               trong kho và chưa hết hạn; chỉ áp cho số lượng bán từ chính lô đó
+#               (phân bổ FIFO trên quầy, xem logic._allocate_counter_stock)
+# Mỗi đơn vị hàng chỉ nhận 1 khuyến mãi có mức giảm cao nhất (không cộng dồn);
+# MinOrderValue so với tổng tiền trước giảm giá.
+#
+# Không cần báo cho chỉ mục khi khuyến mãi thay đổi: mỗi lần get_index() so
+# version các bảng nguồn trong app.cache (tăng khi chính ứng dụng ghi) và nạp
+# lại loại khuyến mãi có bảng vừa bị ghi; toàn bộ được nạp lại sau INDEX_TTL
+# giây (ghi từ tiến trình khác, VD: app/discounts.py --every).
+#
+#   python app/pricing.py --baskets 10000   # đo thời gian tính giá
+
+INDEX_TTL = 300
+
+PAYMENT_METHODS = ['Tiền mặt', 'Thẻ', 'QR Code', 'Ví điện tử']
+
+# Thứ tự hạng thành viên (triggers.sql); hạng không có trong bảng chỉ khớp đúng tên
+TIER_RANK = {'Member': 0, 'Thành viên': 0, 'Bạc': 1, 'Vàng': 2, 'Kim cương': 3}
+
+Promotion = namedtuple("Promotion", "kind promotion_id name percent start end payment_method min_order required_tier")
+Lot = namedtuple("Lot", "promotion inventory_id base_price discounted_price expiry")
+
+PROMOTION_SOURCES = {
+    "EVENT": ("EVENT_PROMOTION", "EVENT_PROMOTION_PRODUCT"),
+    "MEMBERSHIP": ("MEMBERSHIP_BENEFIT", "MEMBERSHIP_BENEFIT_PROMOTION_PRODUCT"),
+    "EXPIRY": ("EXPIRY_DISCOUNT", "LOT_DISCOUNT", "INVENTORY"),
+}
+
+PROMOTION_QUERIES = {
+    "EVENT": """
+    SELECT R.PromotionID, R.PromotionName, R.DiscountPercent, R.StartDate, R.EndDate,
+           R.PaymentMethod, R.MinOrderValue, NULL AS RequiredTier, EP.ProductID
+    FROM EVENT_PROMOTION R
+    JOIN EVENT_PROMOTION_PRODUCT EP ON EP.PromotionID = R.PromotionID
+    WHERE R.EndDate >= CURDATE()
+    """,
+    "MEMBERSHIP": """
+    SELECT R.PromotionID, R.PromotionName, R.DiscountPercent, R.StartDate, R.EndDate,
+           R.PaymentMethod, NULL AS MinOrderValue, R.RequiredTier, MP.ProductID
+    FROM MEMBERSHIP_BENEFIT R
+    JOIN MEMBERSHIP_BENEFIT_PROMOTION_PRODUCT MP ON MP.PromotionID = R.PromotionID
+    WHERE R.EndDate >= CURDATE()
+    """,
+    # 1 dòng mỗi lô đang giảm giá
+    "EXPIRY": """
+    SELECT R.PromotionID, R.PromotionName, R.DiscountPercent, R.StartDate, R.EndDate,
+           R.PaymentMethod, NULL AS MinOrderValue, NULL AS RequiredTier, LD.ProductID,
+           LD.InventoryID, LD.BasePrice, LD.DiscountedPrice, LD.ExpiryDate
+    FROM LOT_DISCOUNT LD
+    JOIN EXPIRY_DISCOUNT R ON R.PromotionID = LD.PromotionID
+    JOIN INVENTORY I ON I.InventoryID = LD.InventoryID
+    WHERE R.EndDate >= CURDATE() AND I.HasStock = 1 AND LD.ExpiryDate >= CURDATE()
+    """,
+}
+
+# Ưu tiên khi 2 khuyến mãi giảm bằng nhau
+_KIND_ORDER = {"EXPIRY": 0, "EVENT": 1, "MEMBERSHIP": 2}
+
+def _preference(promo):
+    return (promo.percent, -_KIND_ORDER[promo.kind], -promo.promotion_id)
+
+def _unit_price(list_price, percent):
+    return float(round(list_price * (1 - percent / 100)))
+
+def _tier_ok(required, tier):
+    if not required:
+        return True
+    rank = TIER_RANK.get(required)
+    if rank is None:
+        return required == tier
+    return TIER_RANK.get(tier, -1) >= rank
+
+class PromotionIndex:
+    def __init__(self):
+        self.by_product = {}    # ProductID -> [Promotion] (EVENT / MEMBERSHIP)
+        self.products = {}      # (loại, PromotionID) -> {ProductID}
+        self.lots = {}          # ProductID -> {InventoryID: Lot} (EXPIRY)
+        self.promotions = {}    # (loại, PromotionID) -> Promotion
+        self.versions = {}      # loại -> version các bảng nguồn lúc nạp
+        self.built_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    def _remove(self, key):
+        promo = self.promotions.pop(key, None)
+        for pid in self.products.pop(key, ()):
+            promos = self.by_product.get(pid)
+            if promos is None:
+                continue
+            promos.remove(promo)
+            if not promos:
+                del self.by_product[pid]
+
+    def load(self, kind):
+        """Nạp lại 1 loại khuyến mãi. Trả về False nếu lỗi truy vấn."""
+        versions = table_versions(PROMOTION_SOURCES[kind])
+        rows = execute_query(PROMOTION_QUERIES[kind], fetch=True)
+        if rows is None:
+            return False
+        with self.lock:
+            for key in [k for k in self.promotions if k[0] == kind]:
+                self._remove(key)
+            if kind == "EXPIRY":
+                self.lots = {}
+            for r in rows:
+                key = (kind, r['PromotionID'])
+                promo = self.promotions.get(key)
+                if promo is None:
+                    promo = self.promotions[key] = Promotion(
+                        kind, r['PromotionID'], r['PromotionName'], float(r['DiscountPercent']),
+                        r['StartDate'], r['EndDate'], r['PaymentMethod'],
+                        float(r['MinOrderValue']) if r['MinOrderValue'] is not None else None,
+                        r['RequiredTier'],
+                    )
+                    if kind != "EXPIRY":
+                        self.products[key] = set()
+                if kind == "EXPIRY":
+                    self.lots.setdefault(r['ProductID'], {})[r['InventoryID']] = Lot(
+                        promo, r['InventoryID'], float(r['BasePrice']), float(r['DiscountedPrice']), r['ExpiryDate'],
+                    )
+                else:
+                    self.products[key].add(r['ProductID'])
+                    self.by_product.setdefault(r['ProductID'], []).append(promo)
+            self.versions[kind] = versions
+        return True
+
+    def best(self, product_id, subtotal, tier, payment_method, today):
+        """Khuyến mãi giảm nhiều nhất áp dụng được cho sản phẩm, hoặc None"""
+        best = None
+        for p in self.by_product.get(product_id, ()):
+            if not (p.start <= today <= p.end):
+                continue
+            if p.payment_method and p.payment_method != payment_method:
+                continue
+            if p.min_order is not None and subtotal < p.min_order:
+                continue
+            if not _tier_ok(p.required_tier, tier):
+                continue
+            if best is None or _preference(p) > _preference(best):
+                best = p
+        return best
+
+    def lot_price(self, product_id, inventory_id, list_price, payment_method, today):
+        """(đơn giá, Lot) nếu lô đang được giảm giá, ngược lại None"""
+        lot = self.lots.get(product_id, {}).get(inventory_id)
+        if lot is None or lot.expiry < today:
+            return None
+        p = lot.promotion
+        if not (p.start <= today <= p.end) or (p.payment_method and p.payment_method != payment_method):
+            return None
+        # DiscountedPrice tính theo giá niêm yết lúc đánh giá; giá đã đổi thì tính lại theo %
+        if lot.base_price == list_price:
+            return lot.discounted_price, lot
+        return _unit_price(list_price, p.percent), lot
+
+    def price(self, lines, tier=None, payment_method=None, today=None, lots=None):
+        """Tính giá các dòng {ProductID, Quantity, SellingPrice (giá niêm yết)}.
+        lots: {ProductID: {InventoryID: số lượng}} lấy từ từng lô trên quầy; không truyền thì
+        không áp giảm giá lô cận hạn. Dòng lấy từ nhiều lô có đơn giá bình quân (làm tròn 2 số lẻ),
+        khuyến mãi ghi nhận là khuyến mãi giảm nhiều tiền nhất trên dòng."""
+        today = today or date.today()
+        lots = lots or {}
+        list_prices = [float(l.get('ListPrice', l['SellingPrice'])) for l in lines]
+        subtotal = sum(l['Quantity'] * price for l, price in zip(lines, list_prices))
+        priced = []
+        discount = 0.0
+        with self.lock:
+            for l, list_price in zip(lines, list_prices):
+                qty = l['Quantity']
+                promo = self.best(l['ProductID'], subtotal, tier, payment_method, today)
+                unit = _unit_price(list_price, promo.percent) if promo else list_price
+                # Số tiền giảm theo từng khuyến mãi trên dòng
+                savings = {promo: (list_price - unit) * qty} if promo else {}
+                rest = qty
+                for inventory_id, n in lots.get(l['ProductID'], {}).items():
+                    found = self.lot_price(l['ProductID'], inventory_id, list_price, payment_method, today)
+                    if found is None or found[0] >= unit:
+                        continue
+                    n = min(n, rest)
+                    rest -= n
+                    lot_promo = found[1].promotion
+                    savings[lot_promo] = savings.get(lot_promo, 0.0) + (list_price - found[0]) * n
+                    if promo:
+                        savings[promo] -= (list_price - unit) * n
+                used = {p: v for p, v in savings.items() if v > 0}
+                best = max(used, key=lambda p: (used[p], _preference(p))) if used else None
+                line_total = list_price * qty - sum(used.values())
+                selling = round(line_total / qty, 2) if qty else list_price
+                line_discount = (list_price - selling) * qty
+                if len(used) > 1:
+                    percent = round(line_discount / (list_price * qty) * 100, 2)
+                else:
+                    percent = best.percent if best else 0.0
+                discount += line_discount
+                priced.append({
+                    **l,
+                    'ListPrice': list_price,
+                    'SellingPrice': selling,
+                    'DiscountPercent': percent,
+                    'Discount': line_discount,
+                    'PromotionType': best.kind if best else None,
+                    'PromotionID': best.promotion_id if best else None,
+                    'PromotionName': best.name if best else None,
+                })
+        return {
+            'lines': priced,
+            'subtotal': subtotal,
+            'discount': discount,
+            'total': subtotal - discount,
+        }
+
+_index = None
+_index_lock = threading.Lock()  # chỉ giữ khi đọc / thay _index, không giữ khi truy vấn CSDL
+_reloading = False              # có thread đang nạp lại chỉ mục
+
+def build_index():
+    """Nạp toàn bộ khuyến mãi vào chỉ mục mới rồi thay cho chỉ mục cũ"""
+    global _index
+    index = PromotionIndex()
+    for kind in PROMOTION_SOURCES:
+        if not index.load(kind):
+            return None
+    with _index_lock:
+        _index = index
+    return index
+
+def get_index():
+    """Chỉ mục hiện tại: dựng lại nếu chưa có / quá INDEX_TTL, nạp lại loại khuyến mãi có bảng vừa bị ghi.
+    Việc nạp chạy ngoài _index_lock; trong lúc 1 thread đang nạp, các thread khác dùng chỉ mục hiện có.
+    Có truy vấn CSDL (connection riêng từ pool) nên không gọi trong transaction đang giữ khóa dòng."""
+    global _reloading
+    with _index_lock:
+        index = _index
+        rebuild = index is None or time.monotonic() - index.built_at > INDEX_TTL
+        stale = [] if rebuild else [
+            kind for kind, tables in PROMOTION_SOURCES.items()
+            if index.versions.get(kind) != table_versions(tables)
+        ]
+        if not rebuild and not stale:
+            return index
+        if _reloading and index is not None:
+            return index
+        _reloading = True
+    try:
+        if rebuild:
+            return build_index() or index
+        for kind in stale:
+            index.load(kind)
+        return index
+    finally:
+        with _index_lock:
+            _reloading = False
+
+def has_lot_discounts(product_ids):
+    """Có sản phẩm nào đang có lô được giảm giá (cần biết lô bán ra để tính giá)"""
+    index = get_index()
+    return index is not None and any(pid in index.lots for pid in product_ids)
+
+def price_basket(lines, tier=None, payment_method=None, lots=None, index=None):
+    """Giá từng dòng sau khuyến mãi: {'lines', 'subtotal', 'discount', 'total'}.
+    lots: số lượng lấy từ từng lô (xem PromotionIndex.price).
+    index: chỉ mục đã lấy trước bằng get_index() (VD: trước khi mở transaction).
+    Không đọc được khuyến mãi thì tính theo giá niêm yết."""
+    index = index or get_index() or PromotionIndex()
+    return index.price(lines, tier, payment_method, lots=lots)
+
+def get_index_stats():
+    index = _index
+    if index is None:
+        return {"ready": False}
+    kinds = {}
+    for kind, _ in index.promotions:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    return {
+        "ready": True,
+        "products": len(index.by_product.keys() | index.lots.keys()),
+        "promotions": kinds,
+        "lots": sum(len(lots) for lots in index.lots.values()),
+        "age_s": round(time.monotonic() - index.built_at, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Nạp khuyến mãi và đo thời gian tính giá giỏ hàng")
+    parser.add_argument("--baskets", type=int, default=10000, help="Số giỏ hàng ngẫu nhiên")
+    parser.add_argument("--items", type=int, default=8, help="Số sản phẩm mỗi giỏ")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build_index()
+    if index is None:
+        print("Không đọc được khuyến mãi.")
+        sys.exit(1)
+    print(f"Nạp {len(index.promotions)} khuyến mãi cho {len(index.by_product):,} sản phẩm "
+          f"trong {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    products = execute_query("SELECT ProductID, SellingPrice FROM PRODUCT", fetch=True) or []
+    if not products:
+        return
+    # Giỏ hàng có khoảng nửa số dòng là sản phẩm đang khuyến mãi
+    promoted = [p for p in products if p['ProductID'] in index.by_product] or products
+    rng = random.Random(42)
+    baskets = []
+    for _ in range(args.baskets):
+        items = rng.sample(promoted, min(args.items // 2, len(promoted))) + \
+                rng.sample(products, min(args.items - args.items // 2, len(products)))
+        baskets.append([
+            {'ProductID': p['ProductID'], 'Quantity': rng.randint(1, 5), 'SellingPrice': float(p['SellingPrice'])}
+            for p in {p['ProductID']: p for p in items}.values()
+        ])
+    tiers = list(TIER_RANK)
+
+    started = time.perf_counter()
+    discounted = 0
+    for i, basket in enumerate(baskets):
+        result = index.price(basket, tiers[i % len(tiers)], PAYMENT_METHODS[i % len(PAYMENT_METHODS)])
+        discounted += result['discount'] > 0
+    elapsed = time.perf_counter() - started
+    print(f"Tính giá {len(baskets):,} giỏ ({args.items} SP) trong {elapsed * 1000:.0f} ms: "
+          f"{elapsed / len(baskets) * 1e6:.1f} µs/giỏ, {discounted:,} giỏ được giảm giá")
+
+if __name__ == "__main__":
+    main()
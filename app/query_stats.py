@@ -0,0 +1,170 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# ============================================================
+# QUERY INSTRUMENTATION
+# ============================================================
+# Ghi lại thời gian chạy, số dòng, số byte đọc về của mọi câu truy vấn
+# đi qua execute_query / call_stored_procedure / transaction, gom theo
+# hàm trong app.logic đã gọi nó.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+EXPLAIN_SLOW_QUERIES = os.getenv("QUERY_EXPLAIN", "0") == "1"
+SAMPLE_SIZE = 1000      # số mẫu thời gian giữ lại cho mỗi hàm (để tính p50/p95/p99)
+SLOW_LOG_SIZE = 200
+
+# Các hàm hạ tầng trong app.logic, không tính là "hàm gọi truy vấn"
+_SKIP_CALLERS = {"call_stored_procedure"}
+
+_lock = threading.Lock()
+_functions = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+def set_slow_threshold(ms):
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = float(ms)
+
+def set_explain(enabled):
+    global EXPLAIN_SLOW_QUERIES
+    EXPLAIN_SLOW_QUERIES = bool(enabled)
+
+def _caller():
+    """Tên hàm trong app.logic đã phát sinh câu truy vấn (ưu tiên hàm public)"""
+    frame = sys._getframe(2)
+    first = None
+    while frame is not None:
+        name = frame.f_code.co_name
+        if frame.f_globals.get("__name__") == "app.logic" and name not in _SKIP_CALLERS:
+            if not name.startswith("_"):
+                return name
+            if first is None:
+                first = name
+        frame = frame.f_back
+    return first or "(ngoài app.logic)"
+
+def estimate_bytes(rows):
+    """Ước lượng số byte dữ liệu đọc về từ kết quả truy vấn"""
+    if not rows:
+        return 0
+    if isinstance(rows, dict):
+        rows = [rows]
+    total = 0
+    for row in rows:
+        values = row.values() if isinstance(row, dict) else row
+        for v in values:
+            if v is None:
+                continue
+            if isinstance(v, (str, bytes, bytearray)):
+                total += len(v)
+            else:
+                total += 8
+    return total
+
+def _explain(sql, params):
+    # Import muộn để tránh vòng lặp import với app.database
+    from app.database import get_connection
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("EXPLAIN " + sql, params)
+        return cursor.fetchall()
+    except Exception as err:
+        return [{"error": str(err)}]
+    finally:
+        cursor.close()
+        conn.close()
+
+def record(sql, params, elapsed_ms, rows=0, nbytes=0, error=None, caller=None):
+    """Ghi nhận 1 lần chạy truy vấn"""
+    caller = caller or _caller()
+    with _lock:
+        stats = _functions.get(caller)
+        if stats is None:
+            stats = _functions[caller] = {
+                "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "rows": 0, "bytes": 0, "samples": deque(maxlen=SAMPLE_SIZE),
+            }
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["rows"] += rows
+        stats["bytes"] += nbytes
+        stats["samples"].append(elapsed_ms)
+        if error:
+            stats["errors"] += 1
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        entry = {
+            "Time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Function": caller,
+            "ElapsedMs": round(elapsed_ms, 2),
+            "Rows": rows,
+            "Bytes": nbytes,
+            "SQL": " ".join(sql.split()),
+            "Explain": None,
+        }
+        if EXPLAIN_SLOW_QUERIES and sql.lstrip().upper().startswith("SELECT"):
+            entry["Explain"] = _explain(sql, params)
+        with _lock:
+            _slow_log.append(entry)
+
+class track:
+    """Đo thời gian một khối nhiều câu lệnh (VD: transaction) như 1 mẫu:
+
+        with track("TRANSACTION"):
+            ...
+    """
+    def __init__(self, label):
+        self.label = label
+        self.caller = None
+
+    def __enter__(self):
+        self.caller = _caller()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        record(self.label, None, elapsed_ms, error=exc, caller=self.caller)
+        return False
+
+def _percentile(sorted_samples, p):
+    if not sorted_samples:
+        return 0.0
+    k = max(0, min(len(sorted_samples) - 1, int(round(p / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[k]
+
+def get_query_stats():
+    """Thống kê theo hàm: số lần gọi, p50/p95/p99, số dòng và byte trung bình"""
+    with _lock:
+        snapshot = {name: dict(s, samples=sorted(s["samples"])) for name, s in _functions.items()}
+    result = []
+    for name, s in snapshot.items():
+        samples = s["samples"]
+        result.append({
+            "Function": name,
+            "Calls": s["calls"],
+            "Errors": s["errors"],
+            "p50 (ms)": round(_percentile(samples, 50), 2),
+            "p95 (ms)": round(_percentile(samples, 95), 2),
+            "p99 (ms)": round(_percentile(samples, 99), 2),
+            "Max (ms)": round(s["max_ms"], 2),
+            "Total (ms)": round(s["total_ms"], 2),
+            "Avg rows": round(s["rows"] / s["calls"], 1) if s["calls"] else 0,
+            "Total bytes": s["bytes"],
+        })
+    result.sort(key=lambda r: r["Total (ms)"], reverse=True)
+    return result
+
+def get_slow_queries():
+    with _lock:
+        return list(reversed(_slow_log))
+
+def reset_query_stats():
+    with _lock:
+        _functions.clear()
+        _slow_log.clear()
@@ -0,0 +1,126 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from app.database import transaction
+from app.cache import invalidates
+
+# ============================================================
+# BẢNG TỔNG HỢP DOANH SỐ THEO NGÀY (DAILY_SALES, DAILY_PRODUCT_SALES)
+# ============================================================
+# Trang Tổng quan đọc từ 2 bảng này thay vì gom lại INVOICE/INVOICE_DETAIL
+# mỗi lần mở. Các hàm add_* nhận cursor của transaction đang chạy để bảng
+# tổng hợp luôn khớp với hóa đơn (cùng commit / rollback).
+# Dữ liệu ghi thẳng vào INVOICE ngoài ứng dụng cần dựng lại:
+#
+#   python app/rollups.py                                  # dựng lại toàn bộ
+#   python app/rollups.py --from 2025-01-01 --to 2025-01-31
+
+ROLLUP_TABLES = ("DAILY_SALES", "DAILY_PRODUCT_SALES")
+
+_MIN_DATE = "1000-01-01"
+_MAX_DATE = "9999-12-31"
+
+def add_invoice(cursor, invoice_id):
+    """Cộng 1 hóa đơn (cùng các dòng chi tiết hiện có) vào bảng tổng hợp"""
+    # Cột đích ghi rõ tên bảng: INVOICE_DETAIL cũng có cột Quantity
+    cursor.execute("""
+    INSERT INTO DAILY_PRODUCT_SALES (SaleDate, ProductID, Revenue, Quantity, InvoiceCount)
+    SELECT DATE(I.CreatedAt), ID.ProductID, ID.Quantity * ID.SellingPrice, ID.Quantity, 1
+    FROM INVOICE I
+    JOIN INVOICE_DETAIL ID ON ID.InvoiceID = I.InvoiceID
+    WHERE I.InvoiceID = %s
+    ON DUPLICATE KEY UPDATE
+        DAILY_PRODUCT_SALES.Revenue = DAILY_PRODUCT_SALES.Revenue + VALUES(Revenue),
+        DAILY_PRODUCT_SALES.Quantity = DAILY_PRODUCT_SALES.Quantity + VALUES(Quantity),
+        DAILY_PRODUCT_SALES.InvoiceCount = DAILY_PRODUCT_SALES.InvoiceCount + 1
+    """, (invoice_id,))
+    cursor.execute("""
+    INSERT INTO DAILY_SALES (SaleDate, Revenue, Quantity, InvoiceCount)
+    SELECT DATE(I.CreatedAt), I.TotalAmount,
+           (SELECT IFNULL(SUM(ID.Quantity), 0) FROM INVOICE_DETAIL ID WHERE ID.InvoiceID = I.InvoiceID),
+           1
+    FROM INVOICE I
+    WHERE I.InvoiceID = %s
+    ON DUPLICATE KEY UPDATE
+        DAILY_SALES.Revenue = DAILY_SALES.Revenue + VALUES(Revenue),
+        DAILY_SALES.Quantity = DAILY_SALES.Quantity + VALUES(Quantity),
+        DAILY_SALES.InvoiceCount = DAILY_SALES.InvoiceCount + 1
+    """, (invoice_id,))
+
+def add_invoice_line(cursor, sale_date, product_id, quantity, selling_price, revenue_delta):
+    """Cộng 1 dòng chi tiết thêm vào hóa đơn đã có.
+    revenue_delta: phần TotalAmount của hóa đơn thay đổi sau khi thêm dòng."""
+    cursor.execute("""
+    INSERT INTO DAILY_PRODUCT_SALES (SaleDate, ProductID, Revenue, Quantity, InvoiceCount)
+    VALUES (%s, %s, %s, %s, 1)
+    ON DUPLICATE KEY UPDATE
+        Revenue = Revenue + VALUES(Revenue),
+        Quantity = Quantity + VALUES(Quantity),
+        InvoiceCount = InvoiceCount + 1
+    """, (sale_date, product_id, quantity * selling_price, quantity))
+    cursor.execute("""
+    INSERT INTO DAILY_SALES (SaleDate, Revenue, Quantity, InvoiceCount)
+    VALUES (%s, %s, %s, 0)
+    ON DUPLICATE KEY UPDATE
+        Revenue = Revenue + VALUES(Revenue),
+        Quantity = Quantity + VALUES(Quantity)
+    """, (sale_date, revenue_delta, quantity))
+
+@invalidates(*ROLLUP_TABLES)
+def rebuild_rollups(start=None, end=None):
+    """Dựng lại bảng tổng hợp cho các ngày trong [start, end) từ INVOICE/INVOICE_DETAIL.
+    Trả về số ngày có doanh số."""
+    start = start or _MIN_DATE
+    end = end or _MAX_DATE
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM DAILY_PRODUCT_SALES WHERE SaleDate >= %s AND SaleDate < %s", (start, end))
+        cursor.execute("DELETE FROM DAILY_SALES WHERE SaleDate >= %s AND SaleDate < %s", (start, end))
+        cursor.execute("""
+        INSERT INTO DAILY_PRODUCT_SALES (SaleDate, ProductID, Revenue, Quantity, InvoiceCount)
+        SELECT DATE(I.CreatedAt), ID.ProductID, SUM(ID.Quantity * ID.SellingPrice), SUM(ID.Quantity), COUNT(*)
+        FROM INVOICE I
+        JOIN INVOICE_DETAIL ID ON ID.InvoiceID = I.InvoiceID
+        WHERE I.CreatedAt >= %s AND I.CreatedAt < %s
+        GROUP BY DATE(I.CreatedAt), ID.ProductID
+        """, (start, end))
+        cursor.execute("""
+        INSERT INTO DAILY_SALES (SaleDate, Revenue, Quantity, InvoiceCount)
+        SELECT DATE(CreatedAt), SUM(TotalAmount), 0, COUNT(*)
+        FROM INVOICE
+        WHERE CreatedAt >= %s AND CreatedAt < %s
+        GROUP BY DATE(CreatedAt)
+        """, (start, end))
+        days = cursor.rowcount
+        cursor.execute("""
+        UPDATE DAILY_SALES S
+        JOIN (
+            SELECT SaleDate, SUM(Quantity) AS Quantity
+            FROM DAILY_PRODUCT_SALES
+            WHERE SaleDate >= %s AND SaleDate < %s
+            GROUP BY SaleDate
+        ) P ON P.SaleDate = S.SaleDate
+        SET S.Quantity = P.Quantity
+        """, (start, end))
+    return days
+
+def main():
+    parser = argparse.ArgumentParser(description="Dựng lại bảng tổng hợp doanh số theo ngày")
+    parser.add_argument("--from", dest="start", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                        help="Ngày đầu (YYYY-MM-DD), mặc định toàn bộ lịch sử")
+    parser.add_argument("--to", dest="end", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                        help="Ngày cuối (YYYY-MM-DD, tính cả ngày này)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    end = args.end + timedelta(days=1) if args.end else None
+    days = rebuild_rollups(args.start, end)
+    print(f"Đã dựng lại {days} ngày doanh số trong {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
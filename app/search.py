@@ -0,0 +1,367 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from app.database import execute_query
+
+# ============================================================
+# CHỈ MỤC TÌM KIẾM SẢN PHẨM TRONG BỘ NHỚ
+# ============================================================
+# Tên sản phẩm và tên danh mục được chuẩn hóa (chữ thường, bỏ dấu, đ -> d)
+# rồi tách thành từ; mỗi từ trỏ tới tập ProductID. Từ khóa "ca chua" khớp
+# "Cà chua" theo tiền tố từng từ, không cần quét bảng PRODUCT.
+# Chỉ mục được dựng ở thread nền lần đầu dùng (khi đó search() trả None để
+# caller tìm bằng SQL), cập nhật từng sản phẩm khi CRUD trong ứng dụng và
+# dựng lại sau INDEX_TTL giây để thấy thay đổi từ tiến trình khác.
+
+INDEX_TTL = 300
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+def fold(text):
+    """Chuẩn hóa để so khớp không dấu: 'Cà Chua Đà Lạt' -> 'ca chua da lat'"""
+    if not text:
+        return ""
+    text = str(text).lower().replace("đ", "d")
+    text = unicodedata.normalize("NFD", text)
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+def fold_name(text):
+    """Tên đã chuẩn hóa để lưu / so khớp (CUSTOMER.NameFolded): 'Nguyễn Văn  An' -> 'nguyen van an'"""
+    return " ".join(tokenize(text))
+
+def normalize_phone(text):
+    """Số điện thoại bỏ khoảng trắng, dấu và đầu số +84 / 0 (CUSTOMER.PhoneSearch):
+    '+84 912 345 678', '0912.345.678' -> '912345678'. Trả về '' nếu không có chữ số."""
+    if not text:
+        return ""
+    text = str(text).strip()
+    digits = "".join(c for c in text if c.isdigit())
+    if text.startswith("+84") or (digits.startswith("84") and len(digits) >= 11):
+        return digits[2:]
+    return digits[1:] if digits.startswith("0") else digits
+
+# Cột trả về, giống câu SQL dự phòng trong logic.search_products
+RESULT_COLUMNS = ("ProductID", "ProductName", "SellingPrice", "Unit", "CategoryName")
+
+def _add_posting(vocab, postings, token, value, sort=True):
+    items = postings.get(token)
+    if items is None:
+        items = postings[token] = []
+        bisect.insort(vocab, token)
+    if sort:
+        bisect.insort(items, value)
+    else:
+        items.append(value)
+
+def _remove_posting(vocab, postings, token, value):
+    items = postings.get(token)
+    if items is None:
+        return
+    i = bisect.bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        del items[i]
+    if not items:
+        del postings[token]
+        del vocab[bisect.bisect_left(vocab, token)]
+
+def _matching_tokens(vocab, term):
+    """Các từ bắt đầu bằng term; nếu không có thì các từ chứa term"""
+    i = bisect.bisect_left(vocab, term)
+    tokens = []
+    while i < len(vocab) and vocab[i].startswith(term):
+        tokens.append(vocab[i])
+        i += 1
+    if not tokens:
+        tokens = [t for t in vocab if term in t]
+    return tokens
+
+def _stream(lists):
+    """Duyệt các danh sách đã sắp xếp theo thứ tự chung (lười, không gộp trước)"""
+    if len(lists) == 1:
+        return iter(lists[0])
+    return heapq.merge(*lists)
+
+# Duyệt tuần tự 1 phần tử (Python) tốn khoảng bằng STREAM_COST phần tử khi giao tập hợp (C)
+STREAM_COST = 60
+
+class ProductSearchIndex:
+    def __init__(self):
+        self.docs = {}          # ProductID -> (row, các từ trong tên, CategoryID)
+        self.rank = {}          # ProductID -> (độ dài tên, ProductID): tên ngắn xếp trước
+        self.vocab = []         # các từ trong tên sản phẩm (đã sắp xếp)
+        self.postings = {}      # từ -> [rank] đã sắp xếp (duyệt theo thứ tự, dừng sớm)
+        self.posting_sets = {}  # từ -> {ProductID} (giao / hợp nhanh)
+        self.cat_vocab = []
+        self.cat_postings = {}  # từ -> [CategoryID]
+        self.categories = {}    # CategoryID -> các từ trong tên danh mục
+        self.by_category = {}   # CategoryID -> [rank] đã sắp xếp
+        self.category_sets = {} # CategoryID -> {ProductID}
+        self.built_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    def add(self, row, sort=True):
+        """Thêm / thay 1 sản phẩm. sort=False khi nạp hàng loạt, gọi finalize() sau cùng."""
+        with self.lock:
+            pid = row['ProductID']
+            if pid in self.docs:
+                self.remove(pid)
+            tokens = tuple(dict.fromkeys(tokenize(row['ProductName'])))
+            cid = row['CategoryID']
+            self.docs[pid] = ({c: row[c] for c in RESULT_COLUMNS}, tokens, cid)
+            key = self.rank[pid] = (len(fold(row['ProductName'])), pid)
+            for t in tokens:
+                _add_posting(self.vocab, self.postings, t, key, sort)
+                self.posting_sets.setdefault(t, set()).add(pid)
+            if cid not in self.categories:
+                self.categories[cid] = tuple(dict.fromkeys(tokenize(row['CategoryName'])))
+                for t in self.categories[cid]:
+                    _add_posting(self.cat_vocab, self.cat_postings, t, cid)
+            members = self.by_category.setdefault(cid, [])
+            if sort:
+                bisect.insort(members, key)
+            else:
+                members.append(key)
+            self.category_sets.setdefault(cid, set()).add(pid)
+
+    def finalize(self):
+        """Sắp xếp các danh sách sau khi nạp hàng loạt bằng add(sort=False)"""
+        with self.lock:
+            for items in self.postings.values():
+                items.sort()
+            for items in self.by_category.values():
+                items.sort()
+
+    def remove(self, pid):
+        with self.lock:
+            doc = self.docs.pop(pid, None)
+            if doc is None:
+                return
+            _, tokens, cid = doc
+            key = self.rank.pop(pid)
+            for t in tokens:
+                _remove_posting(self.vocab, self.postings, t, key)
+                ids = self.posting_sets.get(t)
+                if ids is not None:
+                    ids.discard(pid)
+                    if not ids:
+                        del self.posting_sets[t]
+            members = self.by_category.get(cid)
+            if members is not None:
+                i = bisect.bisect_left(members, key)
+                if i < len(members) and members[i] == key:
+                    del members[i]
+                self.category_sets[cid].discard(pid)
+
+    def _term_sources(self, term, prefix):
+        """(danh sách rank, tập ProductID) của các từ trong tên khớp term,
+        và của các danh mục có tên khớp term"""
+        # Từ đã gõ xong (không phải từ cuối) chỉ khớp nguyên từ nếu có: "ca chua" không kéo theo "camera"
+        if not prefix and term in self.postings:
+            names = [term]
+        else:
+            names = _matching_tokens(self.vocab, term)
+        cat_tokens = [term] if not prefix and term in self.cat_postings else _matching_tokens(self.cat_vocab, term)
+        cids = {cid for t in cat_tokens for cid in self.cat_postings[t] if cid in self.by_category}
+        return ([(self.postings[t], self.posting_sets[t]) for t in names],
+                [(self.by_category[c], self.category_sets[c]) for c in cids])
+
+    def _fill(self, sources, result, seen, limit):
+        """Thêm vào result (theo thứ tự rank) các sản phẩm khớp MỌI từ khóa, đến khi đủ limit.
+        sources: với mỗi từ khóa, các cặp (danh sách rank, tập ProductID) khớp từ khóa đó."""
+        if not all(sources):
+            return False
+        sizes = [sum(len(ids) for _, ids in src) for src in sources]
+        order = sorted(range(len(sources)), key=sizes.__getitem__)
+        # Duyệt danh sách của từ khóa hiếm nhất theo rank, kiểm tra các từ khóa còn lại trên
+        # từng sản phẩm, dừng ngay khi đủ limit (khớp dày). Nếu duyệt đã tốn bằng việc giao
+        # tập hợp mà chưa đủ (khớp thưa) thì giao các tập rồi lấy top phần còn lại: mọi
+        # sản phẩm khớp có rank nhỏ hơn vị trí đang duyệt đều đã được lấy.
+        budget = sizes[order[0]] // STREAM_COST if len(sources) > 1 else None
+        others = [[ids for _, ids in sources[i]] for i in order[1:]]
+        for walked, (_, pid) in enumerate(_stream([items for items, _ in sources[order[0]]])):
+            if budget is not None and walked >= budget:
+                break
+            if pid in seen or not all(any(pid in ids for ids in sets) for sets in others):
+                continue
+            seen.add(pid)
+            result.append(pid)
+            if len(result) >= limit:
+                return True
+        else:
+            return False
+        need = limit - len(result)
+        candidates = None
+        for i in order:
+            sets = [ids for _, ids in sources[i]]
+            if candidates is None:
+                candidates = sets[0] if len(sets) == 1 else set().union(*sets)
+            else:
+                candidates = candidates & sets[0] if len(sets) == 1 else set().union(*(candidates & ids for ids in sets))
+            if not candidates:
+                return False
+        rank = self.rank
+        top = [pid for _, pid in heapq.nsmallest(need, [rank[pid] for pid in candidates if pid not in seen])]
+        seen.update(top)
+        result.extend(top)
+        return len(result) >= limit
+
+    def search(self, query, limit=20):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        with self.lock:
+            sources = [self._term_sources(t, prefix=(i == len(terms) - 1)) for i, t in enumerate(terms)]
+            result, seen = [], set()
+            # Hạng: mọi từ khóa là từ trong tên > mọi từ khóa có trong tên > khớp nhờ tên danh mục
+            tiers = (
+                [[(self.postings[t], self.posting_sets[t])] if t in self.postings else [] for t in terms],
+                [names for names, _ in sources],
+                [names + cats for names, cats in sources],
+            )
+            for tier in tiers:
+                if self._fill(tier, result, seen, limit):
+                    break
+            return [dict(self.docs[pid][0]) for pid in result]
+
+_index = None
+_building = False
+_state_lock = threading.Lock()
+# Sản phẩm được refresh_products() cập nhật trong lúc có chỉ mục đang dựng:
+# [(thế hệ, ProductID)], để chỉ mục mới (đọc từ CSDL trước đó) áp dụng lại
+_generation = 0
+_builds_running = 0
+_changes = []
+
+def _load_rows(product_ids=None):
+    query = """
+    SELECT P.ProductID, P.ProductName, P.SellingPrice, P.Unit, P.CategoryID, C.CategoryName
+    FROM PRODUCT P
+    JOIN CATEGORY C ON P.CategoryID = C.CategoryID
+    """
+    params = None
+    if product_ids is not None:
+        query += f" WHERE P.ProductID IN ({', '.join(['%s'] * len(product_ids))})"
+        params = list(product_ids)
+    return execute_query(query, params, fetch=True)
+
+def build_index():
+    """Dựng chỉ mục mới từ CSDL (đồng bộ) rồi thay cho chỉ mục cũ"""
+    global _index, _building, _builds_running
+    with _state_lock:
+        _builds_running += 1
+        started_at = _generation
+    index = None
+    changed = set()
+    try:
+        rows = _load_rows()
+        if rows is not None:
+            index = ProductSearchIndex()
+            for row in rows:
+                index.add(row, sort=False)
+            index.finalize()
+    finally:
+        with _state_lock:
+            _builds_running -= 1
+            _building = False
+            if index is not None:
+                # Các thay đổi trong lúc dựng đã được ghi vào chỉ mục cũ, có thể chưa có trong rows
+                changed = {pid for gen, pid in _changes if gen > started_at}
+                _index = index
+            if not _builds_running:
+                _changes.clear()
+    if changed:
+        _apply(index, changed)
+    return index
+
+def _is_fresh(index):
+    return index is not None and time.monotonic() - index.built_at <= INDEX_TTL
+
+def warm_up():
+    """Dựng chỉ mục ở thread nền nếu chưa có hoặc đã cũ (bỏ qua nếu đang dựng)"""
+    global _building
+    with _state_lock:
+        if _building or _is_fresh(_index):
+            return
+        _building = True
+    threading.Thread(target=build_index, name="product-search-index", daemon=True).start()
+
+def search(query, limit=20):
+    """Kết quả xếp hạng từ chỉ mục, hoặc None nếu chỉ mục chưa sẵn sàng"""
+    index = _index
+    if not _is_fresh(index):
+        warm_up()
+    if index is None:
+        return None
+    return index.search(query, limit)
+
+def _apply(index, product_ids):
+    rows = _load_rows(product_ids)
+    if rows is None:
+        return
+    found = set()
+    for row in rows:
+        index.add(row)
+        found.add(row['ProductID'])
+    for pid in product_ids:
+        if pid not in found:
+            index.remove(pid)
+
+def refresh_products(product_ids):
+    """Cập nhật chỉ mục cho các sản phẩm vừa thêm / sửa / xóa"""
+    global _generation
+    product_ids = [int(pid) for pid in product_ids if pid]
+    if not product_ids:
+        return
+    with _state_lock:
+        index = _index
+        if _builds_running:
+            _generation += 1
+            _changes.extend((_generation, pid) for pid in product_ids)
+    if index is not None:
+        _apply(index, product_ids)
+
+def get_index_stats():
+    index = _index
+    if index is None:
+        return {"ready": False, "building": _building}
+    return {
+        "ready": True,
+        "building": _building,
+        "products": len(index.docs),
+        "tokens": len(index.vocab),
+        "age_s": round(time.monotonic() - index.built_at, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Dựng chỉ mục tìm kiếm sản phẩm và đo thời gian truy vấn")
+    parser.add_argument("queries", nargs="*", default=["ca chua", "sua tuoi", "banh"], help="Từ khóa cần thử")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build_index()
+    if index is None:
+        print("Không đọc được danh sách sản phẩm.")
+        sys.exit(1)
+    print(f"Dựng chỉ mục {len(index.docs):,} sản phẩm trong {(time.perf_counter() - started) * 1000:.0f} ms")
+    for q in args.queries:
+        started = time.perf_counter()
+        results = index.search(q)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"'{q}': {len(results)} kết quả trong {elapsed:.3f} ms")
+        for r in results[:5]:
+            print(f"   #{r['ProductID']} {r['ProductName']} ({r['CategoryName']})")
+
+if __name__ == "__main__":
+    main()
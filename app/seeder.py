@@ -4,11 +4,21 @@ import os
 # Add parent directory to path to allow importing app modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import argparse
+import multiprocessing
 import random
+import time
 from faker import Faker
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 import mysql.connector
 from app.database import get_connection
+from app.migrate import apply_migrations
+from app.search import fold_name, normalize_phone
+from app.rollups import rebuild_rollups
+from app.summaries import rebuild_summaries
+from app.stock import rebuild_product_stock
+from app.table_stats import refresh_exact_counts
+from app.discounts import apply_lot_discounts
 
 # Update Faker to use Vietnamese locale
 fake = Faker('vi_VN')
@@ -139,7 +149,284 @@ POSITIONS = [
 
 CUSTOMER_TIERS = ['Thành viên', 'Bạc', 'Vàng', 'Kim cương']
 
-def run_seeder():
+# ============================================================
+# BULK WRITER
+# ============================================================
+
+# Các bảng ghi theo lô, theo thứ tự cha -> con để không vi phạm khóa ngoại
+BULK_TABLES = {
+    "CUSTOMER": ("CustomerID", "FullName", "Phone", "Points", "Tier", "PhoneSearch", "NameFolded"),
+    "INVENTORY": ("InventoryID", "ImportDate", "Quantity", "WarehouseID", "ProductID"),
+    "DISPLAYS": ("InventoryID", "CounterID", "Position", "MaxQuantity", "CurrentQuantity"),
+    "TIMEKEEPING": ("TimekeepingID", "Date", "WorkHours", "EmployeeID"),
+    "INVOICE": ("InvoiceID", "CreatedAt", "PaymentMethod", "TotalAmount", "EmployeeID", "CustomerID"),
+    "INVOICE_DETAIL": ("InvoiceID", "ProductID", "Quantity", "SellingPrice"),
+}
+
+class BulkWriter:
+    """Gom các dòng theo bảng và ghi bằng executemany (INSERT nhiều dòng).
+    batch_size=1 tương đương ghi từng dòng như trước."""
+
+    def __init__(self, conn, batch_size=1000, commit_every=50000):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.buffers = {t: [] for t in BULK_TABLES}
+        self.stats = {t: [0, 0.0] for t in BULK_TABLES}  # [số dòng, số giây]
+        self.pending = 0
+        self.sql = {
+            t: f"INSERT INTO {t} ({', '.join(cols)}) VALUES ({', '.join(['%s'] * len(cols))})"
+            for t, cols in BULK_TABLES.items()
+        }
+
+    def add(self, table, row):
+        buf = self.buffers[table]
+        buf.append(row)
+        if len(buf) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for table, buf in self.buffers.items():
+            if not buf:
+                continue
+            started = time.perf_counter()
+            self.cursor.executemany(self.sql[table], buf)
+            self.stats[table][0] += len(buf)
+            self.stats[table][1] += time.perf_counter() - started
+            self.pending += len(buf)
+            buf.clear()
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def rollback(self):
+        """Hủy các dòng chưa commit (kể cả dòng còn trong bộ đệm)"""
+        self.conn.rollback()
+        for buf in self.buffers.values():
+            buf.clear()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.commit()
+        self.cursor.close()
+
+    def report(self):
+        for table, (rows, seconds) in self.stats.items():
+            if rows:
+                rate = rows / seconds if seconds > 0 else float("inf")
+                print(f"   {table:<16} {rows:>10,} dòng  {seconds:>8.2f}s  {rate:>12,.0f} dòng/s")
+
+# ============================================================
+# OPERATIONS THEO NGÀY (có thể chạy song song nhiều tiến trình)
+# ============================================================
+# Mỗi ngày có RNG riêng sinh từ (seed, ngày) và dải ID được cấp trước,
+# nên dữ liệu giống hệt nhau dù chạy 1 hay nhiều worker.
+# Mỗi ngày được commit riêng; deadlock / lock wait timeout thì rollback và
+# sinh lại đúng ngày đó (cùng RNG nên cùng dữ liệu).
+
+DAY_RETRIES = 3
+
+_worker_ctx = None
+
+def _init_worker(ctx):
+    global _worker_ctx
+    _worker_ctx = ctx
+
+def _plan_day(ctx, day_offset):
+    """Số lô nhập, nhân viên đi làm và số hóa đơn của 1 ngày (để cấp trước dải ID)"""
+    rng = random.Random(f"{ctx['base_seed']}:plan:{day_offset}")
+    current_date = ctx["start_date"] + timedelta(days=day_offset)
+    is_weekend = current_date.weekday() >= 5  # Cuối tuần đông hơn
+    
+    # Import Inventory - nhiều hơn (tăng theo số lượng sản phẩm)
+    num_imports = rng.randint(10, 20) * ctx["products_multiplier"]
+    # Timekeeping: 92% attendance
+    attendance = [emp_id for emp_id in ctx["employee_ids"] if rng.random() < 0.92]
+    # Create Invoices - MODERATE (giảm xuống cho demo hợp lý)
+    # DEMO (SF=1): ~30-50 hóa đơn/ngày (hợp lý hơn cho báo cáo)
+    # Cuối tuần đông hơn 50%
+    base_invoices = rng.randint(ctx["base_min"], ctx["base_max"])
+    num_invoices = int(base_invoices * 1.5) if is_weekend else base_invoices
+    return num_imports, attendance, num_invoices
+
+def _generate_day(ctx, writer, day_offset, plan, first_ids):
+    """Sinh và ghi dữ liệu của 1 ngày. Trả về (số hóa đơn, doanh thu)"""
+    rng = random.Random(f"{ctx['base_seed']}:rows:{day_offset}")
+    num_imports, attendance, num_invoices = plan
+    next_inventory_id, next_timekeeping_id, next_invoice_id = first_ids
+    current_date = ctx["start_date"] + timedelta(days=day_offset)
+    product_ids = ctx["product_ids"]
+    
+    for _ in range(num_imports):
+        prod_id = rng.choice(product_ids)
+        qty = rng.randint(50, 200)
+        inv_id = next_inventory_id
+        next_inventory_id += 1
+        
+        # Transfer 50% to counter (tối đa MaxQuantity = 100)
+        max_display = 100
+        transfer_qty = min(int(qty * 0.5), max_display)
+        counter_id = ctx["product_counter"].get(prod_id)
+        if counter_id is None or transfer_qty <= 0:
+            transfer_qty = 0
+        writer.add("INVENTORY", (inv_id, current_date, qty - transfer_qty, ctx["warehouse_id"], prod_id))
+        if transfer_qty > 0:
+            writer.add("DISPLAYS", (
+                inv_id, counter_id,
+                f"Kệ {rng.choice(['A', 'B', 'C', 'D'])}{rng.randint(1, 10)}",
+                max_display, transfer_qty
+            ))
+    
+    for emp_id in attendance:
+        hours = rng.uniform(7, 10)
+        writer.add("TIMEKEEPING", (next_timekeeping_id, current_date, round(hours, 1), emp_id))
+        next_timekeeping_id += 1
+    
+    revenue = 0
+    for _ in range(num_invoices):
+        cust_id = rng.choice(ctx["customer_ids"])
+        emp_id = rng.choice(ctx["sales_staff_ids"]) # Only Sales Staff make invoices
+        payment = rng.choices(
+            ['Tiền mặt', 'Thẻ', 'QR Code', 'Ví điện tử'],
+            weights=[40, 25, 25, 10]  # Tiền mặt phổ biến nhất
+        )[0]
+        invoice_id = next_invoice_id
+        next_invoice_id += 1
+        
+        total_amount = 0
+        details = []
+        # Mỗi hóa đơn có 3-12 sản phẩm (thực tế hơn)
+        num_items = rng.randint(3, 12)
+        chosen_products = rng.sample(product_ids, min(num_items, len(product_ids)))
+        
+        for pid in chosen_products:
+            # Số lượng mỗi sản phẩm: 1-8 (mua nhiều hơn cho thực phẩm)
+            qty = rng.choices(
+                [1, 2, 3, 4, 5, 6, 7, 8],
+                weights=[20, 30, 20, 15, 8, 4, 2, 1]  # 1-2 phổ biến nhất
+            )[0]
+            price = ctx["product_prices"][pid]
+            details.append((invoice_id, pid, qty, price))
+            total_amount += float(price) * qty
+        
+        # INVOICE phải được ghi trước INVOICE_DETAIL (BulkWriter ghi theo thứ tự bảng).
+        # TotalAmount ghi sẵn giá trị cuối cùng: trigger hóa đơn bị tắt bằng @BULK_LOAD
+        writer.add("INVOICE", (invoice_id, current_date, payment, total_amount, emp_id, cust_id))
+        for row in details:
+            writer.add("INVOICE_DETAIL", row)
+        revenue += total_amount
+    
+    return num_invoices, revenue
+
+def _seed_days(task):
+    """Worker: sinh 1 dải ngày trên connection riêng"""
+    ctx = _worker_ctx
+    conn = get_connection()
+    # Tắt trigger hóa đơn trong phiên này (migration 012); điểm khách hàng tính lại sau khi nạp
+    cursor = conn.cursor()
+    cursor.execute("SET @BULK_LOAD = 1")
+    cursor.close()
+    # Chỉ commit theo ngày (không commit giữa ngày) để ngày lỗi được sinh lại trọn vẹn
+    writer = BulkWriter(conn, batch_size=ctx["batch_size"], commit_every=float("inf"))
+    invoices, revenue = 0, 0
+    try:
+        for day_offset, plan, first_ids in task:
+            for attempt in range(DAY_RETRIES):
+                stats = {t: list(v) for t, v in writer.stats.items()}
+                try:
+                    n, r = _generate_day(ctx, writer, day_offset, plan, first_ids)
+                    writer.flush()
+                    writer.commit()
+                    break
+                except mysql.connector.Error as err:
+                    writer.rollback()
+                    writer.stats = stats
+                    if err.errno not in (1205, 1213) or attempt + 1 == DAY_RETRIES:
+                        raise
+                    time.sleep(0.1 * (attempt + 1))
+            invoices += n
+            revenue += r
+        writer.close()
+    finally:
+        conn.close()
+    return len(task), invoices, revenue, writer.stats
+
+def _credit_customer_points(cursor):
+    """Cộng điểm cho các hóa đơn vừa sinh (1 điểm / 10.000 VND mỗi hóa đơn) và xếp lại hạng
+    theo quy tắc của trg_after_update_invoice_total, bằng vài câu UPDATE trên cả bảng.
+    INVOICE đã được xóa trắng lúc bắt đầu nên mọi hóa đơn đều là hóa đơn mới."""
+    cursor.execute("""
+    UPDATE CUSTOMER C
+    JOIN (
+        SELECT CustomerID, SUM(FLOOR(TotalAmount / 10000)) AS Earned
+        FROM INVOICE
+        WHERE CustomerID IS NOT NULL
+        GROUP BY CustomerID
+    ) X ON X.CustomerID = C.CustomerID
+    SET C.Points = C.Points + X.Earned
+    """)
+    # UPDATE nhiều bảng không đảm bảo thứ tự các phép gán nên xếp hạng ở câu riêng
+    cursor.execute("""
+    UPDATE CUSTOMER SET Tier = CASE
+        WHEN Points >= 1000 THEN 'Kim cương'
+        WHEN Points >= 500 THEN 'Vàng'
+        WHEN Points >= 100 THEN 'Bạc'
+        ELSE 'Thành viên'
+    END
+    """)
+
+def _credit_supplier_revenue(cursor):
+    """Cộng doanh thu các dòng hóa đơn vừa sinh cho mọi nhà cung cấp của sản phẩm
+    (như trg_after_insert_invoice_detail_supplier), gom theo sản phẩm trước rồi mới JOIN SUPPLIES."""
+    cursor.execute("""
+    UPDATE SUPPLIER S
+    JOIN (
+        SELECT SP.SupplierID, SUM(D.Revenue) AS Revenue
+        FROM (
+            SELECT ProductID, SUM(Quantity * SellingPrice) AS Revenue
+            FROM INVOICE_DETAIL
+            GROUP BY ProductID
+        ) D
+        JOIN SUPPLIES SP ON SP.ProductID = D.ProductID
+        GROUP BY SP.SupplierID
+    ) X ON X.SupplierID = S.SupplierID
+    SET S.TotalRevenue = S.TotalRevenue + X.Revenue
+    """)
+
+def scale_config(scale=1.0, days=None, customers=None, employees=None,
+                 products_multiplier=None, invoices_per_day=None):
+    """Quy mô dữ liệu theo scale factor (kiểu TPC). SF=1 là bộ dữ liệu demo gốc:
+    31 ngày, 150 khách hàng, 10 nhân viên, ~40 hóa đơn/ngày (~9 nghìn dòng INVOICE_DETAIL).
+    SF=100: ~490 ngày, 15.000 khách, ~4.000 hóa đơn/ngày (~15 triệu dòng INVOICE_DETAIL).
+    Các tham số truyền vào sẽ ghi đè giá trị suy ra từ scale."""
+    return {
+        "days": days or max(1, round(31 * scale ** 0.6)),
+        "customers": customers or max(1, round(150 * scale)),
+        "employees": employees or max(10, round(10 * scale ** 0.5)),
+        "products_multiplier": products_multiplier or max(1, round(scale ** 0.5)),
+        # Số hóa đơn trung bình ngày thường (cuối tuần x1.5)
+        "invoices_per_day": invoices_per_day or max(1, round(40 * scale)),
+    }
+
+def run_seeder(bulk=True, batch_size=1000, scale=1.0, days=None, customers=None,
+               employees=None, products_multiplier=None, invoices_per_day=None,
+               seed=None, end_date=None, workers=1):
+    """Sinh dữ liệu mẫu.
+    bulk=True: ghi theo lô batch_size dòng và commit theo khối lớn (bước 10: commit theo ngày);
+    bulk=False: ghi từng dòng (chậm, giữ để so sánh).
+    seed + end_date cố định -> bộ dữ liệu giống hệt nhau giữa các lần chạy.
+    workers > 1: bước 10 (giao dịch) chia theo dải ngày, chạy song song nhiều tiến trình."""
+    config = scale_config(scale, days, customers, employees, products_multiplier, invoices_per_day)
+    if seed is not None:
+        random.seed(seed)
+        Faker.seed(seed)
+    today = end_date or date.today()
+    
     try:
         conn = get_connection()
         cursor = conn.cursor()
@@ -150,6 +437,15 @@ def run_seeder():
     print("=" * 60)
     print("BẮT ĐẦU SINH DỮ LIỆU MẪU CHO SIÊU THỊ")
     print("=" * 60)
+    print(f"Scale factor: {scale} | {config['days']} ngày | {config['customers']:,} khách hàng | "
+          f"{config['employees']} nhân viên | x{config['products_multiplier']} sản phẩm | "
+          f"~{config['invoices_per_day']:,} hóa đơn/ngày | seed={seed}")
+    seed_started = time.perf_counter()
+    writer = BulkWriter(conn, batch_size=batch_size if bulk else 1,
+                        commit_every=50000 if bulk else 1)
+    
+    # Đảm bảo CSDL có đủ các bảng/index bổ sung sau schema.sql
+    apply_migrations(conn)
     
     # Disable FK checks to allow truncation
     cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
@@ -160,7 +456,10 @@ def run_seeder():
         "SUPPLIER_PHONE", "INDUSTRIAL_MANUFACTURER", "LOCAL_FARMER", "SUPPLIER",
         "EMPLOYEE", "POSITION", "CUSTOMER", "COUNTER", "WAREHOUSE", "CATEGORY",
         "EVENT_PROMOTION", "MEMBERSHIP_BENEFIT", "EXPIRY_DISCOUNT",
-        "EVENT_PROMOTION_PRODUCT", "MEMBERSHIP_BENEFIT_PROMOTION_PRODUCT"
+        "EVENT_PROMOTION_PRODUCT", "MEMBERSHIP_BENEFIT_PROMOTION_PRODUCT",
+        "DAILY_SALES", "DAILY_PRODUCT_SALES",
+        "MONTHLY_PRODUCT_SALES", "MONTHLY_EMPLOYEE_SALES", "MONTHLY_CUSTOMER_SALES", "MONTHLY_SUPPLIER_SALES",
+        "PRODUCT_STOCK", "LOT_DISCOUNT", "INVOICE_LINE_DISCOUNT"
     ]
     
     for table in tables:
@@ -277,12 +576,17 @@ def run_seeder():
     manager_id = cursor.lastrowid
     
     employee_ids = [manager_id]
+    employee_positions = {manager_id: position_ids["Quản lý cửa hàng"]}
     employee_names = [
         "Trần Thị Bình", "Lê Văn Cường", "Phạm Thị Dung", "Hoàng Văn Em",
         "Ngô Thị Phương", "Đỗ Văn Giang", "Vũ Thị Hoa", "Bùi Văn Inh", "Lý Thị Kim"
     ]
     other_positions = [p for p in position_ids.keys() if p != "Quản lý cửa hàng"]
     
+    # Quy mô lớn: thêm nhân viên với tên ngẫu nhiên
+    while len(employee_names) < config["employees"] - 1:
+        employee_names.append(fake.name())
+    
     for name in employee_names:
         pos = random.choice(other_positions)
         cursor.execute(
@@ -290,6 +594,7 @@ def run_seeder():
             (name, fake.date_of_birth(minimum_age=20, maximum_age=35), fake.address()[:200], fake.phone_number()[:15], position_ids[pos], manager_id)
         )
         employee_ids.append(cursor.lastrowid)
+        employee_positions[cursor.lastrowid] = position_ids[pos]
     conn.commit()
     
     # ============================================================
@@ -297,17 +602,26 @@ def run_seeder():
     # ============================================================
     print("[7/10] Tạo Khách hàng...")
     customer_ids = []
-    # Tăng lên 150 khách hàng với phân bố hạng cân đối hơn
-    for _ in range(150):
+    used_phones = set()
+    cursor.execute("SELECT IFNULL(MAX(CustomerID), 0) FROM CUSTOMER")
+    next_customer_id = cursor.fetchone()[0] + 1
+    # Mặc định 150 khách hàng (SF=1) với phân bố hạng cân đối hơn
+    for _ in range(config["customers"]):
         tier = random.choices(CUSTOMER_TIERS, weights=[40, 30, 20, 10])[0]  # Cân đối hơn
         points = {"Thành viên": random.randint(0, 99), "Bạc": random.randint(100, 499), 
                   "Vàng": random.randint(500, 999), "Kim cương": random.randint(1000, 2500)}[tier]
-        cursor.execute(
-            "INSERT INTO CUSTOMER (FullName, Phone, Points, Tier) VALUES (%s, %s, %s, %s)", 
-            (fake.name(), fake.phone_number()[:15], points, tier)
-        )
-        customer_ids.append(cursor.lastrowid)
-    conn.commit()
+        # Phone là UNIQUE: 1 số trùng sẽ làm hỏng cả lô INSERT
+        phone = fake.phone_number()[:15]
+        while phone in used_phones:
+            phone = fake.phone_number()[:15]
+        used_phones.add(phone)
+        fullname = fake.name()
+        writer.add("CUSTOMER", (next_customer_id, fullname, phone, points, tier,
+                                normalize_phone(phone) or None, fold_name(fullname)))
+        customer_ids.append(next_customer_id)
+        next_customer_id += 1
+    writer.flush()
+    writer.commit()
     
     # ============================================================
     # 8. PRODUCTS
@@ -316,65 +630,71 @@ def run_seeder():
     product_ids = []
     food_product_ids = []
     electronic_product_ids = []
+    product_prices = {}      # ProductID -> SellingPrice (tránh SELECT lại khi sinh hóa đơn)
+    product_counter = {}     # ProductID -> CounterID của danh mục
     
-    for cat_name, products in PRODUCTS_BY_CATEGORY.items():
-        cat_id = category_ids[cat_name]
+    # products_multiplier > 1: nhân bản danh mục sản phẩm thành nhiều "loại"
+    for variant in range(config["products_multiplier"]):
+        for cat_name, products in PRODUCTS_BY_CATEGORY.items():
+            cat_id = category_ids[cat_name]
         
-        for prod in products:
-            import_price = prod["import_price"]
-            selling_price = round(import_price * random.uniform(1.2, 1.5), -3)  # 20-50% margin
+            for prod in products:
+                product_name = prod["name"] if variant == 0 else f"{prod['name']} - Loại {variant + 1}"
+                import_price = prod["import_price"]
+                selling_price = round(import_price * random.uniform(1.2, 1.5), -3)  # 20-50% margin
             
-            cursor.execute(
-                "INSERT INTO PRODUCT (ProductName, ImportPrice, SellingPrice, Unit, CategoryID) VALUES (%s, %s, %s, %s, %s)",
-                (prod["name"], import_price, selling_price, prod["unit"], cat_id)
-            )
-            pid = cursor.lastrowid
-            product_ids.append(pid)
-            
-            # Food items
-            if "expiry_days" in prod:
                 cursor.execute(
-                    "INSERT INTO FOOD_ITEM (ProductID, ExpiryDays, SafetyThreshold) VALUES (%s, %s, %s)",
-                    (pid, prod["expiry_days"], prod.get("safety_threshold", 7))
+                    "INSERT INTO PRODUCT (ProductName, ImportPrice, SellingPrice, Unit, CategoryID) VALUES (%s, %s, %s, %s, %s)",
+                    (product_name, import_price, selling_price, prod["unit"], cat_id)
                 )
-                food_product_ids.append(pid)
+                pid = cursor.lastrowid
+                product_ids.append(pid)
+                product_prices[pid] = selling_price
+                product_counter[pid] = counter_ids[cat_name]
+            
+                # Food items
+                if "expiry_days" in prod:
+                    cursor.execute(
+                        "INSERT INTO FOOD_ITEM (ProductID, ExpiryDays, SafetyThreshold) VALUES (%s, %s, %s)",
+                        (pid, prod["expiry_days"], prod.get("safety_threshold", 7))
+                    )
+                    food_product_ids.append(pid)
                 
-                # Link to farmer supplier via SPECIAL_SUPPLY
-                if cat_name in ["Thực phẩm", "Đồ uống"]:
-                    farmer_sid = random.choice(farmer_ids)
-                    try:
-                        cursor.execute(
-                            "INSERT INTO SPECIAL_SUPPLY (SupplierID, ProductID) VALUES (%s, %s)",
-                            (farmer_sid, pid)
-                        )
-                    except:
-                        pass  # Ignore duplicate key
+                    # Link to farmer supplier via SPECIAL_SUPPLY
+                    if cat_name in ["Thực phẩm", "Đồ uống"]:
+                        farmer_sid = random.choice(farmer_ids)
+                        try:
+                            cursor.execute(
+                                "INSERT INTO SPECIAL_SUPPLY (SupplierID, ProductID) VALUES (%s, %s)",
+                                (farmer_sid, pid)
+                            )
+                        except:
+                            pass  # Ignore duplicate key
             
-            # Electronic items
-            elif "warranty_months" in prod:
-                mfr_sid = random.choice(manufacturer_ids)
-                cursor.execute(
-                    "INSERT INTO ELECTRONIC_ITEM (ProductID, WarrantyMonths, SupplierID) VALUES (%s, %s, %s)",
-                    (pid, prod["warranty_months"], mfr_sid)
-                )
-                electronic_product_ids.append(pid)
+                # Electronic items
+                elif "warranty_months" in prod:
+                    mfr_sid = random.choice(manufacturer_ids)
+                    cursor.execute(
+                        "INSERT INTO ELECTRONIC_ITEM (ProductID, WarrantyMonths, SupplierID) VALUES (%s, %s, %s)",
+                        (pid, prod["warranty_months"], mfr_sid)
+                    )
+                    electronic_product_ids.append(pid)
             
-            # General supplies link
-            supplier_id = random.choice(farmer_ids + manufacturer_ids)
-            try:
-                cursor.execute(
-                    "INSERT INTO SUPPLIES (SupplierID, ProductID) VALUES (%s, %s)",
-                    (supplier_id, pid)
-                )
-            except:
-                pass
+                # General supplies link
+                supplier_id = random.choice(farmer_ids + manufacturer_ids)
+                try:
+                    cursor.execute(
+                        "INSERT INTO SUPPLIES (SupplierID, ProductID) VALUES (%s, %s)",
+                        (supplier_id, pid)
+                    )
+                except:
+                    pass
     conn.commit()
     
     # ============================================================
     # 9. PROMOTIONS
     # ============================================================
     print("[9/10] Tạo Khuyến mãi...")
-    today = date.today()
     
     # Event Promotions
     events = [
@@ -446,127 +766,91 @@ def run_seeder():
     # ============================================================
     # 10. OPERATIONS (30 DAYS) - REALISTIC VOLUME
     # ============================================================
-    print("[10/10] Sinh dữ liệu giao dịch 30 ngày (khối lượng lớn)...")
-    start_date = today - timedelta(days=30)
+    num_days = config["days"]
+    print(f"[10/10] Sinh dữ liệu giao dịch {num_days} ngày (khối lượng lớn, {workers} worker)...")
+    base_min = max(1, round(config["invoices_per_day"] * 0.75))
+    base_max = max(base_min, round(config["invoices_per_day"] * 1.25))
+    
+    # Sales Staff IDs only (đã biết từ bước 6, không cần truy vấn lại)
+    sales_position_id = position_ids["Nhân viên bán hàng"]
+    sales_staff_ids = [eid for eid, pos_id in employee_positions.items() if pos_id == sales_position_id]
+    if not sales_staff_ids:
+        # Fallback if no sales staff (shouldn't happen)
+        sales_staff_ids = employee_ids
+    
+    ctx = {
+        # Seed gốc cho từng ngày: cố định nếu có --seed
+        "base_seed": seed if seed is not None else random.randrange(2 ** 63),
+        "start_date": today - timedelta(days=num_days - 1),
+        "products_multiplier": config["products_multiplier"],
+        "base_min": base_min,
+        "base_max": base_max,
+        "warehouse_id": warehouse_id,
+        "product_ids": product_ids,
+        "product_prices": product_prices,
+        "product_counter": product_counter,
+        "customer_ids": customer_ids,
+        "employee_ids": employee_ids,
+        "sales_staff_ids": sales_staff_ids,
+        "batch_size": writer.batch_size,
+    }
+    
+    # Cấp trước dải ID cho INVENTORY / TIMEKEEPING / INVOICE của từng ngày
+    # để các worker không tranh chấp AUTO_INCREMENT và dữ liệu không phụ thuộc số worker
+    first_ids = []
+    for table, key in (("INVENTORY", "InventoryID"), ("TIMEKEEPING", "TimekeepingID"), ("INVOICE", "InvoiceID")):
+        cursor.execute(f"SELECT IFNULL(MAX({key}), 0) FROM {table}")
+        first_ids.append(cursor.fetchone()[0] + 1)
+    tasks = []
+    for day_offset in range(num_days):
+        plan = _plan_day(ctx, day_offset)
+        tasks.append((day_offset, plan, tuple(first_ids)))
+        first_ids[0] += plan[0]
+        first_ids[1] += len(plan[1])
+        first_ids[2] += plan[2]
+    
+    # Chia thành nhiều phân đoạn liên tiếp (nhiều hơn số worker để cân tải)
+    chunk = max(1, -(-num_days // (workers * 4)))
+    partitions = [tasks[i:i + chunk] for i in range(0, num_days, chunk)]
     
     total_invoices_created = 0
     total_revenue_generated = 0
-    
-    for day_offset in range(31):
-        current_date = start_date + timedelta(days=day_offset)
-        is_weekend = current_date.weekday() >= 5  # Cuối tuần đông hơn
-        
-        # Import Inventory - nhiều hơn
-        for _ in range(random.randint(10, 20)):
-            prod_id = random.choice(product_ids)
-            qty = random.randint(50, 200)
-            cursor.execute(
-                "INSERT INTO INVENTORY (ImportDate, Quantity, WarehouseID, ProductID) VALUES (%s, %s, %s, %s)",
-                (current_date, qty, warehouse_id, prod_id)
-            )
-            inv_id = cursor.lastrowid
-            
-            # Transfer 60% to counter
-            cursor.execute("SELECT CategoryID FROM PRODUCT WHERE ProductID = %s", (prod_id,))
-            result = cursor.fetchone()
-            if result:
-                cat_id = result[0]
-                cursor.execute("SELECT CounterID FROM COUNTER WHERE CategoryID = %s LIMIT 1", (cat_id,))
-                counter_result = cursor.fetchone()
-                if counter_result:
-                    counter_id = counter_result[0]
-                    # Ensure transfer_qty <= MaxQuantity (100)
-                    max_display = 100
-                    transfer_qty = min(int(qty * 0.5), max_display)
-                    if transfer_qty > 0:
-                        cursor.execute(
-                            "UPDATE INVENTORY SET Quantity = Quantity - %s WHERE InventoryID = %s", 
-                            (transfer_qty, inv_id)
-                        )
-                        cursor.execute(
-                            """INSERT INTO DISPLAYS (InventoryID, CounterID, Position, MaxQuantity, CurrentQuantity) 
-                               VALUES (%s, %s, %s, %s, %s)""",
-                            (inv_id, counter_id, f"Kệ {random.choice(['A', 'B', 'C', 'D'])}{random.randint(1, 10)}", max_display, transfer_qty)
-                        )
-        
-        # Timekeeping
-        for emp_id in employee_ids:
-            if random.random() < 0.92:  # 92% attendance
-                hours = random.uniform(7, 10)
-                cursor.execute(
-                    "INSERT INTO TIMEKEEPING (Date, WorkHours, EmployeeID) VALUES (%s, %s, %s)",
-                    (current_date, round(hours, 1), emp_id)
-                )
-        
-        # Create Invoices - MODERATE (giảm xuống cho demo hợp lý)
-        # DEMO: ~30-50 hóa đơn/ngày (hợp lý hơn cho báo cáo)
-        # Cuối tuần đông hơn 50%
-        base_invoices = random.randint(30, 50)
-        num_invoices = int(base_invoices * 1.5) if is_weekend else base_invoices
-        
-        # Get Sales Staff IDs only
-        cursor.execute("""
-            SELECT E.EmployeeID 
-            FROM EMPLOYEE E 
-            JOIN POSITION P ON E.PositionID = P.PositionID 
-            WHERE P.PositionName = 'Nhân viên bán hàng'
-        """)
-        sales_staff_ids = [row[0] for row in cursor.fetchall()]
-
-        if not sales_staff_ids:
-            # Fallback if no sales staff (shouldn't happen)
-            sales_staff_ids = employee_ids
-
-        for _ in range(num_invoices):
-            cust_id = random.choice(customer_ids)
-            emp_id = random.choice(sales_staff_ids) # Only Sales Staff make invoices
-            payment = random.choices(
-                ['Tiền mặt', 'Thẻ', 'QR Code', 'Ví điện tử'],
-                weights=[40, 25, 25, 10]  # Tiền mặt phổ biến nhất
-            )[0]
-            
-            cursor.execute(
-                "INSERT INTO INVOICE (CreatedAt, PaymentMethod, TotalAmount, EmployeeID, CustomerID) VALUES (%s, %s, 0, %s, %s)",
-                (current_date, payment, emp_id, cust_id)
-            )
-            invoice_id = cursor.lastrowid
-            total_invoices_created += 1
-            
-            total_amount = 0
-            # Mỗi hóa đơn có 3-12 sản phẩm (thực tế hơn)
-            num_items = random.randint(3, 12)
-            chosen_products = random.sample(product_ids, min(num_items, len(product_ids)))
-            
-            for pid in chosen_products:
-                # Số lượng mỗi sản phẩm: 1-8 (mua nhiều hơn cho thực phẩm)
-                qty = random.choices(
-                    [1, 2, 3, 4, 5, 6, 7, 8],
-                    weights=[20, 30, 20, 15, 8, 4, 2, 1]  # 1-2 phổ biến nhất
-                )[0]
-                
-                cursor.execute("SELECT SellingPrice FROM PRODUCT WHERE ProductID = %s", (pid,))
-                price_result = cursor.fetchone()
-                if price_result:
-                    price = price_result[0]
-                    try:
-                        cursor.execute(
-                            "INSERT INTO INVOICE_DETAIL (InvoiceID, ProductID, Quantity, SellingPrice) VALUES (%s, %s, %s, %s)",
-                            (invoice_id, pid, qty, price)
-                        )
-                        total_amount += float(price) * qty
-                    except:
-                        pass  # Skip duplicate
-            
-            cursor.execute("UPDATE INVOICE SET TotalAmount = %s WHERE InvoiceID = %s", (total_amount, invoice_id))
-            total_revenue_generated += total_amount
-        
-        # Commit mỗi ngày để tránh transaction quá lớn
-        if day_offset % 5 == 0:
-            conn.commit()
-            print(f"   ... Đã xử lý {day_offset + 1}/31 ngày")
-    
+    days_done = 0
+    
+    def collect(result):
+        nonlocal total_invoices_created, total_revenue_generated, days_done
+        n_days, invoices, revenue, stats = result
+        total_invoices_created += invoices
+        total_revenue_generated += revenue
+        days_done += n_days
+        for table, (rows, seconds) in stats.items():
+            writer.stats[table][0] += rows
+            writer.stats[table][1] += seconds
+        print(f"   ... Đã xử lý {days_done}/{num_days} ngày")
+    
+    writer.close()
+    if workers > 1:
+        mp = multiprocessing.get_context("spawn")  # mỗi worker có connection pool riêng
+        with mp.Pool(workers, initializer=_init_worker, initargs=(ctx,)) as pool:
+            for result in pool.imap_unordered(_seed_days, partitions):
+                collect(result)
+    else:
+        _init_worker(ctx)
+        for part in partitions:
+            collect(_seed_days(part))
+    # Trigger hóa đơn đã tắt khi nạp: cộng điểm / xếp hạng khách hàng, doanh thu nhà cung cấp 1 lần
+    _credit_customer_points(cursor)
+    _credit_supplier_revenue(cursor)
     conn.commit()
     
+    # Bảng tổng hợp được dựng 1 lần từ dữ liệu vừa sinh (nhanh hơn cập nhật theo từng hóa đơn)
+    print("   ... Dựng bảng tổng hợp doanh số theo ngày / tháng, tồn kho theo sản phẩm, số bản ghi và giảm giá lô cận hạn")
+    rebuild_rollups()
+    rebuild_summaries()
+    rebuild_product_stock()
+    refresh_exact_counts()
+    apply_lot_discounts()
+    
     print("\n" + "=" * 60)
     print("HOÀN TẤT SINH DỮ LIỆU THÀNH CÔNG!")
     print("=" * 60)
@@ -577,10 +861,44 @@ def run_seeder():
     print(f"- Khách hàng: {len(customer_ids)}")
     print(f"- Hóa đơn: {total_invoices_created:,}")
     print(f"- Tổng doanh thu: {total_revenue_generated:,.0f} VND")
-    print("- Dữ liệu giao dịch: 30 ngày")
+    print(f"- Dữ liệu giao dịch: {num_days} ngày")
+    print(f"- Thời gian: {time.perf_counter() - seed_started:.1f}s")
     print("=" * 60)
+    writer.report()
     
     conn.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu mẫu cho CSDL siêu thị")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Scale factor (1 = bộ dữ liệu demo, 100 = ~15 triệu dòng INVOICE_DETAIL)")
+    parser.add_argument("--days", type=int, help="Số ngày lịch sử giao dịch")
+    parser.add_argument("--customers", type=int, help="Số khách hàng")
+    parser.add_argument("--employees", type=int, help="Số nhân viên")
+    parser.add_argument("--products-multiplier", type=int, help="Hệ số nhân số sản phẩm mỗi danh mục")
+    parser.add_argument("--invoices-per-day", type=int, help="Số hóa đơn trung bình mỗi ngày thường")
+    parser.add_argument("--seed", type=int, help="Seed cố định để tái tạo đúng bộ dữ liệu")
+    parser.add_argument("--end-date", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                        help="Ngày cuối của dữ liệu (YYYY-MM-DD, mặc định hôm nay)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Số dòng mỗi lô INSERT")
+    parser.add_argument("--row-by-row", action="store_true", help="Ghi từng dòng (không dùng bulk)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Số tiến trình sinh dữ liệu giao dịch song song (chia theo dải ngày)")
+    args = parser.parse_args()
+    
+    run_seeder(
+        bulk=not args.row_by_row,
+        batch_size=args.batch_size,
+        scale=args.scale,
+        days=args.days,
+        customers=args.customers,
+        employees=args.employees,
+        products_multiplier=args.products_multiplier,
+        invoices_per_day=args.invoices_per_day,
+        seed=args.seed,
+        end_date=args.end_date,
+        workers=max(1, args.workers),
+    )
+
 if __name__ == "__main__":
-    run_seeder()
+    main()
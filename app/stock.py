@@ -0,0 +1,148 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from app.database import execute_query, transaction
+from app.cache import invalidate, invalidates
+
+# ============================================================
+# ẢNH CHỤP TỒN KHO THEO SẢN PHẨM (PRODUCT_STOCK)
+# ============================================================
+# Mỗi sản phẩm 1 dòng: tồn kho, tồn quầy, số lô còn hàng, lô cũ nhất.
+# Mọi hàm làm thay đổi INVENTORY / DISPLAYS gọi refresh_product_stock()
+# trong cùng transaction, nên các báo cáo tồn kho chỉ cần đọc bảng này.
+# Dữ liệu sửa trực tiếp trong CSDL được phát hiện / sửa bằng:
+#
+#   python app/stock.py --check     # liệt kê sản phẩm bị lệch
+#   python app/stock.py --repair    # tính lại các sản phẩm bị lệch
+#   python app/stock.py --rebuild   # tính lại toàn bộ
+
+STOCK_COLUMNS = ("WarehouseQty", "CounterQty", "LotCount", "DisplayCount", "OldestImportDate")
+
+def _snapshot_select(product_ids=None):
+    """Câu SELECT tính ảnh chụp tồn kho từ INVENTORY/DISPLAYS (cho 1 nhóm sản phẩm hoặc tất cả)"""
+    if product_ids:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        where = f"IN ({placeholders})"
+        params = list(product_ids) * 3
+    else:
+        where = "IS NOT NULL"
+        params = []
+    query = f"""
+    SELECT P.ProductID,
+           IFNULL(W.Qty, 0) AS WarehouseQty,
+           IFNULL(D.Qty, 0) AS CounterQty,
+           IFNULL(W.Lots, 0) AS LotCount,
+           IFNULL(D.Slots, 0) AS DisplayCount,
+           W.Oldest AS OldestImportDate
+    FROM PRODUCT P
+    LEFT JOIN (
+        SELECT ProductID, SUM(Quantity) AS Qty, SUM(Quantity > 0) AS Lots,
+               MIN(CASE WHEN Quantity > 0 THEN ImportDate END) AS Oldest
+        FROM INVENTORY
+        WHERE ProductID {where}
+        GROUP BY ProductID
+    ) W ON W.ProductID = P.ProductID
+    LEFT JOIN (
+        SELECT I.ProductID, SUM(D.CurrentQuantity) AS Qty, COUNT(*) AS Slots
+        FROM DISPLAYS D
+        JOIN INVENTORY I ON D.InventoryID = I.InventoryID
+        WHERE I.ProductID {where}
+        GROUP BY I.ProductID
+    ) D ON D.ProductID = P.ProductID
+    WHERE P.ProductID {where}
+    """
+    return query, params
+
+def refresh_product_stock(cursor, product_ids):
+    """Tính lại PRODUCT_STOCK cho các sản phẩm (dùng trong transaction của caller)"""
+    product_ids = sorted({int(pid) for pid in product_ids})
+    if not product_ids:
+        return
+    select, params = _snapshot_select(product_ids)
+    updates = ", ".join(f"PRODUCT_STOCK.{c} = VALUES({c})" for c in STOCK_COLUMNS)
+    cursor.execute(
+        f"INSERT INTO PRODUCT_STOCK (ProductID, {', '.join(STOCK_COLUMNS)}) {select} "
+        f"ON DUPLICATE KEY UPDATE {updates}",
+        params
+    )
+
+def refresh_for_inventory(cursor, inventory_ids):
+    """Tính lại PRODUCT_STOCK cho sản phẩm của các lô hàng"""
+    inventory_ids = list({int(i) for i in inventory_ids})
+    if not inventory_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(inventory_ids))
+    cursor.execute(f"SELECT DISTINCT ProductID FROM INVENTORY WHERE InventoryID IN ({placeholders})", inventory_ids)
+    refresh_product_stock(cursor, [row['ProductID'] for row in cursor.fetchall()])
+
+@invalidates("PRODUCT_STOCK")
+def rebuild_product_stock():
+    """Tính lại toàn bộ PRODUCT_STOCK. Trả về số sản phẩm."""
+    select, params = _snapshot_select()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM PRODUCT_STOCK")
+        cursor.execute(f"INSERT INTO PRODUCT_STOCK (ProductID, {', '.join(STOCK_COLUMNS)}) {select}", params)
+        return cursor.rowcount
+
+def reconcile_product_stock(repair=False):
+    """So sánh PRODUCT_STOCK với số liệu tính từ INVENTORY/DISPLAYS.
+    Trả về danh sách sản phẩm lệch (ProductID, Expected, Actual); repair=True thì tính lại các sản phẩm đó."""
+    select, params = _snapshot_select()
+    expected = {r['ProductID']: r for r in execute_query(select, params, fetch=True) or []}
+    actual = {r['ProductID']: r for r in execute_query(
+        f"SELECT ProductID, {', '.join(STOCK_COLUMNS)} FROM PRODUCT_STOCK", fetch=True) or []}
+
+    drift = []
+    for pid in sorted(expected.keys() | actual.keys()):
+        exp = expected.get(pid)
+        act = actual.get(pid)
+        if exp and act and all(exp[c] == act[c] for c in STOCK_COLUMNS):
+            continue
+        drift.append({
+            "ProductID": pid,
+            "Expected": {c: exp[c] for c in STOCK_COLUMNS} if exp else None,
+            "Actual": {c: act[c] for c in STOCK_COLUMNS} if act else None,
+        })
+
+    if repair and drift:
+        with transaction() as cursor:
+            refresh_product_stock(cursor, [d["ProductID"] for d in drift if d["Expected"]])
+            orphans = [d["ProductID"] for d in drift if not d["Expected"]]
+            if orphans:
+                placeholders = ", ".join(["%s"] * len(orphans))
+                cursor.execute(f"DELETE FROM PRODUCT_STOCK WHERE ProductID IN ({placeholders})", orphans)
+        invalidate("PRODUCT_STOCK")
+    return drift
+
+def main():
+    parser = argparse.ArgumentParser(description="Ảnh chụp tồn kho theo sản phẩm (PRODUCT_STOCK)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true", help="Chỉ liệt kê sản phẩm bị lệch (mặc định)")
+    group.add_argument("--repair", action="store_true", help="Tính lại các sản phẩm bị lệch")
+    group.add_argument("--rebuild", action="store_true", help="Tính lại toàn bộ")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.rebuild:
+        count = rebuild_product_stock()
+        print(f"Đã tính lại tồn kho {count} sản phẩm trong {time.perf_counter() - started:.1f}s")
+        return
+
+    drift = reconcile_product_stock(repair=args.repair)
+    for d in drift[:50]:
+        print(f"   #{d['ProductID']}: cần {d['Expected']}, đang có {d['Actual']}")
+    if not drift:
+        print("PRODUCT_STOCK khớp với INVENTORY/DISPLAYS.")
+    elif args.repair:
+        print(f"Đã sửa {len(drift)} sản phẩm bị lệch.")
+    else:
+        print(f"{len(drift)} sản phẩm bị lệch. Chạy lại với --repair để sửa.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
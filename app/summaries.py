@@ -0,0 +1,268 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import threading
+import time
+from datetime import date
+from app.database import execute_query, transaction
+from app.cache import invalidates
+
+# ============================================================
+# BẢNG TỔNG HỢP DOANH SỐ THEO THÁNG CHO CÁC BÁO CÁO XẾP HẠNG
+# ============================================================
+# MONTHLY_{PRODUCT,EMPLOYEE,CUSTOMER,SUPPLIER}_SALES được cộng dồn từ các
+# hóa đơn mới (InvoiceID > mốc trong SUMMARY_WATERMARK) bởi refresh_summaries(),
+# chạy ở thread nền của ứng dụng hoặc theo lịch (--every). Các hàm xếp hạng chỉ
+# đọc: bảng tổng hợp + phần hóa đơn chưa cộng (điều kiện unsettled()) trong cùng
+# 1 câu truy vấn. Dòng chi tiết thêm vào hóa đơn đã cộng được cộng thẳng bằng
+# add_late_line().
+#
+#   python app/summaries.py               # cộng các hóa đơn mới 1 lần
+#   python app/summaries.py --every 300   # cộng định kỳ mỗi 5 phút
+#   python app/summaries.py --rebuild     # dựng lại toàn bộ từ INVOICE
+#   python app/summaries.py --check       # so sánh với tổng hợp trực tiếp
+
+WATERMARK = "MONTHLY_SALES"
+
+# Chỉ cộng các hóa đơn tạo trước thời điểm này (giây): hóa đơn của
+# transaction chưa commit có InvoiceID nhỏ hơn sẽ không bị bỏ sót
+SETTLE_SECONDS = 60
+
+# Chu kỳ refresh_summaries() ở thread nền (giây)
+REFRESH_SECONDS = 300
+
+# bảng -> (cột khóa, cột giá trị, câu SELECT gom nhóm các hóa đơn có InvoiceID trong (%s, %s]);
+# alias trong SELECT trùng tên cột để check_summaries() đọc theo tên
+SUMMARIES = {
+    "MONTHLY_PRODUCT_SALES": (
+        ("Year", "Month", "ProductID"), ("Revenue", "Quantity"),
+        """
+        SELECT YEAR(I.CreatedAt) AS Year, MONTH(I.CreatedAt) AS Month, ID.ProductID,
+               SUM(ID.Quantity * ID.SellingPrice) AS Revenue, SUM(ID.Quantity) AS Quantity
+        FROM INVOICE I
+        JOIN INVOICE_DETAIL ID ON ID.InvoiceID = I.InvoiceID
+        WHERE I.InvoiceID > %s AND I.InvoiceID <= %s AND I.CreatedAt IS NOT NULL
+        GROUP BY YEAR(I.CreatedAt), MONTH(I.CreatedAt), ID.ProductID
+        """,
+    ),
+    "MONTHLY_EMPLOYEE_SALES": (
+        ("Year", "Month", "EmployeeID"), ("TotalSales", "InvoiceCount"),
+        """
+        SELECT YEAR(CreatedAt) AS Year, MONTH(CreatedAt) AS Month, EmployeeID,
+               SUM(TotalAmount) AS TotalSales, COUNT(*) AS InvoiceCount
+        FROM INVOICE
+        WHERE InvoiceID > %s AND InvoiceID <= %s AND CreatedAt IS NOT NULL AND EmployeeID IS NOT NULL
+        GROUP BY YEAR(CreatedAt), MONTH(CreatedAt), EmployeeID
+        """,
+    ),
+    "MONTHLY_CUSTOMER_SALES": (
+        ("Year", "Month", "CustomerID"), ("TotalSpent", "InvoiceCount"),
+        """
+        SELECT YEAR(CreatedAt) AS Year, MONTH(CreatedAt) AS Month, CustomerID,
+               SUM(TotalAmount) AS TotalSpent, COUNT(*) AS InvoiceCount
+        FROM INVOICE
+        WHERE InvoiceID > %s AND InvoiceID <= %s AND CreatedAt IS NOT NULL AND CustomerID IS NOT NULL
+        GROUP BY YEAR(CreatedAt), MONTH(CreatedAt), CustomerID
+        """,
+    ),
+    "MONTHLY_SUPPLIER_SALES": (
+        ("Year", "Month", "SupplierID"), ("Revenue", "Quantity"),
+        """
+        SELECT YEAR(I.CreatedAt) AS Year, MONTH(I.CreatedAt) AS Month, EI.SupplierID,
+               SUM(ID.Quantity * ID.SellingPrice) AS Revenue, SUM(ID.Quantity) AS Quantity
+        FROM INVOICE I
+        JOIN INVOICE_DETAIL ID ON ID.InvoiceID = I.InvoiceID
+        JOIN ELECTRONIC_ITEM EI ON EI.ProductID = ID.ProductID
+        WHERE I.InvoiceID > %s AND I.InvoiceID <= %s AND I.CreatedAt IS NOT NULL AND EI.SupplierID IS NOT NULL
+        GROUP BY YEAR(I.CreatedAt), MONTH(I.CreatedAt), EI.SupplierID
+        """,
+    ),
+}
+SUMMARY_TABLES = tuple(SUMMARIES)
+
+def single_month(start, end):
+    """(year, month) nếu [start, end) đúng bằng 1 tháng dương lịch, ngược lại None"""
+    if not isinstance(start, date) or not isinstance(end, date) or start.day != 1 or end.day != 1:
+        return None
+    next_month = date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+    return (start.year, start.month) if end == next_month else None
+
+def unsettled(column="InvoiceID"):
+    """Điều kiện SQL chọn hóa đơn chưa được cộng vào bảng tổng hợp. Mốc được đọc
+    trong chính câu truy vấn nên cùng snapshot với bảng tổng hợp."""
+    return f"{column} > IFNULL((SELECT LastInvoiceID FROM SUMMARY_WATERMARK WHERE Name = '{WATERMARK}'), 0)"
+
+def _merge(cursor, low, high):
+    """Cộng các hóa đơn có InvoiceID trong (low, high] vào mọi bảng tổng hợp"""
+    for table, (keys, values, select) in SUMMARIES.items():
+        updates = ", ".join(f"{table}.{c} = {table}.{c} + VALUES({c})" for c in values)
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(keys + values)}) {select} ON DUPLICATE KEY UPDATE {updates}",
+            (low, high)
+        )
+
+def _settled_max(cursor, after):
+    cursor.execute("""
+    SELECT MAX(InvoiceID) AS MaxID FROM INVOICE
+    WHERE InvoiceID > %s AND CreatedAt < NOW() - INTERVAL %s SECOND
+    """, (after, SETTLE_SECONDS))
+    row = cursor.fetchone()
+    return row['MaxID'] if row else None
+
+def refresh_summaries():
+    """Cộng các hóa đơn mới vào bảng tổng hợp. Trả về số InvoiceID đã xử lý."""
+    row = execute_query("SELECT LastInvoiceID FROM SUMMARY_WATERMARK WHERE Name = %s", (WATERMARK,), fetch_one=True)
+    last = row['LastInvoiceID'] if row else 0
+    # Kiểm tra nhanh (quét theo khóa chính) trước khi khóa mốc
+    pending = execute_query(
+        "SELECT 1 AS Pending FROM INVOICE WHERE InvoiceID > %s AND CreatedAt < NOW() - INTERVAL %s SECOND LIMIT 1",
+        (last, SETTLE_SECONDS), fetch_one=True
+    )
+    if not pending:
+        return 0
+
+    with transaction() as cursor:
+        cursor.execute("INSERT IGNORE INTO SUMMARY_WATERMARK (Name, LastInvoiceID) VALUES (%s, 0)", (WATERMARK,))
+        cursor.execute("SELECT LastInvoiceID FROM SUMMARY_WATERMARK WHERE Name = %s FOR UPDATE", (WATERMARK,))
+        last = cursor.fetchone()['LastInvoiceID']
+        high = _settled_max(cursor, last)
+        if not high:
+            return 0
+        _merge(cursor, last, high)
+        cursor.execute("UPDATE SUMMARY_WATERMARK SET LastInvoiceID = %s WHERE Name = %s", (high, WATERMARK))
+    return high - last
+
+def lock_watermark(cursor):
+    """Khóa chia sẻ mốc (chặn refresh_summaries() tới hết transaction). Trả về mốc hiện tại."""
+    cursor.execute("SELECT LastInvoiceID FROM SUMMARY_WATERMARK WHERE Name = %s FOR SHARE", (WATERMARK,))
+    row = cursor.fetchone()
+    return row['LastInvoiceID'] if row else 0
+
+def add_late_line(cursor, invoice_id, product_id, quantity, selling_price, total_delta):
+    """Cộng 1 dòng chi tiết mới của hóa đơn đã nằm trong bảng tổng hợp (InvoiceID <= mốc,
+    mốc đã khóa bằng lock_watermark() trong cùng transaction)."""
+    cursor.execute("""
+    SELECT YEAR(CreatedAt) AS Year, MONTH(CreatedAt) AS Month, EmployeeID, CustomerID
+    FROM INVOICE WHERE InvoiceID = %s AND CreatedAt IS NOT NULL
+    """, (invoice_id,))
+    inv = cursor.fetchone()
+    if inv is None:
+        return
+    year, month = inv['Year'], inv['Month']
+    revenue = quantity * selling_price
+    cursor.execute("""
+    INSERT INTO MONTHLY_PRODUCT_SALES (Year, Month, ProductID, Revenue, Quantity) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE Revenue = Revenue + VALUES(Revenue), Quantity = Quantity + VALUES(Quantity)
+    """, (year, month, product_id, revenue, quantity))
+    cursor.execute("""
+    INSERT INTO MONTHLY_SUPPLIER_SALES (Year, Month, SupplierID, Revenue, Quantity)
+    SELECT %s, %s, SupplierID, %s, %s FROM ELECTRONIC_ITEM WHERE ProductID = %s AND SupplierID IS NOT NULL
+    ON DUPLICATE KEY UPDATE Revenue = Revenue + VALUES(Revenue), Quantity = Quantity + VALUES(Quantity)
+    """, (year, month, revenue, quantity, product_id))
+    # Hóa đơn đã được đếm (InvoiceCount) khi cộng lần đầu, chỉ cộng phần tăng của TotalAmount
+    if inv['EmployeeID'] is not None:
+        cursor.execute("""
+        INSERT INTO MONTHLY_EMPLOYEE_SALES (Year, Month, EmployeeID, TotalSales, InvoiceCount) VALUES (%s, %s, %s, %s, 0)
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + VALUES(TotalSales)
+        """, (year, month, inv['EmployeeID'], total_delta))
+    if inv['CustomerID'] is not None:
+        cursor.execute("""
+        INSERT INTO MONTHLY_CUSTOMER_SALES (Year, Month, CustomerID, TotalSpent, InvoiceCount) VALUES (%s, %s, %s, %s, 0)
+        ON DUPLICATE KEY UPDATE TotalSpent = TotalSpent + VALUES(TotalSpent)
+        """, (year, month, inv['CustomerID'], total_delta))
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def _refresh_loop(every):
+    while True:
+        try:
+            refresh_summaries()
+        except Exception as err:
+            print(f"Không cập nhật được bảng tổng hợp: {err}")
+        time.sleep(every)
+
+def start_background_refresh(every=REFRESH_SECONDS):
+    """Chạy refresh_summaries() định kỳ ở 1 thread nền cho cả tiến trình (gọi nhiều lần không sao)"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None:
+            return False
+        _refresher = threading.Thread(target=_refresh_loop, args=(every,), name="summaries-refresh", daemon=True)
+        _refresher.start()
+    return True
+
+@invalidates(*SUMMARY_TABLES)
+def rebuild_summaries():
+    """Xóa và dựng lại toàn bộ bảng tổng hợp. Trả về mốc InvoiceID mới."""
+    with transaction() as cursor:
+        cursor.execute("INSERT IGNORE INTO SUMMARY_WATERMARK (Name, LastInvoiceID) VALUES (%s, 0)", (WATERMARK,))
+        cursor.execute("SELECT LastInvoiceID FROM SUMMARY_WATERMARK WHERE Name = %s FOR UPDATE", (WATERMARK,))
+        for table in SUMMARY_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        high = _settled_max(cursor, 0) or 0
+        _merge(cursor, 0, high)
+        cursor.execute("UPDATE SUMMARY_WATERMARK SET LastInvoiceID = %s WHERE Name = %s", (high, WATERMARK))
+    return high
+
+def check_summaries():
+    """So sánh bảng tổng hợp với tổng hợp trực tiếp từ INVOICE (đến mốc hiện tại).
+    Trả về danh sách dòng lệch: Table, Key, Expected, Actual."""
+    mismatches = []
+    with transaction() as cursor:
+        # Đọc mốc và bảng tổng hợp trong cùng 1 transaction để không lệch vì refresh xen giữa
+        cursor.execute("SELECT LastInvoiceID FROM SUMMARY_WATERMARK WHERE Name = %s FOR UPDATE", (WATERMARK,))
+        row = cursor.fetchone()
+        high = row['LastInvoiceID'] if row else 0
+        for table, (keys, values, select) in SUMMARIES.items():
+            cursor.execute(select, (0, high))
+            expected = {tuple(r[k] for k in keys): tuple(r[v] for v in values) for r in cursor.fetchall()}
+            cursor.execute(f"SELECT {', '.join(keys + values)} FROM {table}")
+            actual = {tuple(r[k] for k in keys): tuple(r[v] for v in values) for r in cursor.fetchall()}
+            for key in expected.keys() | actual.keys():
+                exp = expected.get(key)
+                act = actual.get(key)
+                if exp is None or act is None or any(float(a) != float(b) for a, b in zip(exp, act)):
+                    mismatches.append({
+                        "Table": table,
+                        "Key": dict(zip(keys, key)),
+                        "Expected": dict(zip(values, exp)) if exp else None,
+                        "Actual": dict(zip(values, act)) if act else None,
+                    })
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Bảng tổng hợp doanh số theo tháng")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--rebuild", action="store_true", help="Dựng lại toàn bộ từ INVOICE")
+    group.add_argument("--check", action="store_true", help="Kiểm tra lệch so với tổng hợp trực tiếp")
+    group.add_argument("--every", type=int, metavar="SECONDS", help="Cộng hóa đơn mới định kỳ sau mỗi SECONDS giây")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.rebuild:
+        high = rebuild_summaries()
+        print(f"Đã dựng lại bảng tổng hợp đến hóa đơn #{high} trong {time.perf_counter() - started:.1f}s")
+    elif args.check:
+        mismatches = check_summaries()
+        for m in mismatches[:50]:
+            print(f"   {m['Table']} {m['Key']}: cần {m['Expected']}, đang có {m['Actual']}")
+        if mismatches:
+            print(f"{len(mismatches)} dòng lệch. Chạy lại với --rebuild để sửa.")
+            sys.exit(1)
+        print("Bảng tổng hợp khớp với dữ liệu hóa đơn.")
+    else:
+        while True:
+            count = refresh_summaries()
+            print(f"Đã cập nhật {count} mã hóa đơn mới trong {time.perf_counter() - started:.1f}s")
+            if not args.every:
+                break
+            time.sleep(args.every)
+            started = time.perf_counter()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import sys
+import os
+
+# Add parent directory to path to allow importing app modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import threading
+import time
+import mysql.connector
+from app.database import execute_query, transaction
+from app.cache import invalidates
+
+# ============================================================
+# SỐ BẢN GHI CỦA CÁC BẢNG (cho phần "Tổng quan Dữ liệu Hệ thống")
+# ============================================================
+# 2 chế độ:
+# - approximate: ước lượng của InnoDB trong information_schema.TABLES, 1 truy vấn
+# - exact: đọc TABLE_STATS, được đếm lại (COUNT(*)) ở thread nền khi số liệu
+#   cũ hơn REFRESH_SECONDS, hoặc theo lịch:
+#
+#   python app/table_stats.py                 # đếm lại 1 lần
+#   python app/table_stats.py --every 600     # đếm lại mỗi 10 phút
+#   python app/table_stats.py --approximate   # xem số ước lượng
+
+REFRESH_SECONDS = 600
+
+# Bảng -> tên tiếng Việt, theo thứ tự hiển thị
+STATS_TABLES = {
+    "CATEGORY": "Danh mục",
+    "PRODUCT": "Sản phẩm",
+    "SUPPLIER": "Nhà cung cấp",
+    "WAREHOUSE": "Kho hàng",
+    "COUNTER": "Quầy hàng",
+    "EMPLOYEE": "Nhân viên",
+    "CUSTOMER": "Khách hàng",
+    "POSITION": "Vị trí / Chức vụ",
+    "INVENTORY": "Lô hàng / Tồn kho",
+    "DISPLAYS": "Trưng bày",
+    "TIMEKEEPING": "Chấm công",
+    "INVOICE": "Hóa đơn",
+    "INVOICE_DETAIL": "Chi tiết hóa đơn",
+    "FOOD_ITEM": "Thực phẩm",
+    "ELECTRONIC_ITEM": "Điện tử",
+    "LOCAL_FARMER": "Nông dân địa phương",
+    "INDUSTRIAL_MANUFACTURER": "Nhà sản xuất công nghiệp",
+}
+
+_refreshing = False
+_refresh_lock = threading.Lock()
+
+def approximate_counts():
+    """{bảng: (số bản ghi ước lượng, thời điểm đọc)} từ information_schema.TABLES"""
+    placeholders = ", ".join(["%s"] * len(STATS_TABLES))
+    try:
+        with transaction() as cursor:
+            # MySQL 8 mặc định cache số liệu information_schema tới 24h
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+            cursor.execute(f"""
+            SELECT TABLE_NAME AS TableName, TABLE_ROWS AS RowCount, NOW() AS RefreshedAt
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})
+            """, list(STATS_TABLES))
+            rows = cursor.fetchall()
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        return None
+    return {r['TableName'].upper(): (r['RowCount'], r['RefreshedAt']) for r in rows}
+
+def exact_counts():
+    """{bảng: (số bản ghi, thời điểm đếm)} từ TABLE_STATS"""
+    rows = execute_query("SELECT TableName, RowCount, RefreshedAt FROM TABLE_STATS", fetch=True)
+    if rows is None:
+        return None
+    return {r['TableName']: (r['RowCount'], r['RefreshedAt']) for r in rows if r['TableName'] in STATS_TABLES}
+
+@invalidates("TABLE_STATS")
+def refresh_exact_counts(tables=None):
+    """Đếm lại (COUNT(*)) từng bảng và ghi vào TABLE_STATS. Trả về {bảng: lỗi} của các bảng đếm lỗi."""
+    errors = {}
+    for table in tables or STATS_TABLES:
+        try:
+            with transaction() as cursor:
+                cursor.execute(f"SELECT COUNT(*) AS Total FROM {table}")
+                total = cursor.fetchone()['Total']
+                cursor.execute("""
+                INSERT INTO TABLE_STATS (TableName, RowCount, RefreshedAt) VALUES (%s, %s, NOW())
+                ON DUPLICATE KEY UPDATE RowCount = VALUES(RowCount), RefreshedAt = VALUES(RefreshedAt)
+                """, (table, total))
+        except mysql.connector.Error as err:
+            print(f"Không đếm được {table}: {err}")
+            errors[table] = str(err)
+    return errors
+
+def _refresh_in_background():
+    global _refreshing
+    try:
+        refresh_exact_counts()
+    finally:
+        with _refresh_lock:
+            _refreshing = False
+
+def refresh_if_stale(counts, max_age=REFRESH_SECONDS):
+    """Đếm lại ở thread nền nếu thiếu bảng hoặc có số liệu cũ hơn max_age giây"""
+    global _refreshing
+    now = time.time()
+    stale = counts is None or any(
+        t not in counts or now - counts[t][1].timestamp() > max_age for t in STATS_TABLES
+    )
+    if not stale:
+        return False
+    with _refresh_lock:
+        if _refreshing:
+            return False
+        _refreshing = True
+    threading.Thread(target=_refresh_in_background, name="table-stats-refresh", daemon=True).start()
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Số bản ghi của các bảng (TABLE_STATS)")
+    parser.add_argument("--every", type=int, metavar="SECONDS", help="Đếm lại định kỳ sau mỗi SECONDS giây")
+    parser.add_argument("--approximate", action="store_true", help="Chỉ in số ước lượng từ information_schema")
+    args = parser.parse_args()
+
+    if args.approximate:
+        for table, (count, _) in sorted(approximate_counts().items()):
+            print(f"   {table:<24} ~{count or 0:>12,}")
+        return
+
+    while True:
+        started = time.perf_counter()
+        errors = refresh_exact_counts()
+        print(f"Đã đếm {len(STATS_TABLES) - len(errors)}/{len(STATS_TABLES)} bảng trong {time.perf_counter() - started:.1f}s")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
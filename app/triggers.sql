@@ -17,13 +17,16 @@ CREATE TRIGGER trg_after_insert_invoice_detail
 AFTER INSERT ON INVOICE_DETAIL
 FOR EACH ROW
 BEGIN
-    UPDATE INVOICE 
-    SET TotalAmount = (
-        SELECT IFNULL(SUM(Quantity * SellingPrice), 0)
-        FROM INVOICE_DETAIL 
-        WHERE InvoiceID = NEW.InvoiceID
-    )
-    WHERE InvoiceID = NEW.InvoiceID;
+    -- @BULK_LOAD: seeder ghi sẵn TotalAmount cuối cùng (migration 012)
+    IF @BULK_LOAD IS NULL THEN
+        UPDATE INVOICE 
+        SET TotalAmount = (
+            SELECT IFNULL(SUM(Quantity * SellingPrice), 0)
+            FROM INVOICE_DETAIL 
+            WHERE InvoiceID = NEW.InvoiceID
+        )
+        WHERE InvoiceID = NEW.InvoiceID;
+    END IF;
 END //
 
 CREATE TRIGGER trg_after_update_invoice_detail
@@ -74,7 +77,8 @@ BEGIN
     DECLARE v_new_tier VARCHAR(20);
     
     -- Chỉ cập nhật khi TotalAmount thay đổi và CustomerID tồn tại
-    IF NEW.TotalAmount != OLD.TotalAmount AND NEW.CustomerID IS NOT NULL THEN
+    -- (@BULK_LOAD: seeder tính lại điểm / hạng 1 lần sau khi nạp)
+    IF @BULK_LOAD IS NULL AND NEW.TotalAmount != OLD.TotalAmount AND NEW.CustomerID IS NOT NULL THEN
         -- Tính điểm mới
         SELECT Points + FLOOR((NEW.TotalAmount - OLD.TotalAmount) / 10000) 
         INTO v_new_points
@@ -112,10 +116,13 @@ FOR EACH ROW
 BEGIN
     -- Cập nhật doanh thu cho TẤT CẢ nhà cung cấp của sản phẩm này
     -- Sử dụng bảng SUPPLIES (quan hệ cung cấp chung)
-    UPDATE SUPPLIER S
-    JOIN SUPPLIES SP ON S.SupplierID = SP.SupplierID
-    SET S.TotalRevenue = S.TotalRevenue + (NEW.Quantity * NEW.SellingPrice)
-    WHERE SP.ProductID = NEW.ProductID;
+    -- (@BULK_LOAD: seeder tính lại TotalRevenue 1 lần sau khi nạp)
+    IF @BULK_LOAD IS NULL THEN
+        UPDATE SUPPLIER S
+        JOIN SUPPLIES SP ON S.SupplierID = SP.SupplierID
+        SET S.TotalRevenue = S.TotalRevenue + (NEW.Quantity * NEW.SellingPrice)
+        WHERE SP.ProductID = NEW.ProductID;
+    END IF;
 END //
 
 DELIMITER ;
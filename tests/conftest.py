@@ -0,0 +1,5 @@
+import sys
+import os
+
+# Add repository root to path to allow importing app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
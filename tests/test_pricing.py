@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import logic, pricing
+
+TODAY = date.today()
+
+PROMOTION = {
+    "StartDate": TODAY - timedelta(days=10), "EndDate": TODAY + timedelta(days=10),
+    "PaymentMethod": None, "MinOrderValue": None, "RequiredTier": None,
+}
+
+ROWS = {
+    "EVENT": [
+        {**PROMOTION, "PromotionID": 1, "PromotionName": "Sale 10%", "DiscountPercent": 10, "ProductID": 1},
+    ],
+    "MEMBERSHIP": [],
+    "EXPIRY": [
+        # Lô 100 của SP 1 giảm 50%, lô 102 đã hết hạn (chưa được discounts.py xóa)
+        {**PROMOTION, "PromotionID": 7, "PromotionName": "Cận hạn 50%", "DiscountPercent": 50, "ProductID": 1,
+         "InventoryID": 100, "BasePrice": 10000, "DiscountedPrice": 5000, "ExpiryDate": TODAY + timedelta(days=2)},
+        {**PROMOTION, "PromotionID": 7, "PromotionName": "Cận hạn 50%", "DiscountPercent": 50, "ProductID": 2,
+         "InventoryID": 102, "BasePrice": 8000, "DiscountedPrice": 4000, "ExpiryDate": TODAY - timedelta(days=1)},
+    ],
+}
+
+@pytest.fixture
+def index(monkeypatch):
+    def fake_query(query, params=None, fetch=False, fetch_one=False):
+        kind = next(k for k, q in pricing.PROMOTION_QUERIES.items() if q == query)
+        return ROWS[kind]
+    monkeypatch.setattr(pricing, "execute_query", fake_query)
+    monkeypatch.setattr(pricing, "table_versions", lambda tables: (0,) * len(tables))
+    index = pricing.PromotionIndex()
+    for kind in pricing.PROMOTION_SOURCES:
+        assert index.load(kind)
+    return index
+
+def line(pid, qty, price):
+    return {"ProductID": pid, "Quantity": qty, "SellingPrice": price}
+
+def test_event_discount_without_lots(index):
+    result = index.price([line(1, 2, 10000), line(3, 1, 20000)], today=TODAY)
+    first, second = result["lines"]
+    assert first["SellingPrice"] == 9000 and first["PromotionType"] == "EVENT"
+    assert second["SellingPrice"] == 20000 and second["PromotionID"] is None
+    assert result["discount"] == 2000
+    assert result["total"] == 38000
+
+def test_lot_discount_only_for_units_from_discounted_lot(index):
+    # 3 đơn vị từ lô 100 (5.000đ), 1 đơn vị từ lô 101 (giảm 10% theo sự kiện)
+    result = index.price([line(1, 4, 10000)], today=TODAY, lots={1: {100: 3, 101: 1}})
+    priced = result["lines"][0]
+    assert result["discount"] == 3 * 5000 + 1000
+    assert priced["SellingPrice"] == 6000
+    assert priced["PromotionType"] == "EXPIRY" and priced["PromotionID"] == 7
+    assert priced["DiscountPercent"] == 40
+
+def test_lot_discount_uses_stored_price(index):
+    result = index.price([line(1, 1, 10000)], today=TODAY, lots={1: {100: 1}})
+    assert result["lines"][0]["SellingPrice"] == 5000
+    assert result["lines"][0]["DiscountPercent"] == 50
+    # Giá niêm yết đã đổi từ lúc đánh giá: tính lại theo %
+    result = index.price([line(1, 1, 12000)], today=TODAY, lots={1: {100: 1}})
+    assert result["lines"][0]["SellingPrice"] == 6000
+
+def test_expired_or_unsold_lot_not_discounted(index):
+    result = index.price([line(2, 2, 8000)], today=TODAY, lots={2: {102: 2}})
+    assert result["discount"] == 0
+    assert result["lines"][0]["PromotionType"] is None
+    # Lô 100 đã hết trên quầy: hàng bán từ lô khác
+    result = index.price([line(1, 1, 10000)], today=TODAY, lots={1: {101: 1}})
+    assert result["lines"][0]["PromotionType"] == "EVENT"
+
+def test_quote_basket_keeps_display_fields(index, monkeypatch):
+    monkeypatch.setattr(pricing, "get_index", lambda: index)
+    monkeypatch.setattr(logic, "execute_query", lambda query, params=None, fetch=False, fetch_one=False: [
+        {"InventoryID": 100, "CounterID": 1, "CurrentQuantity": 1, "ProductID": 1, "ImportDate": TODAY - timedelta(days=20)},
+        {"InventoryID": 101, "CounterID": 1, "CurrentQuantity": 5, "ProductID": 1, "ImportDate": TODAY - timedelta(days=5)},
+    ])
+    basket = [
+        {"ProductID": 1, "ProductName": "Sữa tươi", "SellingPrice": 10000, "Quantity": 1},
+        {"ProductID": 1, "ProductName": "Sữa tươi", "SellingPrice": 10000, "Quantity": 1},
+    ]
+    quote = logic.quote_basket(basket)
+    assert len(quote["lines"]) == 1
+    priced = quote["lines"][0]
+    assert priced["ProductName"] == "Sữa tươi" and priced["Quantity"] == 2
+    # 1 đơn vị từ lô cũ 100 (giảm giá lô), 1 đơn vị từ lô 101 (giảm 10%)
+    assert quote["discount"] == 5000 + 1000
+
+def test_get_index_reloads_outside_lock(index, monkeypatch):
+    held = []
+    def fake_query(query, params=None, fetch=False, fetch_one=False):
+        held.append(pricing._index_lock.locked())
+        return ROWS["EVENT"]
+    monkeypatch.setattr(pricing, "execute_query", fake_query)
+    monkeypatch.setattr(pricing, "_index", index)
+    # Bảng EVENT vừa bị ghi: chỉ nạp lại loại EVENT
+    monkeypatch.setattr(pricing, "table_versions",
+                        lambda tables: (1,) * len(tables) if tables[0] == "EVENT_PROMOTION" else (0,) * len(tables))
+    assert pricing.get_index() is index
+    assert held == [False]
+    assert index.versions["EVENT"] == (1, 1)
+    # Thread khác đang nạp lại: dùng chỉ mục hiện có, không truy vấn
+    monkeypatch.setattr(pricing, "table_versions", lambda tables: (2,) * len(tables))
+    monkeypatch.setattr(pricing, "_reloading", True)
+    assert pricing.get_index() is index
+    assert held == [False]
@@ -0,0 +1,57 @@
+from app import logic
+
+class FakeCursor:
+    """Trả kết quả theo bảng trong câu SELECT, ghi lại các câu đã chạy"""
+    def __init__(self, inventory, displays, counters):
+        self.tables = {
+            "FROM INVENTORY": [{"InventoryID": k, "Quantity": v} for k, v in inventory.items()],
+            "FROM DISPLAYS": displays,
+            "FROM COUNTER": [{"CounterID": c} for c in counters],
+        }
+        self.executed = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        table = next(t for t in self.tables if t in query)
+        self.rows = [dict(r) for r in self.tables[table]]
+
+    def fetchall(self):
+        return self.rows
+
+def plan(moves, inventory=None, displays=None, counters=(1, 2)):
+    cursor = FakeCursor(inventory or {10: 50, 11: 5}, displays or [], counters)
+    return cursor, logic._plan_transfers(cursor, logic._normalize_moves(moves))
+
+def test_moves_are_checked_in_order():
+    displays = [{"InventoryID": 10, "CounterID": 1, "Position": "A1", "MaxQuantity": 30, "CurrentQuantity": 20}]
+    _, (results, inventory, changed) = plan([
+        (10, 1, 10, None),      # lấp đầy vị trí A1
+        (10, 1, 1, None),       # vượt sức chứa
+        (10, 2, 45, "B1"),      # kho chỉ còn 40 sau lệnh 1
+        (10, 2, 30, "B1"),
+        (11, 3, 1, "C1"),       # không có quầy 3
+    ], displays=displays)
+    assert [r['Success'] for r in results] == [True, False, False, True, False]
+    assert inventory == {10: 10}
+    slots = {(d['InventoryID'], d['CounterID']): d for d in changed}
+    assert slots[(10, 1)]['CurrentQuantity'] == 30
+    assert slots[(10, 2)] == {'InventoryID': 10, 'CounterID': 2, 'Position': "B1", 'MaxQuantity': 60, 'CurrentQuantity': 30}
+
+def test_bad_row_fails_only_that_move():
+    _, (results, inventory, _) = plan([
+        {"InventoryID": 10, "CounterID": 1, "Quantity": None, "Position": "A1"},
+        {"InventoryID": "", "CounterID": 1, "Quantity": 3, "Position": "A1"},
+        {"InventoryID": "11", "CounterID": 1.0, "Quantity": "2", "Position": None},
+        {"InventoryID": 10, "CounterID": 1, "Quantity": 2.5, "Position": "A1"},
+    ])
+    assert [r['Success'] for r in results] == [False, False, True, False]
+    assert "Quantity" in results[0]['Message'] and "InventoryID" in results[1]['Message']
+    assert results[2]['InventoryID'] == 11 and results[2]['CounterID'] == 1
+    assert set(results[0]) == {'Move', *logic.TRANSFER_COLUMNS, 'Success', 'Message'}
+    assert inventory == {11: 3}
+
+def test_all_rows_invalid_runs_no_query():
+    cursor, (results, inventory, changed) = plan([(None, 1, 5, None)])
+    assert not results[0]['Success']
+    assert cursor.executed == [] and inventory == {} and changed == []